@@ -12,7 +12,7 @@ class ContratoForm(forms.ModelForm):
         fields = [
             'inmueble', 'inquilino', 'fecha_inicio', 'fecha_fin',
             'valor_arriendo', 'valor_administracion', 'valor_deposito',
-            'dia_pago', 'terminos_condiciones', 'clausulas_especiales'
+            'dia_pago', 'tasa_mora_diaria', 'terminos_condiciones', 'clausulas_especiales'
         ]
         widgets = {
             'inmueble': forms.Select(attrs={'class': 'form-control'}),
@@ -23,6 +23,7 @@ class ContratoForm(forms.ModelForm):
             'valor_administracion': forms.NumberInput(attrs={'class': 'form-control', 'step': '1000'}),
             'valor_deposito': forms.NumberInput(attrs={'class': 'form-control', 'step': '1000'}),
             'dia_pago': forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': '31'}),
+            'tasa_mora_diaria': forms.NumberInput(attrs={'class': 'form-control', 'min': '0', 'step': '0.0001'}),
             'terminos_condiciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
             'clausulas_especiales': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
         }
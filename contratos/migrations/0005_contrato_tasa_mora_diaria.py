@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:36
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0004_contrato_fecha_cierre_contrato_motivo_cierre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contrato',
+            name='tasa_mora_diaria',
+            field=models.DecimalField(decimal_places=5, default=Decimal('0.001'), help_text='Fracción del monto que se cobra como mora por cada día de atraso', max_digits=7),
+        ),
+    ]
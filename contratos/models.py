@@ -4,7 +4,8 @@ from .models_solicitud import SolicitudArriendo
 from inmuebles.models import Inmueble
 from django.utils import timezone
 from datetime import timedelta
-from firebase_admin import firestore
+from decimal import Decimal
+from core.secuencias import asignar_numeros
 
 
 class Contrato(models.Model):
@@ -47,6 +48,12 @@ class Contrato(models.Model):
     valor_administracion = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     valor_deposito = models.DecimalField(max_digits=12, decimal_places=2)
     dia_pago = models.IntegerField(default=5, help_text="Día del mes para pago")
+    tasa_mora_diaria = models.DecimalField(
+        max_digits=7,
+        decimal_places=5,
+        default=Decimal('0.001'),
+        help_text="Fracción del monto que se cobra como mora por cada día de atraso",
+    )
     
     # Firma digital
     firma_propietario = models.TextField(blank=True, help_text="Firma digital del propietario")
@@ -75,12 +82,18 @@ class Contrato(models.Model):
     def __str__(self):
         return f"Contrato #{self.numero_contrato} - {self.inmueble.titulo}"
     
+    PREFIJO_NUMERO = 'CTR'
+    DIGITOS_NUMERO = 5
+    
+    @classmethod
+    def numerar(cls, instancias):
+        """Asigna numero_contrato a las instancias que no lo tienen (una sola reserva)"""
+        asignar_numeros(instancias, 'numero_contrato', cls.PREFIJO_NUMERO, cls.DIGITOS_NUMERO)
+    
     def save(self, *args, **kwargs):
         # Generar número de contrato automáticamente
         if not self.numero_contrato:
-            ultimo = Contrato.objects.order_by('-id').first()
-            numero = 1 if not ultimo else ultimo.id + 1
-            self.numero_contrato = f"CTR-{timezone.now().year}-{numero:05d}"
+            Contrato.numerar([self])
         
         super().save(*args, **kwargs)
         
@@ -142,29 +155,31 @@ class Contrato(models.Model):
         """Verifica si el contrato está firmado por ambas partes"""
         return bool(self.firma_propietario and self.firma_inquilino)
     
+    FIREBASE_COLECCION = 'contratos'
+    # Relaciones que usa get_datos_firebase (para select_related en las réplicas masivas)
+    FIREBASE_RELACIONADOS = ['inmueble']
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'numero_contrato': self.numero_contrato,
+            'inmueble_id': self.inmueble_id,
+            'inquilino_id': self.inquilino_id,
+            'propietario_id': self.inmueble.propietario_id,
+            'estado': self.estado,
+            'fecha_inicio': self.fecha_inicio.isoformat(),
+            'fecha_fin': self.fecha_fin.isoformat(),
+            'valor_arriendo': float(self.valor_arriendo),
+            'valor_administracion': float(self.valor_administracion),
+            'valor_deposito': float(self.valor_deposito),
+            'fecha_creacion': self.fecha_creacion.isoformat(),
+            'firmado_completo': self.esta_firmado_completo()
+        }
+    
     def save_to_firebase(self):
-        """Guarda el contrato en Firebase"""
-        try:
-            db = firestore.client()
-            contrato_ref = db.collection('contratos').document(str(self.id))
-            contrato_ref.set({
-                'numero_contrato': self.numero_contrato,
-                'inmueble_id': self.inmueble.id,
-                'inquilino_id': self.inquilino.id,
-                'propietario_id': self.inmueble.propietario.id,
-                'estado': self.estado,
-                'fecha_inicio': self.fecha_inicio.isoformat(),
-                'fecha_fin': self.fecha_fin.isoformat(),
-                'valor_arriendo': float(self.valor_arriendo),
-                'valor_administracion': float(self.valor_administracion),
-                'valor_deposito': float(self.valor_deposito),
-                'fecha_creacion': self.fecha_creacion.isoformat(),
-                'firmado_completo': self.esta_firmado_completo()
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica del contrato en Firebase (ver core.firebase_sync)"""
+        from core.firebase_sync import encolar
+        return encolar(self)
 
 
 class FirmaDigital(models.Model):
@@ -0,0 +1,45 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from .models import Contrato
+from .views import calendario_pagos, fecha_dia_pago
+
+
+def contrato_en_memoria(fecha_inicio, fecha_fin, dia_pago):
+    return Contrato(
+        fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, dia_pago=dia_pago,
+        valor_arriendo=Decimal('1000000'), valor_administracion=Decimal('0'),
+    )
+
+
+class CalendarioPagosTests(SimpleTestCase):
+    def test_dia_pago_en_meses_cortos(self):
+        self.assertEqual(fecha_dia_pago(date(2027, 2, 10), 31), date(2027, 2, 28))
+        self.assertEqual(fecha_dia_pago(date(2028, 2, 10), 31), date(2028, 2, 29))
+        self.assertEqual(fecha_dia_pago(date(2027, 4, 10), 31), date(2027, 4, 30))
+        self.assertEqual(fecha_dia_pago(date(2027, 4, 10), 5), date(2027, 4, 5))
+
+    def test_inicio_31_enero_con_dia_pago_31(self):
+        pagos = calendario_pagos(contrato_en_memoria(date(2027, 1, 31), date(2027, 4, 29), 31))
+        self.assertEqual(
+            [pago.fecha_vencimiento for pago in pagos],
+            [date(2027, 2, 28), date(2027, 3, 31), date(2027, 4, 30)],
+        )
+        # Los periodos se cuentan desde fecha_inicio: febrero no desplaza a marzo
+        self.assertEqual(
+            [(pago.periodo_inicio, pago.periodo_fin) for pago in pagos],
+            [
+                (date(2027, 1, 31), date(2027, 2, 27)),
+                (date(2027, 2, 28), date(2027, 3, 30)),
+                (date(2027, 3, 31), date(2027, 4, 29)),
+            ],
+        )
+
+    def test_un_vencimiento_por_mes(self):
+        pagos = calendario_pagos(contrato_en_memoria(date(2027, 1, 31), date(2028, 1, 30), 31))
+        meses = [(pago.fecha_vencimiento.year, pago.fecha_vencimiento.month) for pago in pagos]
+        self.assertEqual(len(pagos), 12)
+        self.assertEqual(len(set(meses)), 12)
+        self.assertTrue(all(pago.monto == Decimal('1000000') for pago in pagos))
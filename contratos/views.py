@@ -3,11 +3,13 @@ from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.core.paginator import Paginator
+from django.db import transaction
+from core.paginacion import paginar
 from .models import Contrato, FirmaDigital
 from .forms import ContratoForm, FirmaContratoForm, BusquedaContratoForm, VencerContratoForm
 from notificaciones.models import Notificacion
 from pagos.models import Pago
+from calendar import monthrange
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 
@@ -36,9 +38,7 @@ def listar_contratos(request):
         if fecha_hasta:
             contratos = contratos.filter(fecha_fin__lte=fecha_hasta)
     
-    paginator = Paginator(contratos, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar(request, contratos, 10)
     
     context = {
         'contratos': page_obj,
@@ -196,16 +196,8 @@ def firmar_contrato(request, contrato_id):
                 generar_pagos_contrato(contrato)
                 
                 # Notificar a ambas partes
-                Notificacion.objects.create(
-                    usuario=contrato.inmueble.propietario,
-                    titulo='Contrato Activado',
-                    mensaje=f'El contrato {contrato.numero_contrato} ha sido firmado y activado',
-                    tipo='contrato',
-                    enlace=reverse('contratos:detalle', args=[contrato.id])
-                )
-                
-                Notificacion.objects.create(
-                    usuario=contrato.inquilino,
+                Notificacion.objects.notify_many(
+                    [contrato.inmueble.propietario_id, contrato.inquilino_id],
                     titulo='Contrato Activado',
                     mensaje=f'El contrato {contrato.numero_contrato} ha sido firmado y activado',
                     tipo='contrato',
@@ -214,8 +206,9 @@ def firmar_contrato(request, contrato_id):
             else:
                 contrato.estado = 'pendiente_firma'
             
-            contrato.save()
-            contrato.save_to_firebase()
+            with transaction.atomic():
+                contrato.save()
+                contrato.save_to_firebase()
             
             messages.success(request, 'Contrato firmado exitosamente.')
             return redirect('contratos:detalle', contrato_id=contrato.id)
@@ -279,8 +272,9 @@ def vencer_contrato(request, contrato_id):
             contrato.estado = 'vencido'
             contrato.motivo_cierre = motivo
             contrato.fecha_cierre = timezone.now()
-            contrato.save()
-            contrato.save_to_firebase()
+            with transaction.atomic():
+                contrato.save()
+                contrato.save_to_firebase()
 
             # Notificar a ambas partes
             Notificacion.objects.create(
@@ -309,33 +303,56 @@ def vencer_contrato(request, contrato_id):
     })
 
 
-def generar_pagos_contrato(contrato):
-    """Genera los pagos mensuales automáticamente para un contrato"""
+def fecha_dia_pago(fecha, dia_pago):
+    """Fecha del mes de `fecha` con el día de pago (el último día si el mes es más corto)"""
+    return fecha.replace(day=min(dia_pago, monthrange(fecha.year, fecha.month)[1]))
+
+
+def calendario_pagos(contrato):
+    """
+    Calcula en memoria los pagos mensuales del contrato (sin número ni guardar).
+    Cada periodo se cuenta desde fecha_inicio para que los meses cortos no
+    desplacen los siguientes (31 ene -> 28 feb -> 31 mar).
+    """
+    hoy = timezone.now().date()
+    monto = contrato.get_valor_total_mensual()
+    pagos = []
+    meses = 0
     fecha_actual = contrato.fecha_inicio
-    numero_pago = 1
-    
     while fecha_actual <= contrato.fecha_fin:
-        # Calcular fecha de vencimiento
-        if fecha_actual.day < contrato.dia_pago:
-            fecha_vencimiento = fecha_actual.replace(day=contrato.dia_pago)
-        else:
-            # Si ya pasó el día de pago este mes, programar para el siguiente
-            siguiente_mes = fecha_actual + relativedelta(months=1)
-            fecha_vencimiento = siguiente_mes.replace(day=contrato.dia_pago)
-        
-        # Crear pago
-        Pago.objects.create(
+        siguiente = contrato.fecha_inicio + relativedelta(months=meses + 1)
+        fecha_vencimiento = fecha_dia_pago(fecha_actual, contrato.dia_pago)
+        # Si ya pasó el día de pago este mes, programar para el siguiente
+        if fecha_actual >= fecha_vencimiento:
+            fecha_vencimiento = fecha_dia_pago(fecha_actual + relativedelta(months=1), contrato.dia_pago)
+
+        pagos.append(Pago(
             contrato=contrato,
             periodo_inicio=fecha_actual,
-            periodo_fin=fecha_actual + relativedelta(months=1) - timedelta(days=1),
+            periodo_fin=siguiente - timedelta(days=1),
             fecha_vencimiento=fecha_vencimiento,
-            monto=contrato.get_valor_total_mensual(),
-            concepto=f'Arriendo mes {numero_pago}',
-            estado='pendiente'
-        )
-        
-        fecha_actual = fecha_actual + relativedelta(months=1)
-        numero_pago += 1
+            monto=monto,
+            concepto=f'Arriendo mes {meses + 1}',
+            # Mismo estado que asignaría Pago.save (bulk_create no lo llama)
+            estado='vencido' if fecha_vencimiento < hoy else 'pendiente',
+        ))
+        meses += 1
+        fecha_actual = siguiente
+    return pagos
+
+
+def generar_pagos_contrato(contrato):
+    """Genera los pagos mensuales del contrato: una reserva de números y un solo bulk_create"""
+    from core.firebase_sync import encolar_nuevos
+    from pagos.ledger import registrar_pagos_nuevos
+
+    pagos = calendario_pagos(contrato)
+    with transaction.atomic():
+        Pago.numerar(pagos)
+        creados = Pago.objects.bulk_create(pagos, batch_size=500)
+        registrar_pagos_nuevos(creados)
+        encolar_nuevos(creados)
+    return creados
 
 
 def get_client_ip(request):
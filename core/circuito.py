@@ -0,0 +1,85 @@
+"""
+Circuit breaker para servicios externos no críticos (la réplica en Firestore).
+
+Tras `umbral` fallos consecutivos el circuito se abre y las llamadas se omiten
+con CircuitoAbierto sin esperar al servicio. Pasados `espera` segundos pasa a
+semiabierto: se deja pasar una sola llamada de prueba; si funciona se cierra y
+si falla vuelve a abrirse. El estado y los conteos se publican en core.metricas
+como <nombre>.abierto (0/1), <nombre>.aperturas y <nombre>.omitidas.
+"""
+import threading
+import time
+from . import metricas
+
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+
+class CircuitoAbierto(Exception):
+    """La llamada se omitió porque el circuito está abierto"""
+
+
+class Circuito:
+    def __init__(self, nombre, umbral=5, espera=30.0):
+        self.nombre = nombre
+        self.umbral = umbral
+        self.espera = espera
+        self.estado = CERRADO
+        self.fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def _permitir(self):
+        with self._lock:
+            if self.estado == CERRADO:
+                return False
+            if self.estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.espera:
+                self.estado = SEMIABIERTO
+            if self.estado == SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+        metricas.incrementar(f'{self.nombre}.omitidas')
+        raise CircuitoAbierto(f'Circuito {self.nombre} abierto')
+
+    def _exito(self, es_prueba):
+        with self._lock:
+            if es_prueba:
+                self._prueba_en_curso = False
+            cerrar = self.estado != CERRADO
+            self.estado = CERRADO
+            self.fallos = 0
+        if cerrar:
+            metricas.fijar(f'{self.nombre}.abierto', 0)
+
+    def _fallo(self, es_prueba):
+        with self._lock:
+            if es_prueba:
+                self._prueba_en_curso = False
+            self.fallos += 1
+            abrir = es_prueba or (self.estado == CERRADO and self.fallos >= self.umbral)
+            if abrir:
+                self.estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+        if abrir:
+            metricas.incrementar(f'{self.nombre}.aperturas')
+            metricas.fijar(f'{self.nombre}.abierto', 1)
+
+    def llamar(self, funcion, *args, **kwargs):
+        """Ejecuta funcion a través del circuito; lanza CircuitoAbierto si está abierto"""
+        es_prueba = self._permitir()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception:
+            self._fallo(es_prueba)
+            raise
+        self._exito(es_prueba)
+        return resultado
+
+    def reiniciar(self):
+        with self._lock:
+            self.estado = CERRADO
+            self.fallos = 0
+            self._prueba_en_curso = False
+        metricas.fijar(f'{self.nombre}.abierto', 0)
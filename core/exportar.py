@@ -0,0 +1,356 @@
+"""
+Exportación de reportes (pagos, contratos y mantenimientos) en CSV y XLSX.
+
+Las filas se leen con values_list(...).iterator(chunk_size=2000): una sola
+consulta con los JOIN de las columnas relacionadas, recorrida por bloques y sin
+crear instancias de modelo. Se envían con StreamingHttpResponse a medida que se
+escriben, así la memoria no depende del número de filas:
+- CSV: csv.writer sobre un búfer que devuelve cada línea;
+- XLSX: la hoja se escribe como XML (SpreadsheetML, texto en línea) dentro de
+  un ZIP que se envía por partes, sin cargar el libro en memoria.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+TAMANO_BLOQUE = 2000
+
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+MAX_FILAS_XLSX = 1048576
+
+FORMATOS = ('csv', 'xlsx')
+
+
+class SalidaPorPartes(io.RawIOBase):
+    """Destino de escritura sin seek que entrega lo escrito por partes (ZIP en streaming)"""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def filtrar_reportes(usuario, fecha_desde=None, fecha_hasta=None, inmueble=None):
+    """Pagos, mantenimientos y contratos del propietario con los filtros de los reportes"""
+    from contratos.models import Contrato
+    from mantenimientos.models import Mantenimiento
+    from pagos.models import Pago
+
+    pagos = Pago.objects.filter(contrato__inmueble__propietario=usuario)
+    mantenimientos = Mantenimiento.objects.filter(inmueble__propietario=usuario)
+    contratos = Contrato.objects.filter(inmueble__propietario=usuario)
+
+    if inmueble:
+        pagos = pagos.filter(contrato__inmueble_id=inmueble)
+        mantenimientos = mantenimientos.filter(inmueble_id=inmueble)
+        contratos = contratos.filter(inmueble_id=inmueble)
+
+    if fecha_desde:
+        pagos = pagos.filter(fecha_pago__gte=fecha_desde)
+        mantenimientos = mantenimientos.filter(fecha_solicitud__gte=fecha_desde)
+        contratos = contratos.filter(fecha_inicio__gte=fecha_desde)
+    if fecha_hasta:
+        pagos = pagos.filter(fecha_pago__lte=fecha_hasta)
+        mantenimientos = mantenimientos.filter(fecha_solicitud__lte=fecha_hasta)
+        contratos = contratos.filter(fecha_fin__lte=fecha_hasta)
+
+    return {
+        'pagos': pagos.order_by('-fecha_pago'),
+        'mantenimientos': mantenimientos.order_by('-fecha_solicitud'),
+        'contratos': contratos.order_by('-fecha_inicio'),
+    }
+
+
+def _nombre(nombre, apellido):
+    return f'{nombre} {apellido}'.strip()
+
+
+# (encabezado, campo o tupla de campos, formato opcional). Los campos con
+# choices se exportan con su etiqueta.
+COLUMNAS = {
+    'pagos': [
+        ('Número', 'numero_pago'),
+        ('Contrato', 'contrato__numero_contrato'),
+        ('Inmueble', 'contrato__inmueble__titulo'),
+        ('Inquilino', ('contrato__inquilino__first_name', 'contrato__inquilino__last_name'), _nombre),
+        ('Concepto', 'concepto'),
+        ('Período inicio', 'periodo_inicio'),
+        ('Período fin', 'periodo_fin'),
+        ('Vencimiento', 'fecha_vencimiento'),
+        ('Fecha de pago', 'fecha_pago'),
+        ('Monto', 'monto'),
+        ('Mora', 'mora'),
+        ('Monto pagado', 'monto_pagado'),
+        ('Estado', 'estado'),
+        ('Método de pago', 'metodo_pago'),
+        ('Referencia', 'referencia_pago'),
+    ],
+    'contratos': [
+        ('Número', 'numero_contrato'),
+        ('Inmueble', 'inmueble__titulo'),
+        ('Inquilino', ('inquilino__first_name', 'inquilino__last_name'), _nombre),
+        ('Estado', 'estado'),
+        ('Inicio', 'fecha_inicio'),
+        ('Fin', 'fecha_fin'),
+        ('Valor arriendo', 'valor_arriendo'),
+        ('Valor administración', 'valor_administracion'),
+        ('Depósito', 'valor_deposito'),
+        ('Día de pago', 'dia_pago'),
+    ],
+    'mantenimientos': [
+        ('Número', 'numero_ticket'),
+        ('Inmueble', 'inmueble__titulo'),
+        ('Título', 'titulo'),
+        ('Tipo', 'tipo'),
+        ('Prioridad', 'prioridad'),
+        ('Estado', 'estado'),
+        ('Solicitado', 'fecha_solicitud'),
+        ('Completado', 'fecha_completado'),
+        ('Costo estimado', 'costo_estimado'),
+        ('Costo final', 'costo_final'),
+        ('Responsable del costo', 'responsable_costo'),
+    ],
+}
+
+
+def _campo(modelo, ruta):
+    partes = ruta.split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(partes[-1])
+
+
+def _preparar(modelo, columnas):
+    """Campos para values_list y, por columna, (posiciones, formato)"""
+    campos = []
+    lectores = []
+    for encabezado, rutas, *formato in columnas:
+        rutas = (rutas,) if isinstance(rutas, str) else rutas
+        posiciones = list(range(len(campos), len(campos) + len(rutas)))
+        campos.extend(rutas)
+        if formato:
+            funcion = formato[0]
+        else:
+            campo = _campo(modelo, rutas[0])
+            funcion = dict(campo.flatchoices).get if campo.choices else None
+        lectores.append((posiciones, funcion))
+    return campos, lectores
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        # Hora local sin zona: es lo que entienden CSV y Excel
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor).replace(tzinfo=None)
+        return valor.replace(microsecond=0)
+    return valor
+
+
+def filas(queryset, columnas):
+    """Recorre el queryset por bloques y produce una lista de valores por fila"""
+    campos, lectores = _preparar(queryset.model, columnas)
+    for fila in queryset.values_list(*campos).iterator(chunk_size=TAMANO_BLOQUE):
+        valores = []
+        for posiciones, funcion in lectores:
+            if funcion is None:
+                valores.append(_valor(fila[posiciones[0]]))
+            elif len(posiciones) == 1:
+                valor = fila[posiciones[0]]
+                valores.append(funcion(valor, valor))
+            else:
+                valores.append(funcion(*(fila[i] for i in posiciones)))
+        yield valores
+
+
+class _Linea:
+    """Búfer para csv.writer que devuelve la línea escrita en lugar de guardarla"""
+
+    def write(self, linea):
+        return linea
+
+
+# Primeros caracteres con los que Excel interpreta una celda de texto como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celda_csv(valor):
+    """Valor de una celda del CSV; el texto que parece fórmula se antepone con '"""
+    if valor is None:
+        return ''
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def csv_por_partes(encabezados, filas_datos):
+    """Produce el CSV (UTF-8 con BOM para Excel) en bloques de TAMANO_BLOQUE filas"""
+    escritor = csv.writer(_Linea())
+    bloque = ['\ufeff' + escritor.writerow(encabezados)]
+    for fila in filas_datos:
+        bloque.append(escritor.writerow([_celda_csv(valor) for valor in fila]))
+        if len(bloque) >= TAMANO_BLOQUE:
+            yield ''.join(bloque).encode('utf-8')
+            bloque = []
+    if bloque:
+        yield ''.join(bloque).encode('utf-8')
+
+
+# Partes fijas del XLSX; estilo 1: encabezado en negrita, 2: fecha, 3: fecha y hora
+_XLSX_FIJOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+        '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+
+# Caracteres de control que XML no admite
+_NO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _letra_columna(indice):
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(ref, valor, estilo_texto=''):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c r="{ref}"><v>{valor}</v></c>'
+    if isinstance(valor, datetime):
+        serial = (valor - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c r="{ref}" s="3"><v>{serial}</v></c>'
+    if isinstance(valor, date):
+        return f'<c r="{ref}" s="2"><v>{(valor - _EPOCA_EXCEL.date()).days}</v></c>'
+    texto = escape(_NO_XML.sub('', str(valor)))
+    return f'<c r="{ref}" t="inlineStr"{estilo_texto}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, letras, valores, estilo_texto=''):
+    celdas = ''.join(_celda(f'{letra}{numero}', valor, estilo_texto) for letra, valor in zip(letras, valores))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def xlsx_por_partes(encabezados, filas_datos, hoja='Reporte'):
+    """
+    Produce un XLSX de una hoja a medida que se escribe. Las filas después de la
+    1.048.575 (límite de Excel) no se incluyen.
+    """
+    letras = [_letra_columna(i) for i in range(len(encabezados))]
+    salida = SalidaPorPartes()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archivo:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            archivo.writestr(nombre, contenido)
+        archivo.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(hoja[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield salida.vaciar()
+
+        with archivo.open('xl/worksheets/sheet1.xml', 'w') as xml:
+            xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>'
+                + _fila_xml(1, letras, encabezados, ' s="1"')
+            ).encode('utf-8'))
+            bloque = []
+            for numero, fila in enumerate(filas_datos, start=2):
+                if numero > MAX_FILAS_XLSX:
+                    break
+                bloque.append(_fila_xml(numero, letras, fila))
+                if len(bloque) >= TAMANO_BLOQUE:
+                    xml.write(''.join(bloque).encode('utf-8'))
+                    bloque = []
+                    yield salida.vaciar()
+            xml.write((''.join(bloque) + '</sheetData></worksheet>').encode('utf-8'))
+    yield salida.vaciar()
+
+
+def respuesta_exportacion(queryset, tipo, formato, nombre):
+    """StreamingHttpResponse con las filas del queryset (tipo: clave de COLUMNAS)"""
+    columnas = COLUMNAS[tipo]
+    encabezados = [columna[0] for columna in columnas]
+    datos = filas(queryset, columnas)
+    if formato == 'xlsx':
+        response = StreamingHttpResponse(
+            xlsx_por_partes(encabezados, datos, hoja=tipo.capitalize()),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(csv_por_partes(encabezados, datos), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return response
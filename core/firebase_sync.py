@@ -0,0 +1,540 @@
+"""
+Réplica de los modelos en Firebase mediante un outbox transaccional.
+
+Los modelos replicados definen FIREBASE_COLECCION y get_datos_firebase().
+save_to_firebase() ya no llama a Firestore: inserta una fila en OutboxFirebase
+dentro de la transacción de la petición. HuellaFirebase guarda un hash por campo
+del último contenido encolado de cada documento, así que las llamadas sin cambios
+se omiten y los cambios se encolan como actualizaciones parciales. El comando
+drenar_firebase lee el outbox en orden, combina las escrituras del mismo
+documento en una sola y las envía por lotes, con reintentos y backoff exponencial.
+
+El cliente se crea al primer uso según settings.FIREBASE_BACKEND ('firestore',
+'noop' o 'memoria'); firebase_admin solo se importa con el backend 'firestore'.
+Para pruebas también se puede usar configurar_cliente().
+
+Todas las llamadas a Firestore pasan por llamar(): llevan un plazo máximo
+(FIREBASE_TIMEOUT) y un circuit breaker compartido (ver core.circuito) que deja
+de llamar al servicio tras FIREBASE_CIRCUITO_FALLOS fallos seguidos.
+"""
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import metricas
+from .circuito import Circuito, CircuitoAbierto
+
+# Firestore admite como máximo 500 escrituras por lote
+TAMANO_LOTE = 500
+BACKOFF_BASE = 2
+BACKOFF_MAXIMO = 300
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+circuito = Circuito(
+    'firebase.circuito',
+    umbral=getattr(settings, 'FIREBASE_CIRCUITO_FALLOS', 5),
+    espera=getattr(settings, 'FIREBASE_CIRCUITO_ESPERA', 30),
+)
+
+
+def _cliente_firestore():
+    """Inicializa firebase_admin con las credenciales del proyecto y retorna el cliente"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        ruta = os.path.join(settings.BASE_DIR, settings.FIREBASE_CREDENTIALS_PATH)
+        if os.path.exists(ruta):
+            firebase_admin.initialize_app(credentials.Certificate(ruta))
+        else:
+            firebase_admin.initialize_app()
+    return firestore.client()
+
+
+def backend():
+    """Nombre del backend de la réplica configurado"""
+    return getattr(settings, 'FIREBASE_BACKEND', 'firestore')
+
+
+def llamar(funcion, *args, **kwargs):
+    """
+    Ejecuta una llamada de Firestore con plazo máximo y a través del circuit
+    breaker. Lanza CircuitoAbierto sin llamar al servicio si el circuito está abierto.
+    """
+    kwargs.setdefault('timeout', getattr(settings, 'FIREBASE_TIMEOUT', 10))
+    try:
+        return circuito.llamar(funcion, *args, **kwargs)
+    except Exception as e:
+        if isinstance(e, TimeoutError) or type(e).__name__ == 'DeadlineExceeded':
+            metricas.incrementar('firebase.timeouts')
+        raise
+
+
+def replica_activa():
+    return backend() != 'noop'
+
+
+def obtener_cliente():
+    """Cliente del backend configurado (se crea al primer uso)"""
+    global _cliente
+    if _cliente is None:
+        with _lock_cliente:
+            if _cliente is None:
+                nombre = backend()
+                if nombre == 'firestore':
+                    _cliente = _cliente_firestore()
+                elif nombre == 'noop':
+                    _cliente = ClienteNulo()
+                elif nombre == 'memoria':
+                    _cliente = FirestoreEnMemoria()
+                else:
+                    _cliente = import_string(nombre)()
+    return _cliente
+
+
+def configurar_cliente(cliente):
+    """Reemplaza el cliente de Firestore (p. ej. por FirestoreEnMemoria en pruebas)"""
+    global _cliente
+    _cliente = cliente
+
+
+def modelos_replicados():
+    """Modelos con réplica en Firebase: {colección: modelo}"""
+    return {
+        modelo.FIREBASE_COLECCION: modelo
+        for modelo in apps.get_models()
+        if getattr(modelo, 'FIREBASE_COLECCION', None)
+    }
+
+
+def serializar(datos):
+    """Datos tal como quedan en el outbox (fechas y decimales como texto)"""
+    return json.loads(json.dumps(datos, cls=DjangoJSONEncoder))
+
+
+def queryset_replica(modelo):
+    """Queryset para leer en bloque las instancias de un modelo replicado"""
+    relacionados = getattr(modelo, 'FIREBASE_RELACIONADOS', None)
+    # select_related() sin argumentos seguiría todas las llaves foráneas
+    return modelo.objects.select_related(*relacionados) if relacionados else modelo.objects.all()
+
+
+def huellas_campos(datos):
+    """Hash corto de cada campo de un documento ya serializado"""
+    return {
+        campo: hashlib.sha1(json.dumps(valor, sort_keys=True).encode()).hexdigest()[:16]
+        for campo, valor in datos.items()
+    }
+
+
+def huella_documento(campos):
+    """Hash del documento completo a partir de los hashes de sus campos"""
+    return hashlib.sha1(json.dumps(campos, sort_keys=True).encode()).hexdigest()
+
+
+def encolar(instancia):
+    """
+    Registra en el outbox la escritura del documento de la instancia. Si el
+    contenido es igual al último encolado no hace nada (retorna False); si solo
+    cambiaron algunos campos encola una actualización parcial con esos campos.
+    """
+    return encolar_cambios([instancia]) > 0
+
+
+def encolar_nuevos(instancias):
+    """
+    Encola en un solo insert por lote la réplica de instancias recién creadas
+    (p. ej. con bulk_create), que todavía no tienen huella. Retorna la cantidad.
+    """
+    from .models import HuellaFirebase, OutboxFirebase
+
+    if not replica_activa() or not instancias:
+        return 0
+
+    filas = []
+    huellas = []
+    for instancia in instancias:
+        datos = serializar(instancia.get_datos_firebase())
+        campos = huellas_campos(datos)
+        filas.append(OutboxFirebase(
+            coleccion=instancia.FIREBASE_COLECCION, documento=str(instancia.pk), datos=datos,
+        ))
+        huellas.append(HuellaFirebase(
+            coleccion=instancia.FIREBASE_COLECCION, documento=str(instancia.pk),
+            huella=huella_documento(campos), campos=campos,
+        ))
+
+    with transaction.atomic():
+        OutboxFirebase.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+        # Una huella vieja de un id reutilizado se reemplaza
+        HuellaFirebase.objects.bulk_create(
+            huellas,
+            batch_size=TAMANO_LOTE,
+            update_conflicts=True,
+            unique_fields=['coleccion', 'documento'],
+            update_fields=['huella', 'campos', 'fecha_actualizacion'],
+        )
+    metricas.incrementar('firebase.completas', len(filas))
+    return len(filas)
+
+
+def encolar_cambios(instancias):
+    """
+    Versión por lotes de encolar() para instancias de una misma colección,
+    también las modificadas sin save() (p. ej. con update()). Una consulta de
+    huellas, un insert de filas y un upsert de huellas. Retorna la cantidad de
+    filas encoladas.
+    """
+    from .models import HuellaFirebase, OutboxFirebase
+
+    if not replica_activa() or not instancias:
+        return 0
+
+    coleccion = instancias[0].FIREBASE_COLECCION
+    filas = []
+    huellas = []
+    omitidas = parciales = 0
+    with transaction.atomic():
+        anteriores = {
+            huella.documento: huella
+            for huella in HuellaFirebase.objects.select_for_update().filter(
+                coleccion=coleccion, documento__in=[str(instancia.pk) for instancia in instancias],
+            )
+        }
+        for instancia in instancias:
+            documento = str(instancia.pk)
+            datos = serializar(instancia.get_datos_firebase())
+            campos = huellas_campos(datos)
+            huella = huella_documento(campos)
+            anterior = anteriores.get(documento)
+            if anterior is not None and anterior.huella == huella:
+                omitidas += 1
+                continue
+            if anterior is not None and anterior.campos.keys() == campos.keys():
+                cambios = {campo: datos[campo] for campo in campos if anterior.campos[campo] != campos[campo]}
+                filas.append(OutboxFirebase(coleccion=coleccion, documento=documento, operacion='update', datos=cambios))
+                parciales += 1
+            else:
+                filas.append(OutboxFirebase(coleccion=coleccion, documento=documento, datos=datos))
+            huellas.append(HuellaFirebase(coleccion=coleccion, documento=documento, huella=huella, campos=campos))
+
+        OutboxFirebase.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+        HuellaFirebase.objects.bulk_create(
+            huellas,
+            batch_size=TAMANO_LOTE,
+            update_conflicts=True,
+            unique_fields=['coleccion', 'documento'],
+            update_fields=['huella', 'campos', 'fecha_actualizacion'],
+        )
+    for nombre, cantidad in (('omitidas', omitidas), ('parciales', parciales), ('completas', len(filas) - parciales)):
+        if cantidad:
+            metricas.incrementar(f'firebase.{nombre}', cantidad)
+    return len(filas)
+
+
+def encolar_eliminacion(coleccion, documento):
+    """Registra en el outbox la eliminación de un documento"""
+    from .models import HuellaFirebase, OutboxFirebase
+
+    if not replica_activa():
+        return False
+
+    with transaction.atomic():
+        OutboxFirebase.objects.create(coleccion=coleccion, documento=str(documento), operacion='delete')
+        HuellaFirebase.objects.filter(coleccion=coleccion, documento=str(documento)).delete()
+    return True
+
+
+def contar_pendientes():
+    """Cantidad de filas en el outbox"""
+    from .models import OutboxFirebase
+
+    return OutboxFirebase.objects.count()
+
+
+def backoff(intentos):
+    """Segundos hasta el siguiente intento (exponencial con jitter, acotado)"""
+    espera = min(BACKOFF_BASE ** intentos, BACKOFF_MAXIMO)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _escribir(cliente, pendientes):
+    """Envía las escrituras en un lote de Firestore"""
+    lote = cliente.batch()
+    for fila in pendientes:
+        referencia = cliente.collection(fila.coleccion).document(fila.documento)
+        if fila.operacion == 'delete':
+            lote.delete(referencia)
+        elif fila.operacion == 'update':
+            # merge=True escribe solo los campos enviados y no falla si el documento no existe
+            lote.set(referencia, fila.datos, merge=True)
+        else:
+            lote.set(referencia, fila.datos)
+    llamar(lote.commit)
+
+
+def _combinar(filas):
+    """
+    Escritura equivalente a aplicar en orden las filas de un documento. Conserva
+    el id de la última fila para confirmar todas las anteriores al enviarla.
+    """
+    operacion, datos = None, {}
+    for fila in filas:
+        if fila.operacion == 'update' and operacion in ('set', 'update'):
+            datos.update(fila.datos)
+        else:
+            operacion, datos = fila.operacion, dict(fila.datos or {})
+    combinada = copy.copy(filas[-1])
+    combinada.operacion = operacion
+    combinada.datos = datos
+    return combinada
+
+
+def _confirmar(filas):
+    """Elimina del outbox las filas enviadas y las anteriores del mismo documento (quedan reemplazadas)"""
+    from .models import OutboxFirebase
+
+    condicion = Q()
+    for fila in filas:
+        condicion |= Q(coleccion=fila.coleccion, documento=fila.documento, id__lte=fila.id)
+    OutboxFirebase.objects.filter(condicion).delete()
+
+
+def escribir_documentos(cliente, coleccion, documentos):
+    """Escribe en un lote los documentos [(id, datos)] de una colección"""
+    if len(documentos) > TAMANO_LOTE:
+        raise ValueError(f'Un lote admite máximo {TAMANO_LOTE} escrituras')
+    lote = cliente.batch()
+    referencias = cliente.collection(coleccion)
+    for documento, datos in documentos:
+        lote.set(referencias.document(str(documento)), datos)
+    llamar(lote.commit)
+
+
+def _reprogramar(filas, error):
+    """Registra el fallo y programa el siguiente intento de cada fila"""
+    from .models import OutboxFirebase
+
+    ahora = timezone.now()
+    for fila in filas:
+        fila.intentos += 1
+        fila.proximo_intento = ahora + timedelta(seconds=backoff(fila.intentos))
+        fila.ultimo_error = str(error)[:1000]
+    OutboxFirebase.objects.bulk_update(filas, ['intentos', 'proximo_intento', 'ultimo_error'])
+
+
+def drenar(cliente=None, limite=TAMANO_LOTE * 4):
+    """
+    Envía a Firestore hasta `limite` filas pendientes del outbox. Retorna un
+    diccionario con las filas leídas, documentos escritos y fallidos.
+    """
+    from .models import OutboxFirebase
+
+    cliente = cliente or obtener_cliente()
+    ahora = timezone.now()
+    # Los documentos con filas esperando reintento no se envían (las
+    # actualizaciones parciales deben aplicarse en orden). Se excluyen en SQL
+    # antes del límite para que no bloqueen a los documentos siguientes.
+    en_espera = OutboxFirebase.objects.filter(
+        coleccion=OuterRef('coleccion'), documento=OuterRef('documento'), proximo_intento__gt=ahora,
+    )
+    filas = list(
+        OutboxFirebase.objects.filter(Q(proximo_intento__isnull=True) | Q(proximo_intento__lte=ahora))
+        .exclude(Exists(en_espera))
+        .order_by('id')[:limite]
+    )
+
+    # Una sola escritura por documento (las filas vienen en orden de id)
+    por_documento = {}
+    for fila in filas:
+        por_documento.setdefault((fila.coleccion, fila.documento), []).append(fila)
+    pendientes = [_combinar(grupo) for grupo in por_documento.values()]
+
+    escritos = 0
+    fallidos = 0
+    circuito_abierto = False
+    for inicio in range(0, len(pendientes), TAMANO_LOTE):
+        lote = pendientes[inicio:inicio + TAMANO_LOTE]
+        try:
+            _escribir(cliente, lote)
+            enviados, errores = lote, []
+        except CircuitoAbierto:
+            # Las filas quedan en el outbox sin contar un intento
+            circuito_abierto = True
+            break
+        except Exception:
+            # Aislar los documentos que fallan para no bloquear al resto del lote
+            enviados, errores = [], []
+            for fila in lote:
+                try:
+                    _escribir(cliente, [fila])
+                    enviados.append(fila)
+                except CircuitoAbierto:
+                    circuito_abierto = True
+                    break
+                except Exception as e:
+                    errores.append((fila, e))
+
+        with transaction.atomic():
+            if enviados:
+                _confirmar(enviados)
+            for fila, error in errores:
+                # Todas las filas del documento, para reintentarlas juntas y en orden
+                _reprogramar(por_documento[(fila.coleccion, fila.documento)], error)
+        escritos += len(enviados)
+        fallidos += len(errores)
+        if circuito_abierto:
+            break
+
+    metricas.incrementar('firebase.escrituras', escritos)
+    metricas.incrementar('firebase.coalescidas', sum(len(grupo) - 1 for grupo in por_documento.values()))
+    metricas.incrementar('firebase.errores', fallidos)
+    return {'leidas': len(filas), 'escritos': escritos, 'fallidos': fallidos, 'circuito_abierto': circuito_abierto}
+
+
+class _InstantaneaEnMemoria:
+    def __init__(self, referencia, datos):
+        self.reference = referencia
+        self.id = referencia.id
+        self.exists = datos is not None
+        self._datos = datos
+
+    def to_dict(self):
+        return dict(self._datos) if self._datos is not None else None
+
+
+class _DocumentoEnMemoria:
+    def __init__(self, cliente, coleccion, documento):
+        self._cliente = cliente
+        self.path = f'{coleccion}/{documento}'
+        self.coleccion = coleccion
+        self.id = documento
+
+    def set(self, datos, merge=False, timeout=None):
+        self._cliente._verificar(timeout)
+        self._cliente._set(self.coleccion, self.id, datos, merge)
+
+    def delete(self, timeout=None):
+        self._cliente._verificar(timeout)
+        self._cliente.datos.get(self.coleccion, {}).pop(self.id, None)
+
+    def get(self):
+        return _InstantaneaEnMemoria(self, self._cliente.datos.get(self.coleccion, {}).get(self.id))
+
+
+class _ColeccionEnMemoria:
+    def __init__(self, cliente, coleccion):
+        self._cliente = cliente
+        self.coleccion = coleccion
+
+    def document(self, documento):
+        return _DocumentoEnMemoria(self._cliente, self.coleccion, str(documento))
+
+    def list_documents(self, page_size=None, timeout=None):
+        with self._cliente._lock:
+            documentos = list(self._cliente.datos.get(self.coleccion, {}))
+        for documento in documentos:
+            yield self.document(documento)
+
+
+class _LoteEnMemoria:
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._operaciones = []
+
+    def set(self, referencia, datos, merge=False):
+        self._operaciones.append(('set', referencia, datos, merge))
+
+    def delete(self, referencia):
+        self._operaciones.append(('delete', referencia, None, False))
+
+    def commit(self, timeout=None):
+        if len(self._operaciones) > TAMANO_LOTE:
+            raise ValueError(f'Un lote admite máximo {TAMANO_LOTE} escrituras')
+        self._cliente._verificar(timeout)
+        with self._cliente._lock:
+            self._cliente.lotes += 1
+            for operacion, referencia, datos, merge in self._operaciones:
+                if operacion == 'delete':
+                    self._cliente.datos.get(referencia.coleccion, {}).pop(referencia.id, None)
+                else:
+                    self._cliente._set(referencia.coleccion, referencia.id, datos, merge)
+
+
+class FirestoreEnMemoria:
+    """
+    Cliente falso de Firestore para pruebas y desarrollo. Guarda los documentos
+    en `datos` ({colección: {documento: datos}}) y cuenta escrituras y lotes.
+    fallar_con puede asignarse a una excepción para simular errores y latencia
+    (segundos) para simular un servicio lento: si supera el timeout de la
+    llamada, esta espera el timeout y lanza TimeoutError.
+    """
+
+    def __init__(self, latencia=0.0):
+        self.datos = {}
+        self.escrituras = 0
+        self.lotes = 0
+        self.fallar_con = None
+        self.latencia = latencia
+        self._lock = threading.Lock()
+
+    def _verificar(self, timeout=None):
+        if self.latencia:
+            if timeout is not None and self.latencia > timeout:
+                time.sleep(timeout)
+                raise TimeoutError('Deadline Exceeded')
+            time.sleep(self.latencia)
+        if self.fallar_con is not None:
+            raise self.fallar_con
+
+    def _set(self, coleccion, documento, datos, merge):
+        self.escrituras += 1
+        documentos = self.datos.setdefault(coleccion, {})
+        if merge and documento in documentos:
+            documentos[documento] = {**documentos[documento], **datos}
+        else:
+            documentos[documento] = dict(datos)
+
+    def collection(self, coleccion):
+        return _ColeccionEnMemoria(self, coleccion)
+
+    def batch(self):
+        return _LoteEnMemoria(self)
+
+    def get_all(self, referencias, timeout=None):
+        self._verificar(timeout)
+        return [referencia.get() for referencia in referencias]
+
+
+class _LoteNulo:
+    def set(self, referencia, datos, merge=False):
+        pass
+
+    def delete(self, referencia):
+        pass
+
+    def commit(self, timeout=None):
+        pass
+
+
+class ClienteNulo(FirestoreEnMemoria):
+    """Cliente que descarta las escrituras (backend 'noop')"""
+
+    def batch(self):
+        return _LoteNulo()
+
+    def _set(self, coleccion, documento, datos, merge):
+        pass
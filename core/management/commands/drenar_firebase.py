@@ -0,0 +1,67 @@
+"""
+Envía a Firebase las escrituras pendientes del outbox (core.firebase_sync).
+
+Debe correr un solo proceso drenador a la vez:
+    python manage.py drenar_firebase --continuo
+"""
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core import firebase_sync, metricas
+
+
+class Command(BaseCommand):
+    help = 'Envía a Firebase las escrituras pendientes del outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Seguir drenando hasta recibir SIGINT/SIGTERM')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando el outbox está vacío')
+        parser.add_argument('--limite', type=int, default=2000, help='Filas leídas por pasada')
+        parser.add_argument('--memoria', action='store_true', help='Usar un Firestore en memoria (pruebas)')
+
+    def handle(self, *args, **options):
+        cliente = firebase_sync.FirestoreEnMemoria() if options['memoria'] else None
+        self._detener = False
+        if options['continuo']:
+            signal.signal(signal.SIGINT, self._solicitar_detencion)
+            signal.signal(signal.SIGTERM, self._solicitar_detencion)
+
+        while True:
+            close_old_connections()
+            try:
+                resultado = firebase_sync.drenar(cliente=cliente, limite=options['limite'])
+            except Exception as e:
+                # Sin cliente (credenciales, red): en modo continuo se reintenta en la siguiente pasada
+                if not options['continuo']:
+                    raise
+                self.stderr.write(f'Error al drenar: {e}')
+                resultado = {'leidas': 0, 'escritos': 0, 'fallidos': 0, 'circuito_abierto': False}
+            if resultado['leidas']:
+                self.stdout.write(
+                    f"{resultado['leidas']} filas leídas, {resultado['escritos']} documentos escritos, "
+                    f"{resultado['fallidos']} fallidos"
+                )
+            if resultado['circuito_abierto']:
+                self.stderr.write('Circuito de Firebase abierto: las filas siguen en el outbox')
+            if not options['continuo'] or self._detener:
+                break
+            # Si la pasada llenó el límite y escribió hay más filas: seguir sin esperar.
+            # Sin escrituras (todo falló o en reintento) se espera para no girar contra la base.
+            if (resultado['leidas'] < options['limite'] or resultado['escritos'] == 0
+                    or resultado['circuito_abierto']):
+                self._esperar(options['intervalo'])
+            if self._detener:
+                break
+
+        metricas.volcar()
+        pendientes = firebase_sync.contar_pendientes()
+        self.stdout.write(self.style.SUCCESS(f'Drenado terminado ({pendientes} filas pendientes)'))
+
+    def _solicitar_detencion(self, *args):
+        self._detener = True
+
+    def _esperar(self, segundos):
+        fin = time.monotonic() + segundos
+        while not self._detener and time.monotonic() < fin:
+            time.sleep(min(0.2, segundos))
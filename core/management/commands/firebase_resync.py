@@ -0,0 +1,136 @@
+"""
+Vuelve a replicar en Firestore las tablas de los modelos replicados.
+
+Lee cada modelo por id con iterator(), arma lotes de hasta 500 documentos y los
+envía en paralelo con un pool de hilos acotado. Al terminar o al fallar indica
+el último id confirmado, desde el que se puede reanudar:
+    python manage.py firebase_resync --coleccion pagos --desde-id 1250000
+
+Los documentos se escriben directamente (no pasan por el outbox); si hay un
+drenador corriendo, lo que se encole durante el resync se aplica después.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.core.management.base import BaseCommand, CommandError
+from core import firebase_sync
+
+REINTENTOS = 3
+INTERVALO_PROGRESO = 10
+
+
+class Command(BaseCommand):
+    help = 'Replica en Firestore las tablas de los modelos replicados, por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coleccion', help='Replicar solo esta colección')
+        parser.add_argument('--desde-id', type=int, default=0, help='Reanudar desde este id (exclusivo); requiere --coleccion')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas leídas por consulta')
+        parser.add_argument('--workers', type=int, default=4, help='Lotes enviados en paralelo')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los documentos')
+        parser.add_argument('--memoria', action='store_true', help='Usar un Firestore en memoria (pruebas)')
+
+    def handle(self, *args, **options):
+        modelos = firebase_sync.modelos_replicados()
+        if options['coleccion']:
+            if options['coleccion'] not in modelos:
+                raise CommandError(f"Colección desconocida. Opciones: {', '.join(sorted(modelos))}")
+            modelos = {options['coleccion']: modelos[options['coleccion']]}
+        elif options['desde_id']:
+            raise CommandError('--desde-id requiere --coleccion')
+
+        cliente = None
+        if not options['dry_run']:
+            cliente = firebase_sync.FirestoreEnMemoria() if options['memoria'] else firebase_sync.obtener_cliente()
+
+        total = 0
+        inicio = time.monotonic()
+        for coleccion, modelo in sorted(modelos.items()):
+            queryset = firebase_sync.queryset_replica(modelo).filter(pk__gt=options['desde_id']).order_by('pk')
+            if options['dry_run']:
+                cantidad = queryset.count()
+                self.stdout.write(f'{coleccion}: {cantidad} documentos')
+                total += cantidad
+                continue
+
+            cantidad, ultimo_id, error = self._replicar(cliente, coleccion, queryset, options)
+            total += cantidad
+            if error:
+                raise CommandError(
+                    f'{coleccion}: {error}. Reanudar con --coleccion {coleccion} --desde-id {ultimo_id}'
+                )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total} documentos por replicar'))
+            return
+        segundos = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} documentos replicados en {segundos:.1f}s ({total / segundos if segundos else 0:.0f} docs/s)'
+        ))
+
+    def _replicar(self, cliente, coleccion, queryset, options):
+        """
+        Envía la colección por lotes. Retorna (documentos escritos, último id
+        confirmado sin huecos, error o None).
+        """
+        ultimo_id = options['desde_id']
+        escritos = 0
+        inicio = time.monotonic()
+        ultimo_reporte = inicio
+        # Lotes enviados en orden de id: [futuro, último id del lote, cantidad]
+        en_vuelo = deque()
+        error = None
+
+        def enviar(documentos):
+            for intento in range(REINTENTOS):
+                try:
+                    firebase_sync.escribir_documentos(cliente, coleccion, documentos)
+                    return
+                except Exception:
+                    if intento == REINTENTOS - 1:
+                        raise
+                    time.sleep(firebase_sync.backoff(intento))
+
+        def confirmar(bloquear):
+            """Avanza el punto de control con los lotes terminados en orden"""
+            nonlocal ultimo_id, escritos, error
+            if bloquear and en_vuelo:
+                wait([en_vuelo[0][0]])
+            while en_vuelo and en_vuelo[0][0].done():
+                futuro, id_lote, cantidad = en_vuelo.popleft()
+                if futuro.exception():
+                    error = error or futuro.exception()
+                    continue
+                if error is None:
+                    ultimo_id = id_lote
+                    escritos += cantidad
+
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='resync') as pool:
+            documentos = []
+            for instancia in queryset.iterator(chunk_size=options['chunk_size']):
+                documentos.append((instancia.pk, firebase_sync.serializar(instancia.get_datos_firebase())))
+                if len(documentos) < firebase_sync.TAMANO_LOTE:
+                    continue
+                # Acotar los lotes en memoria: esperar mientras todos los hilos estén ocupados
+                while len(en_vuelo) >= options['workers'] * 2 and error is None:
+                    confirmar(bloquear=True)
+                if error is not None:
+                    break
+                en_vuelo.append([pool.submit(enviar, documentos), documentos[-1][0], len(documentos)])
+                documentos = []
+                confirmar(bloquear=False)
+                if time.monotonic() - ultimo_reporte >= INTERVALO_PROGRESO:
+                    ultimo_reporte = time.monotonic()
+                    self.stdout.write(f'{coleccion}: {escritos} documentos, último id {ultimo_id}')
+
+            if documentos and error is None:
+                en_vuelo.append([pool.submit(enviar, documentos), documentos[-1][0], len(documentos)])
+            while en_vuelo:
+                confirmar(bloquear=True)
+
+        segundos = time.monotonic() - inicio
+        self.stdout.write(
+            f'{coleccion}: {escritos} documentos en {segundos:.1f}s '
+            f'({escritos / segundos if segundos else 0:.0f} docs/s), último id {ultimo_id}'
+        )
+        return escritos, ultimo_id, error
@@ -0,0 +1,33 @@
+"""
+Muestra los contadores de core.metricas y la tasa de aciertos de las cachés
+"""
+from django.core.management.base import BaseCommand
+from core import metricas
+
+
+class Command(BaseCommand):
+    help = 'Muestra los contadores de métricas de la aplicación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help='Poner los contadores en cero')
+
+    def handle(self, *args, **options):
+        if options['reiniciar']:
+            metricas.reiniciar()
+            self.stdout.write(self.style.SUCCESS('Métricas reiniciadas'))
+            return
+
+        valores = metricas.obtener()
+        if not valores:
+            self.stdout.write('No hay métricas registradas')
+            return
+
+        for nombre, valor in sorted(valores.items()):
+            self.stdout.write(f'{nombre:<50} {valor:>10}')
+
+        # Tasa de aciertos para cada par <prefijo>.aciertos / <prefijo>.fallos
+        prefijos = {nombre.rsplit('.', 1)[0] for nombre in valores if nombre.endswith('.aciertos')}
+        for prefijo in sorted(prefijos):
+            tasa = metricas.tasa_aciertos(valores.get(f'{prefijo}.aciertos', 0), valores.get(f'{prefijo}.fallos', 0))
+            if tasa is not None:
+                self.stdout.write(self.style.SUCCESS(f'{prefijo}: {tasa:.1f}% de aciertos'))
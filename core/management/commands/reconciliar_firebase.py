@@ -0,0 +1,53 @@
+"""
+Compara la base de datos con su réplica en Firestore y opcionalmente la repara
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core import firebase_sync
+from core.reconciliacion import CATEGORIAS, TAMANO_PAGINA, reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Reporta documentos faltantes, desactualizados y huérfanos en Firestore'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coleccion', help='Revisar solo esta colección')
+        parser.add_argument('--reparar', action='store_true', help='Reescribir y eliminar los documentos con diferencias')
+        parser.add_argument('--workers', type=int, default=4, help='Páginas comparadas en paralelo')
+        parser.add_argument('--pagina', type=int, default=TAMANO_PAGINA, help='Documentos por página (máximo 500)')
+        parser.add_argument('--memoria', action='store_true', help='Usar un Firestore en memoria (pruebas)')
+
+    def handle(self, *args, **options):
+        colecciones = sorted(firebase_sync.modelos_replicados())
+        if options['coleccion']:
+            if options['coleccion'] not in colecciones:
+                raise CommandError(f"Colección desconocida. Opciones: {', '.join(colecciones)}")
+            colecciones = [options['coleccion']]
+
+        cliente = firebase_sync.FirestoreEnMemoria() if options['memoria'] else firebase_sync.obtener_cliente()
+
+        diferencias = 0
+        for coleccion in colecciones:
+            inicio = time.monotonic()
+            resultado = reconciliar(
+                coleccion,
+                cliente=cliente,
+                reparar=options['reparar'],
+                workers=options['workers'],
+                tamano_pagina=options['pagina'],
+            )
+            segundos = time.monotonic() - inicio
+            diferencias += resultado.diferencias
+
+            conteos = ', '.join(f'{categoria}: {resultado.conteos[categoria]}' for categoria in CATEGORIAS)
+            self.stdout.write(f'{coleccion} ({resultado.revisados} filas en {segundos:.1f}s) {conteos}')
+            for categoria in ('faltantes', 'desactualizados', 'huerfanos'):
+                if resultado.ejemplos[categoria]:
+                    self.stdout.write(f"  {categoria}: {', '.join(resultado.ejemplos[categoria])}")
+            if options['reparar'] and resultado.reparados:
+                self.stdout.write(self.style.SUCCESS(f'  {resultado.reparados} documentos reparados'))
+
+        if diferencias and not options['reparar']:
+            self.stdout.write(self.style.WARNING(f'{diferencias} diferencias; ejecutar con --reparar para corregirlas'))
+        elif not diferencias:
+            self.stdout.write(self.style.SUCCESS('La réplica coincide con la base de datos'))
@@ -0,0 +1,93 @@
+"""
+Contadores de métricas de la aplicación (aciertos de caché, sincronizaciones, etc.).
+
+Los incrementos se acumulan en memoria y se vuelcan a la caché por defecto cada
+INTERVALO_VOLCADO segundos, para que contar no agregue una escritura por evento
+y los totales de todos los procesos (workers de gunicorn) queden en un solo lugar.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = 'metricas:'
+CLAVE_NOMBRES = f'{PREFIJO}__nombres__'
+INTERVALO_VOLCADO = 5.0
+
+_pendientes = Counter()
+_lock = threading.Lock()
+_ultimo_volcado = time.monotonic()
+
+
+def incrementar(nombre, cantidad=1):
+    """Suma al contador indicado"""
+    global _ultimo_volcado
+    with _lock:
+        _pendientes[nombre] += cantidad
+        vencido = time.monotonic() - _ultimo_volcado >= INTERVALO_VOLCADO
+        if vencido:
+            _ultimo_volcado = time.monotonic()
+    if vencido:
+        volcar()
+
+
+def volcar():
+    """Escribe en la caché los incrementos acumulados en este proceso"""
+    with _lock:
+        pendientes = dict(_pendientes)
+        _pendientes.clear()
+    if not pendientes:
+        return
+
+    try:
+        for nombre, cantidad in pendientes.items():
+            clave = PREFIJO + nombre
+            if not cache.add(clave, cantidad, timeout=None):
+                cache.incr(clave, cantidad)
+        _registrar_nombres(pendientes)
+    except Exception:
+        logger.exception('Error al volcar métricas')
+
+
+def _registrar_nombres(nuevos):
+    nombres = set(cache.get(CLAVE_NOMBRES) or ())
+    if not nombres.issuperset(nuevos):
+        cache.set(CLAVE_NOMBRES, sorted(nombres | set(nuevos)), timeout=None)
+
+
+def fijar(nombre, valor):
+    """Guarda el valor actual de un indicador (no se acumula, p. ej. un estado 0/1)"""
+    try:
+        cache.set(PREFIJO + nombre, valor, timeout=None)
+        _registrar_nombres([nombre])
+    except Exception:
+        logger.exception('Error al guardar la métrica %s', nombre)
+
+
+def obtener():
+    """Retorna todos los contadores registrados {nombre: valor}"""
+    volcar()
+    nombres = cache.get(CLAVE_NOMBRES) or []
+    valores = cache.get_many([PREFIJO + nombre for nombre in nombres])
+    return {nombre: valores.get(PREFIJO + nombre, 0) for nombre in nombres}
+
+
+def reiniciar():
+    """Elimina todos los contadores"""
+    with _lock:
+        _pendientes.clear()
+    nombres = cache.get(CLAVE_NOMBRES) or []
+    cache.delete_many([PREFIJO + nombre for nombre in nombres] + [CLAVE_NOMBRES])
+
+
+def tasa_aciertos(aciertos, fallos):
+    """Porcentaje de aciertos o None si no hubo eventos"""
+    total = aciertos + fallos
+    return 100.0 * aciertos / total if total else None
+
+
+atexit.register(volcar)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:10
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxFirebase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coleccion', models.CharField(max_length=50)),
+                ('documento', models.CharField(max_length=100)),
+                ('operacion', models.CharField(choices=[('set', 'Escribir documento'), ('delete', 'Eliminar documento')], default='set', max_length=10)),
+                ('datos', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('intentos', models.IntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Escritura pendiente a Firebase',
+                'verbose_name_plural': 'Escrituras pendientes a Firebase',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['coleccion', 'documento'], name='core_outbox_colecci_9725ba_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_outbox_firebase'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxfirebase',
+            name='operacion',
+            field=models.CharField(choices=[('set', 'Escribir documento'), ('update', 'Actualizar campos'), ('delete', 'Eliminar documento')], default='set', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='HuellaFirebase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coleccion', models.CharField(max_length=50)),
+                ('documento', models.CharField(max_length=100)),
+                ('huella', models.CharField(max_length=40)),
+                ('campos', models.JSONField(default=dict)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Huella de documento en Firebase',
+                'verbose_name_plural': 'Huellas de documentos en Firebase',
+                'unique_together': {('coleccion', 'documento')},
+            },
+        ),
+    ]
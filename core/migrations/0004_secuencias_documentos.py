@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+# (app, modelo, campo, prefijo) de los consecutivos existentes
+CONSECUTIVOS = [
+    ('contratos', 'Contrato', 'numero_contrato', 'CTR'),
+    ('pagos', 'Pago', 'numero_pago', 'PAG'),
+    ('mantenimientos', 'Mantenimiento', 'numero_ticket', 'MNT'),
+]
+
+
+def poblar_secuencias(apps, schema_editor):
+    """Arranca cada (prefijo, año) después del mayor número ya emitido"""
+    SecuenciaDocumento = apps.get_model('core', 'SecuenciaDocumento')
+    for app, nombre_modelo, campo, prefijo in CONSECUTIVOS:
+        modelo = apps.get_model(app, nombre_modelo)
+        maximos = {}
+        numeros = modelo.objects.filter(**{f'{campo}__startswith': f'{prefijo}-'}).values_list(campo, flat=True)
+        for numero in numeros.iterator(chunk_size=5000):
+            partes = numero.split('-')
+            if len(partes) == 3 and partes[1].isdigit() and partes[2].isdigit():
+                anio = int(partes[1])
+                maximos[anio] = max(maximos.get(anio, 0), int(partes[2]))
+        SecuenciaDocumento.objects.bulk_create([
+            SecuenciaDocumento(prefijo=prefijo, anio=anio, ultimo=ultimo)
+            for anio, ultimo in maximos.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_huellas_firebase'),
+        ('contratos', '0004_contrato_fecha_cierre_contrato_motivo_cierre'),
+        ('pagos', '0002_paginacion_keyset'),
+        ('mantenimientos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefijo', models.CharField(max_length=10)),
+                ('anio', models.IntegerField()),
+                ('ultimo', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de documentos',
+                'verbose_name_plural': 'Secuencias de documentos',
+                'unique_together': {('prefijo', 'anio')},
+            },
+        ),
+        migrations.RunPython(poblar_secuencias, migrations.RunPython.noop),
+    ]
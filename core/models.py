@@ -1,17 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
-import firebase_admin
-from firebase_admin import credentials, firestore, auth as firebase_auth
-from django.conf import settings
-import os
-
-# Inicializar Firebase
-if not firebase_admin._apps:
-    cred_path = os.path.join(settings.BASE_DIR, settings.FIREBASE_CREDENTIALS_PATH)
-    if os.path.exists(cred_path):
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
 
 
 class Usuario(AbstractUser):
@@ -59,25 +49,25 @@ class Usuario(AbstractUser):
             )
             return [c.inmueble for c in contratos_activos]
     
+    FIREBASE_COLECCION = 'usuarios'
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'username': self.username,
+            'email': self.email,
+            'tipo_usuario': self.tipo_usuario,
+            'telefono': self.telefono,
+            'cedula': self.cedula,
+            'nombre_completo': self.get_full_name(),
+            'fecha_registro': self.date_joined,
+            'firebase_uid': self.firebase_uid or ''
+        }
+    
     def save_to_firebase(self):
-        """Guarda el usuario en Firebase"""
-        try:
-            db = firestore.client()
-            user_ref = db.collection('usuarios').document(str(self.id))
-            user_ref.set({
-                'username': self.username,
-                'email': self.email,
-                'tipo_usuario': self.tipo_usuario,
-                'telefono': self.telefono,
-                'cedula': self.cedula,
-                'nombre_completo': self.get_full_name(),
-                'fecha_registro': self.date_joined,
-                'firebase_uid': self.firebase_uid or ''
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica del usuario en Firebase (ver core.firebase_sync)"""
+        from .firebase_sync import encolar
+        return encolar(self)
 
 
 class PerfilUsuario(models.Model):
@@ -97,3 +87,74 @@ class PerfilUsuario(models.Model):
     
     def __str__(self):
         return f"Perfil de {self.usuario.username}"
+
+
+class OutboxFirebase(models.Model):
+    """
+    Escrituras pendientes hacia Firebase. Se insertan en la misma transacción que
+    el cambio del modelo y las envía el comando drenar_firebase.
+    """
+    OPERACIONES = [
+        ('set', 'Escribir documento'),
+        ('update', 'Actualizar campos'),
+        ('delete', 'Eliminar documento'),
+    ]
+    
+    coleccion = models.CharField(max_length=50)
+    documento = models.CharField(max_length=100)
+    operacion = models.CharField(max_length=10, choices=OPERACIONES, default='set')
+    datos = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    intentos = models.IntegerField(default=0)
+    proximo_intento = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = 'Escritura pendiente a Firebase'
+        verbose_name_plural = 'Escrituras pendientes a Firebase'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['coleccion', 'documento']),
+        ]
+    
+    def __str__(self):
+        return f"{self.operacion} {self.coleccion}/{self.documento}"
+
+
+class HuellaFirebase(models.Model):
+    """
+    Huella del último contenido encolado de cada documento replicado: un hash por
+    campo y uno del documento completo. Permite omitir las escrituras sin cambios
+    y enviar solo los campos modificados.
+    """
+    coleccion = models.CharField(max_length=50)
+    documento = models.CharField(max_length=100)
+    huella = models.CharField(max_length=40)
+    campos = models.JSONField(default=dict)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Huella de documento en Firebase'
+        verbose_name_plural = 'Huellas de documentos en Firebase'
+        unique_together = ['coleccion', 'documento']
+    
+    def __str__(self):
+        return f"{self.coleccion}/{self.documento} {self.huella[:8]}"
+
+
+class SecuenciaDocumento(models.Model):
+    """
+    Último número asignado por prefijo y año para los consecutivos de documentos
+    (contratos, pagos, tickets de mantenimiento). Ver core.secuencias.
+    """
+    prefijo = models.CharField(max_length=10)
+    anio = models.IntegerField()
+    ultimo = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Secuencia de documentos'
+        verbose_name_plural = 'Secuencias de documentos'
+        unique_together = ['prefijo', 'anio']
+    
+    def __str__(self):
+        return f"{self.prefijo}-{self.anio}: {self.ultimo}"
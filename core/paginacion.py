@@ -0,0 +1,188 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+A diferencia de django.core.paginator.Paginator no ejecuta COUNT(*) ni OFFSET:
+cada página se obtiene con un WHERE sobre la clave de ordenamiento del último
+registro visto, por lo que las páginas profundas cuestan lo mismo que la primera.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+SALT_CURSOR = 'core.paginacion.cursor'
+
+
+def _serializar(valor):
+    """Convierte un valor de la clave de orden a un tipo JSON sin perder precisión"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def contar_aproximado(queryset):
+    """
+    Total aproximado de registros. En PostgreSQL usa la estimación del planificador
+    (no recorre la tabla); en otros motores hace un COUNT exacto.
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+class PaginaKeyset:
+    """Página de resultados compatible con el uso habitual en las plantillas"""
+
+    def __init__(self, object_list, paginator, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.url_siguiente = None
+        self.url_anterior = None
+        self._total = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def total_aproximado(self):
+        """Total de registros (aproximado), solo si el paginador lo habilita"""
+        if not self.paginator.con_total:
+            return None
+        if self._total is None:
+            self._total = contar_aproximado(self.paginator.queryset)
+        return self._total
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset sobre su ordenamiento (order_by o Meta.ordering).
+    Se agrega la llave primaria como desempate si no forma parte del orden.
+    Los campos de orden no deben admitir valores nulos.
+    """
+
+    def __init__(self, queryset, per_page, con_total=False):
+        self.per_page = int(per_page)
+        self.con_total = con_total
+        self.orden = self._resolver_orden(queryset)
+        self.queryset = queryset.order_by(*self.orden)
+
+    @staticmethod
+    def _resolver_orden(queryset):
+        orden = list(queryset.query.order_by or queryset.model._meta.ordering)
+        for campo in orden:
+            if not isinstance(campo, str):
+                raise ValueError('KeysetPaginator solo admite ordenamientos por nombre de campo.')
+        nombres = {campo.lstrip('-') for campo in orden}
+        if not nombres & {'pk', 'id', queryset.model._meta.pk.name}:
+            descendente = bool(orden) and orden[-1].startswith('-')
+            orden.append('-pk' if descendente else 'pk')
+        return orden
+
+    def _claves(self, objeto):
+        return [_serializar(getattr(objeto, campo.lstrip('-'))) for campo in self.orden]
+
+    def _condicion(self, valores, hacia_atras):
+        """Q lexicográfico: registros posteriores (o anteriores) a los valores dados"""
+        condicion = Q()
+        for i, campo in enumerate(self.orden):
+            nombre = campo.lstrip('-')
+            descendente = campo.startswith('-')
+            lookup = 'lt' if descendente != hacia_atras else 'gt'
+            parcial = Q(**{f'{nombre}__{lookup}': valores[i]})
+            for previo, valor in zip(self.orden[:i], valores[:i]):
+                parcial &= Q(**{previo.lstrip('-'): valor})
+            condicion |= parcial
+        return condicion
+
+    def codificar_cursor(self, objeto, hacia_atras=False):
+        return signing.dumps([hacia_atras, self._claves(objeto)], salt=SALT_CURSOR, compress=True)
+
+    def decodificar_cursor(self, cursor):
+        """Retorna (hacia_atras, valores) o None si el cursor es inválido"""
+        if not cursor:
+            return None
+        try:
+            hacia_atras, valores = signing.loads(cursor, salt=SALT_CURSOR)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if len(valores) != len(self.orden):
+            return None
+        return bool(hacia_atras), valores
+
+    def get_page(self, cursor=None):
+        decodificado = self.decodificar_cursor(cursor)
+
+        if decodificado is None:
+            filas = list(self.queryset[:self.per_page + 1])
+            hay_mas = len(filas) > self.per_page
+            filas = filas[:self.per_page]
+            return PaginaKeyset(
+                filas, self,
+                cursor_siguiente=self.codificar_cursor(filas[-1]) if hay_mas else None,
+            )
+
+        hacia_atras, valores = decodificado
+        if hacia_atras:
+            invertido = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in self.orden]
+            filas = list(
+                self.queryset.filter(self._condicion(valores, True)).order_by(*invertido)[:self.per_page + 1]
+            )
+            hay_mas = len(filas) > self.per_page
+            filas = list(reversed(filas[:self.per_page]))
+            return PaginaKeyset(
+                filas, self,
+                cursor_siguiente=self.codificar_cursor(filas[-1]) if filas else None,
+                cursor_anterior=self.codificar_cursor(filas[0], hacia_atras=True) if hay_mas else None,
+            )
+
+        filas = list(self.queryset.filter(self._condicion(valores, False))[:self.per_page + 1])
+        hay_mas = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+        return PaginaKeyset(
+            filas, self,
+            cursor_siguiente=self.codificar_cursor(filas[-1]) if hay_mas else None,
+            cursor_anterior=self.codificar_cursor(filas[0], hacia_atras=True) if filas else None,
+        )
+
+
+def paginar(request, queryset, per_page, con_total=False):
+    """Pagina con cursor usando el parámetro GET 'cursor' y arma los enlaces de navegación"""
+    paginator = KeysetPaginator(queryset, per_page, con_total=con_total)
+    pagina = paginator.get_page(request.GET.get('cursor'))
+
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+    if pagina.has_next():
+        parametros['cursor'] = pagina.cursor_siguiente
+        pagina.url_siguiente = f'?{parametros.urlencode()}'
+    if pagina.has_previous():
+        parametros['cursor'] = pagina.cursor_anterior
+        pagina.url_anterior = f'?{parametros.urlencode()}'
+    return pagina
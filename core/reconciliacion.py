@@ -0,0 +1,208 @@
+"""
+Reconciliación entre la base de datos y su réplica en Firestore.
+
+Por cada colección se hacen dos recorridos en paralelo, con memoria acotada:
+- la tabla por páginas de id: cada página se busca en Firestore con get_all()
+  y se compara el hash de cada documento con el de get_datos_firebase()
+  (faltantes y desactualizados);
+- los ids de la colección con list_documents(): los que no existen en la
+  tabla son huérfanos.
+Los documentos con escrituras pendientes en el outbox se cuentan como en
+tránsito y no se reparan. Con reparar=True los faltantes y desactualizados se
+reescriben por lotes y los huérfanos se eliminan por lotes.
+"""
+import hashlib
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from . import firebase_sync
+
+TAMANO_PAGINA = 500
+# Ids de ejemplo que se guardan por categoría en el resultado
+MAX_EJEMPLOS = 20
+
+CATEGORIAS = ['correctos', 'faltantes', 'desactualizados', 'huerfanos', 'en_transito']
+
+
+class ResultadoReconciliacion:
+    """Conteos por categoría, ids de ejemplo y documentos reparados de una colección"""
+
+    def __init__(self, coleccion):
+        self.coleccion = coleccion
+        self.conteos = dict.fromkeys(CATEGORIAS, 0)
+        self.ejemplos = {categoria: [] for categoria in CATEGORIAS}
+        self.reparados = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, categoria, documentos):
+        with self._lock:
+            self.conteos[categoria] += len(documentos)
+            faltan = MAX_EJEMPLOS - len(self.ejemplos[categoria])
+            if faltan > 0:
+                self.ejemplos[categoria].extend(documentos[:faltan])
+
+    def sumar_reparados(self, cantidad):
+        with self._lock:
+            self.reparados += cantidad
+
+    @property
+    def revisados(self):
+        return self.conteos['correctos'] + self.conteos['faltantes'] + self.conteos['desactualizados']
+
+    @property
+    def diferencias(self):
+        return self.conteos['faltantes'] + self.conteos['desactualizados'] + self.conteos['huerfanos']
+
+
+def hash_datos(datos):
+    """Hash de un documento independiente del orden de los campos (fechas y decimales como texto)"""
+    return hashlib.sha1(json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def _en_transito(coleccion, documentos):
+    """Documentos con escrituras pendientes en el outbox"""
+    from .models import OutboxFirebase
+
+    return set(
+        OutboxFirebase.objects.filter(coleccion=coleccion, documento__in=documentos)
+        .values_list('documento', flat=True)
+    )
+
+
+def _olvidar_huellas(coleccion, documentos):
+    """Tras reescribir documentos la próxima réplica debe ser completa"""
+    from .models import HuellaFirebase
+
+    HuellaFirebase.objects.filter(coleccion=coleccion, documento__in=documentos).delete()
+
+
+def _eliminar_documentos(cliente, coleccion, documentos):
+    lote = cliente.batch()
+    referencias = cliente.collection(coleccion)
+    for documento in documentos:
+        lote.delete(referencias.document(documento))
+    firebase_sync.llamar(lote.commit)
+
+
+def _comparar_pagina(cliente, coleccion, modelo, ids, resultado, reparar):
+    """Compara una página de filas (por id) con sus documentos en Firestore"""
+    close_old_connections()
+    try:
+        referencias = cliente.collection(coleccion)
+        remotos = {
+            instantanea.id: instantanea
+            for instantanea in firebase_sync.llamar(
+                lambda timeout: list(cliente.get_all(
+                    [referencias.document(str(pk)) for pk in ids], timeout=timeout,
+                ))
+            )
+        }
+        transito = _en_transito(coleccion, [str(pk) for pk in ids])
+        # Las filas se leen después de los documentos y del outbox: un cambio
+        # guardado y drenado antes se ve aquí, y uno posterior queda en tránsito.
+        # Las filas eliminadas entretanto no se comparan (las cubre la búsqueda de huérfanos).
+        instancias = firebase_sync.queryset_replica(modelo).filter(pk__in=ids).order_by('pk')
+
+        categorias = {categoria: [] for categoria in CATEGORIAS}
+        reescribir = []
+        for instancia in instancias:
+            documento = str(instancia.pk)
+            if documento in transito:
+                categorias['en_transito'].append(documento)
+                continue
+            datos = instancia.get_datos_firebase()
+            remoto = remotos.get(documento)
+            if remoto is None or not remoto.exists:
+                categoria = 'faltantes'
+            elif hash_datos(remoto.to_dict()) != hash_datos(datos):
+                categoria = 'desactualizados'
+            else:
+                categoria = 'correctos'
+            categorias[categoria].append(documento)
+            if categoria != 'correctos':
+                reescribir.append((documento, firebase_sync.serializar(datos)))
+
+        for categoria, documentos in categorias.items():
+            if documentos:
+                resultado.registrar(categoria, documentos)
+
+        if reparar and reescribir:
+            firebase_sync.escribir_documentos(cliente, coleccion, reescribir)
+            _olvidar_huellas(coleccion, [documento for documento, _ in reescribir])
+            resultado.sumar_reparados(len(reescribir))
+    finally:
+        close_old_connections()
+
+
+def _buscar_huerfanos(cliente, coleccion, modelo, resultado, reparar, tamano_pagina):
+    """Recorre los ids de la colección buscando documentos sin fila en la tabla"""
+    close_old_connections()
+    try:
+        def revisar(documentos):
+            ids = [int(documento) for documento in documentos if documento.isdigit()]
+            existentes = {str(pk) for pk in modelo.objects.filter(pk__in=ids).values_list('pk', flat=True)}
+            candidatos = [documento for documento in documentos if documento not in existentes]
+            if not candidatos:
+                return
+            transito = _en_transito(coleccion, candidatos)
+            huerfanos = [documento for documento in candidatos if documento not in transito]
+            if transito:
+                resultado.registrar('en_transito', sorted(transito))
+            if huerfanos:
+                resultado.registrar('huerfanos', huerfanos)
+                if reparar:
+                    _eliminar_documentos(cliente, coleccion, huerfanos)
+                    resultado.sumar_reparados(len(huerfanos))
+
+        pagina = []
+        documentos = cliente.collection(coleccion).list_documents(
+            page_size=tamano_pagina, timeout=getattr(settings, 'FIREBASE_TIMEOUT', 10),
+        )
+        for referencia in documentos:
+            pagina.append(referencia.id)
+            if len(pagina) >= tamano_pagina:
+                revisar(pagina)
+                pagina = []
+        if pagina:
+            revisar(pagina)
+    finally:
+        close_old_connections()
+
+
+def reconciliar(coleccion, cliente=None, reparar=False, workers=4, tamano_pagina=TAMANO_PAGINA):
+    """
+    Compara la colección con su tabla y retorna un ResultadoReconciliacion.
+    Como mucho hay 2 x workers páginas en memoria a la vez.
+    """
+    modelo = firebase_sync.modelos_replicados()[coleccion]
+    cliente = cliente or firebase_sync.obtener_cliente()
+    resultado = ResultadoReconciliacion(coleccion)
+    tamano_pagina = min(tamano_pagina, firebase_sync.TAMANO_LOTE)
+
+    with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix='reconciliacion') as pool:
+        huerfanos = pool.submit(_buscar_huerfanos, cliente, coleccion, modelo, resultado, reparar, tamano_pagina)
+
+        en_vuelo = deque()
+        # Aquí solo se paginan los ids: cada página lee sus filas al compararlas
+        ids_replica = modelo.objects.order_by('pk').values_list('pk', flat=True)
+        ultimo_id = None
+        while True:
+            pagina = ids_replica.filter(pk__gt=ultimo_id) if ultimo_id is not None else ids_replica
+            ids = list(pagina[:tamano_pagina])
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+            while len(en_vuelo) >= workers * 2:
+                en_vuelo.popleft().result()
+            en_vuelo.append(pool.submit(_comparar_pagina, cliente, coleccion, modelo, ids, resultado, reparar))
+
+        wait(en_vuelo)
+        for futuro in en_vuelo:
+            futuro.result()
+        huerfanos.result()
+
+    return resultado
@@ -0,0 +1,71 @@
+"""
+Consecutivos de documentos por (prefijo, año), p. ej. PAG-2025-000123.
+
+reservar() aparta un bloque de números con un único UPDATE ... RETURNING sobre
+la fila de SecuenciaDocumento: el UPDATE bloquea la fila hasta el fin de la transacción,
+por lo que dos inserciones concurrentes nunca reciben el mismo número (también
+en SQLite, donde select_for_update no tiene efecto). Si la transacción se
+revierte, el contador también, y no quedan huecos.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def _incrementar(prefijo, anio, cantidad):
+    """Suma cantidad al contador y retorna el nuevo último número (None si no hay fila)"""
+    from .models import SecuenciaDocumento
+
+    # UPDATE ... RETURNING existe en PostgreSQL y en SQLite >= 3.35
+    if connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.can_return_rows_from_bulk_insert
+    ):
+        tabla = connection.ops.quote_name(SecuenciaDocumento._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {tabla} SET ultimo = ultimo + %s WHERE prefijo = %s AND anio = %s RETURNING ultimo',
+                [cantidad, prefijo, anio],
+            )
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+    secuencia = SecuenciaDocumento.objects.filter(prefijo=prefijo, anio=anio)
+    if not secuencia.update(ultimo=F('ultimo') + cantidad):
+        return None
+    return secuencia.values_list('ultimo', flat=True).get()
+
+
+def reservar(prefijo, cantidad=1, anio=None):
+    """Reserva `cantidad` números consecutivos y retorna el primero"""
+    from .models import SecuenciaDocumento
+
+    anio = anio or timezone.now().year
+    with transaction.atomic():
+        ultimo = _incrementar(prefijo, anio, cantidad)
+        if ultimo is None:
+            try:
+                with transaction.atomic():
+                    SecuenciaDocumento.objects.create(prefijo=prefijo, anio=anio, ultimo=cantidad)
+                return 1
+            except IntegrityError:
+                # Otra transacción creó la fila primero
+                ultimo = _incrementar(prefijo, anio, cantidad)
+    return ultimo - cantidad + 1
+
+
+def formatear(prefijo, anio, numero, digitos):
+    return f"{prefijo}-{anio}-{numero:0{digitos}d}"
+
+
+def asignar_numeros(instancias, campo, prefijo, digitos):
+    """
+    Asigna el consecutivo a las instancias que no lo tienen, con una sola
+    reserva para todas (sirve antes de un bulk_create)
+    """
+    sin_numero = [instancia for instancia in instancias if not getattr(instancia, campo)]
+    if not sin_numero:
+        return
+    anio = timezone.now().year
+    primero = reservar(prefijo, len(sin_numero), anio)
+    for desplazamiento, instancia in enumerate(sin_numero):
+        setattr(instancia, campo, formatear(prefijo, anio, primero + desplazamiento, digitos))
@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from . import firebase_sync
 from .models import Usuario, PerfilUsuario
 
 
@@ -16,3 +17,13 @@ def guardar_perfil_usuario(sender, instance, **kwargs):
     """Guardar perfil cuando se actualiza el usuario"""
     if hasattr(instance, 'perfil'):
         instance.perfil.save()
+
+
+def encolar_eliminacion_firebase(sender, instance, **kwargs):
+    """Encolar la eliminación del documento en Firebase (también en borrados en cascada)"""
+    firebase_sync.encolar_eliminacion(sender.FIREBASE_COLECCION, instance.pk)
+
+
+# Un receptor por modelo replicado: uno sin sender desactivaría el borrado rápido de todos los modelos
+for modelo in firebase_sync.modelos_replicados().values():
+    post_delete.connect(encolar_eliminacion_firebase, sender=modelo, dispatch_uid=f'firebase_eliminar_{modelo._meta.label}')
@@ -0,0 +1,198 @@
+import importlib
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from core import firebase_sync
+from core.exportar import csv_por_partes
+from core.models import OutboxFirebase, SecuenciaDocumento
+from core.secuencias import asignar_numeros, reservar
+from pagos.models import Pago
+from pagos.tests import SIN_MANIFIESTO, ConsultasKpi, crear_datos_kpis
+
+
+@SIN_MANIFIESTO
+class ReportesGeneralesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def setUp(self):
+        self.client.force_login(self.propietario)
+
+    def test_sin_fechas_lee_kpis_del_ledger(self):
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(reverse('core:reportes_generales'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(consultas.sql), 1)
+        self.assertIn('"pagos_ledgercontrato"', consultas.sql[0])
+        self.assertEqual(respuesta.context['total_pagos_recibidos'], Decimal('1000000'))
+        self.assertEqual(respuesta.context['total_pagos_pendientes'], Decimal('1000000'))
+        self.assertEqual(respuesta.context['contratos_vigentes'], 1)
+
+    def test_filtro_por_inmueble_lee_kpis_del_ledger(self):
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(
+                reverse('core:reportes_generales'), {'inmueble': self.contrato.inmueble_id},
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(consultas.sql), 1)
+        self.assertIn('"pagos_ledgercontrato"', consultas.sql[0])
+
+    def test_con_fechas_agrega_sobre_pagos(self):
+        desde = self.contrato.fecha_inicio.isoformat()
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(reverse('core:reportes_generales'), {'fecha_desde': desde})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(consultas.sql), 1)
+        self.assertIn('"pagos_pago"', consultas.sql[0])
+        self.assertNotIn('"pagos_ledgercontrato"', consultas.sql[0])
+        self.assertEqual(respuesta.context['total_pagos_recibidos'], Decimal('1000000'))
+
+
+class CsvPorPartesTests(SimpleTestCase):
+    def test_texto_con_formula_se_antepone_comilla(self):
+        filas = [['=HYPERLINK("x")', '+57 300', '@SUM(A1)', '-x', '\tdato', Decimal('-5'), None, 'normal']]
+        contenido = b''.join(csv_por_partes(['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'], filas)).decode('utf-8')
+        fila = contenido.splitlines()[1]
+        self.assertEqual(fila, '"\'=HYPERLINK(""x"")",\'+57 300,\'@SUM(A1),\'-x,\'\tdato,-5,,normal')
+
+
+class SecuenciasTests(TestCase):
+    def test_primer_uso_crea_la_fila(self):
+        self.assertFalse(SecuenciaDocumento.objects.filter(prefijo='TST', anio=2030).exists())
+        self.assertEqual(reservar('TST', 3, 2030), 1)
+        self.assertEqual(SecuenciaDocumento.objects.get(prefijo='TST', anio=2030).ultimo, 3)
+
+    def test_numeros_unicos_y_consecutivos(self):
+        primeros = [reservar('TST', cantidad, 2030) for cantidad in (1, 4, 2)]
+        self.assertEqual(primeros, [1, 2, 6])
+        instancias = [SimpleNamespace(numero='') for _ in range(5)] + [SimpleNamespace(numero='TST-X')]
+        asignar_numeros(instancias, 'numero', 'TST', 6)
+        anio = timezone.now().year
+        self.assertEqual(
+            [instancia.numero for instancia in instancias],
+            [f'TST-{anio}-{numero:06d}' for numero in range(1, 6)] + ['TST-X'],
+        )
+        self.assertEqual(reservar('TST', 1, anio), 6)
+
+    def test_reversion_no_deja_huecos(self):
+        reservar('TST', 2, 2030)
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    self.assertEqual(reservar('TST', 5, 2030), 3)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(reservar('TST', 1, 2030), 3)
+
+    def test_reversion_del_primer_uso(self):
+        try:
+            with transaction.atomic():
+                reservar('TST', 1, 2031)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(SecuenciaDocumento.objects.filter(prefijo='TST', anio=2031).exists())
+        self.assertEqual(reservar('TST', 1, 2031), 1)
+
+
+class MigracionSecuenciasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def test_arranca_despues_del_mayor_numero_emitido(self):
+        pagos = list(Pago.objects.order_by('pk'))
+        Pago.objects.filter(pk=pagos[0].pk).update(numero_pago='PAG-2019-000041')
+        Pago.objects.filter(pk=pagos[1].pk).update(numero_pago='PAG-2019-000007')
+        Pago.objects.filter(pk=pagos[2].pk).update(numero_pago='PAG-manual')
+        SecuenciaDocumento.objects.all().delete()
+
+        migracion = importlib.import_module('core.migrations.0004_secuencias_documentos')
+        migracion.poblar_secuencias(apps, None)
+
+        secuencias = {(s.prefijo, s.anio): s.ultimo for s in SecuenciaDocumento.objects.all()}
+        anio = int(self.contrato.numero_contrato.split('-')[1])
+        self.assertEqual(secuencias, {
+            ('PAG', 2019): 41,
+            ('CTR', anio): int(self.contrato.numero_contrato.split('-')[2]),
+        })
+        self.assertEqual(reservar('PAG', 1, 2019), 42)
+
+
+@override_settings(FIREBASE_BACKEND='memoria')
+class ReplicaFirebaseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def setUp(self):
+        self.cliente = firebase_sync.FirestoreEnMemoria()
+        firebase_sync.circuito.estado = 'cerrado'
+        firebase_sync.circuito.fallos = 0
+        self.inmueble = self.contrato.inmueble
+        firebase_sync.encolar(self.inmueble)
+        firebase_sync.drenar(cliente=self.cliente)
+
+    def espejo(self):
+        return self.cliente.datos['inmuebles'][str(self.inmueble.pk)]
+
+    def editar(self, **cambios):
+        for campo, valor in cambios.items():
+            setattr(self.inmueble, campo, valor)
+        self.inmueble.save()
+        return firebase_sync.encolar(self.inmueble)
+
+    def test_espejo_igual_a_los_datos_tras_ediciones(self):
+        self.assertEqual(self.espejo(), firebase_sync.serializar(self.inmueble.get_datos_firebase()))
+
+        # Sin cambios no se encola nada
+        self.assertFalse(firebase_sync.encolar(self.inmueble))
+        self.assertEqual(OutboxFirebase.objects.count(), 0)
+
+        self.assertTrue(self.editar(titulo='Casa grande'))
+        fila = OutboxFirebase.objects.get()
+        self.assertEqual((fila.operacion, fila.datos), ('update', {'titulo': 'Casa grande'}))
+        self.editar(precio_arriendo=Decimal('1200000'), barrio='Norte')
+        resultado = firebase_sync.drenar(cliente=self.cliente)
+        self.assertEqual((resultado['leidas'], resultado['escritos']), (2, 1))
+        self.assertEqual(self.espejo(), firebase_sync.serializar(self.inmueble.get_datos_firebase()))
+
+    def test_drenado_fallido_no_aplica_cambios_fuera_de_orden(self):
+        original = self.espejo()
+        self.editar(titulo='Primero')
+        self.cliente.fallar_con = RuntimeError('sin servicio')
+        self.assertEqual(firebase_sync.drenar(cliente=self.cliente)['fallidos'], 1)
+        self.assertEqual(self.espejo(), original)
+
+        # Con el servicio de vuelta, la edición nueva espera a la que está en reintento
+        self.cliente.fallar_con = None
+        self.editar(barrio='Norte')
+        self.assertEqual(firebase_sync.drenar(cliente=self.cliente)['leidas'], 0)
+        self.assertEqual(self.espejo(), original)
+
+        OutboxFirebase.objects.update(proximo_intento=timezone.now())
+        self.assertEqual(firebase_sync.drenar(cliente=self.cliente)['escritos'], 1)
+        self.assertEqual(self.espejo(), firebase_sync.serializar(self.inmueble.get_datos_firebase()))
+        self.assertEqual(self.espejo()['titulo'], 'Primero')
+        self.assertEqual(OutboxFirebase.objects.count(), 0)
+
+    def test_eliminar_encola_el_borrado_del_documento(self):
+        pagos = list(self.contrato.pagos.values_list('pk', flat=True))
+        firebase_sync.encolar_cambios(list(self.contrato.pagos.all()))
+        firebase_sync.drenar(cliente=self.cliente)
+        self.assertEqual(len(self.cliente.datos['pagos']), len(pagos))
+
+        # Eliminar el inmueble borra en cascada el contrato y sus pagos
+        self.inmueble.delete()
+        firebase_sync.drenar(cliente=self.cliente)
+        self.assertNotIn(str(self.inmueble.pk), self.cliente.datos['inmuebles'])
+        self.assertEqual(self.cliente.datos['pagos'], {})
+        self.assertEqual(OutboxFirebase.objects.count(), 0)
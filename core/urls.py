@@ -12,4 +12,5 @@ urlpatterns = [
     path('perfil/', views.perfil, name='perfil'),
     path('perfil/<int:user_id>/', views.perfil_usuario, name='perfil_usuario'),
     path('reportes/', views.reportes_generales, name='reportes_generales'),
+    path('reportes/exportar/<str:tipo>/', views.exportar_reportes, name='exportar_reportes'),
 ]
@@ -2,13 +2,16 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Q, Sum
+from django.db.models import Count, Q
+from django.http import Http404
 from datetime import datetime, timedelta
+from .exportar import COLUMNAS, FORMATOS, filtrar_reportes, respuesta_exportacion
 from .forms import RegistroForm, LoginForm, PerfilForm
 from .models import Usuario
 from inmuebles.models import Inmueble
 from contratos.models import Contrato
-from pagos.models import Pago
+from pagos.kpis import KpisPagos
+from pagos.models import LedgerContrato, Pago
 from mantenimientos.models import Mantenimiento
 from notificaciones.models import Notificacion
 from django.utils import timezone
@@ -70,36 +73,35 @@ def reportes_generales(request):
     inmueble_filtro = request.GET.get('inmueble')
 
     inmuebles = Inmueble.objects.filter(propietario=usuario)
-    pagos = Pago.objects.filter(contrato__inmueble__propietario=usuario)
-    mantenimientos = Mantenimiento.objects.filter(inmueble__propietario=usuario)
-    contratos = Contrato.objects.filter(inmueble__propietario=usuario)
+    reportes = filtrar_reportes(usuario, fecha_desde, fecha_hasta, inmueble_filtro)
+    pagos = reportes['pagos']
+    mantenimientos = reportes['mantenimientos']
+    contratos = reportes['contratos']
 
-    if inmueble_filtro:
-        pagos = pagos.filter(contrato__inmueble_id=inmueble_filtro)
-        mantenimientos = mantenimientos.filter(inmueble_id=inmueble_filtro)
-        contratos = contratos.filter(inmueble_id=inmueble_filtro)
-
-    if fecha_desde:
-        pagos = pagos.filter(fecha_pago__gte=fecha_desde)
-        mantenimientos = mantenimientos.filter(fecha_solicitud__gte=fecha_desde)
-        contratos = contratos.filter(fecha_inicio__gte=fecha_desde)
-    if fecha_hasta:
-        pagos = pagos.filter(fecha_pago__lte=fecha_hasta)
-        mantenimientos = mantenimientos.filter(fecha_solicitud__lte=fecha_hasta)
-        contratos = contratos.filter(fecha_fin__lte=fecha_hasta)
-
-    # KPIs
-    total_pagos_recibidos = pagos.filter(estado='pagado').aggregate(total=Sum('monto'))['total'] or 0
-    total_pagos_pendientes = pagos.filter(estado='pendiente').aggregate(total=Sum('monto'))['total'] or 0
+    # KPIs: una agregación condicional por tabla. Sin filtro de fechas el alcance
+    # son contratos completos y los KPIs de pagos se leen de sus ledgers.
+    if fecha_desde or fecha_hasta:
+        kpis = KpisPagos.desde_pagos(pagos)
+    else:
+        ledgers = LedgerContrato.objects.filter(contrato__inmueble__propietario=usuario)
+        if inmueble_filtro:
+            ledgers = ledgers.filter(contrato__inmueble_id=inmueble_filtro)
+        kpis = KpisPagos.desde_ledgers(ledgers)
+    total_pagos_recibidos = kpis.recibido
+    total_pagos_pendientes = kpis.saldo_pendientes
     mantenimientos_activos = mantenimientos.exclude(estado__in=['completado','cancelado','rechazado']).count()
-    contratos_vigentes = contratos.filter(estado='activo').count()
-    contratos_vencidos = contratos.filter(estado='vencido').count()
+    conteo_contratos = contratos.aggregate(
+        vigentes=Count('id', filter=Q(estado='activo')),
+        vencidos=Count('id', filter=Q(estado='vencido')),
+    )
+    contratos_vigentes = conteo_contratos['vigentes']
+    contratos_vencidos = conteo_contratos['vencidos']
 
     context = {
         'inmuebles': inmuebles,
-        'pagos': pagos.order_by('-fecha_pago')[:50],
-        'mantenimientos': mantenimientos.order_by('-fecha_solicitud')[:50],
-        'contratos': contratos.order_by('-fecha_inicio')[:50],
+        'pagos': pagos[:50],
+        'mantenimientos': mantenimientos[:50],
+        'contratos': contratos[:50],
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
         'inmueble_filtro': inmueble_filtro,
@@ -111,6 +113,25 @@ def reportes_generales(request):
     }
     return render(request, 'core/reportes_generales.html', context)
 
+
+@login_required
+def exportar_reportes(request, tipo):
+    """Exporta en CSV o XLSX (?formato=) los pagos, contratos o mantenimientos con los filtros de los reportes"""
+    if request.user.tipo_usuario != 'propietario':
+        messages.error(request, 'Solo los propietarios pueden exportar reportes.')
+        return redirect('core:dashboard')
+    if tipo not in COLUMNAS:
+        raise Http404('Reporte no encontrado')
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+
+    reportes = filtrar_reportes(
+        request.user, request.GET.get('fecha_desde'), request.GET.get('fecha_hasta'), request.GET.get('inmueble'),
+    )
+    nombre = f'{tipo}_{timezone.localdate():%Y-%m-%d}'
+    return respuesta_exportacion(reportes[tipo], tipo, formato, nombre)
+
 def index(request):
     """Vista de página principal"""
     if request.user.is_authenticated:
@@ -267,15 +288,14 @@ def dashboard(request):
             'total_contratos': contratos.count(),
             'contratos_activos': contratos.filter(estado='activo').count(),
             'contratos_vencidos': contratos.filter(estado='vencido').count(),
-            'pagos_pendientes': Pago.objects.filter(
-                contrato__inmueble__propietario=user,
-                estado='pendiente'
-            ).count(),
+            'pagos_pendientes': KpisPagos.desde_ledgers(
+                LedgerContrato.objects.filter(contrato__inmueble__propietario=user)
+            ).pagos_pendientes,
             'mantenimientos_activos': Mantenimiento.objects.filter(
                 inmueble__propietario=user,
                 estado='activo'
             ).count(),
-            'inmuebles_recientes': inmuebles.order_by('-fecha_registro')[:5],
+            'inmuebles_recientes': inmuebles.select_related('imagen_principal').order_by('-fecha_registro')[:5],
             'ultimos_pagos': Pago.objects.filter(
                 contrato__inmueble__propietario=user
             ).order_by('-fecha_pago')[:5],
@@ -284,19 +304,14 @@ def dashboard(request):
     else:  # inquilino
         # Estadísticas para inquilinos
         contratos = Contrato.objects.filter(inquilino=user)
+        kpis = KpisPagos.desde_ledgers(LedgerContrato.objects.filter(contrato__inquilino=user))
         
         context.update({
             'total_contratos': contratos.count(),
             'contratos_activos': contratos.filter(estado='activo').count(),
             'inmuebles_actuales': [c.inmueble for c in contratos.filter(estado='activo')],
-            'pagos_pendientes': Pago.objects.filter(
-                contrato__inquilino=user,
-                estado='pendiente'
-            ).count(),
-            'pagos_vencidos': Pago.objects.filter(
-                contrato__inquilino=user,
-                estado='vencido'
-            ).count(),
+            'pagos_pendientes': kpis.pagos_pendientes,
+            'pagos_vencidos': kpis.pagos_vencidos,
             'mantenimientos_activos': Mantenimiento.objects.filter(
                 inmueble__contratos__inquilino=user,
                 estado='activo'
@@ -343,6 +358,6 @@ def perfil_usuario(request, user_id):
         context['inmuebles'] = Inmueble.objects.filter(
             propietario=usuario,
             estado='disponible'
-        )[:6]
+        ).select_related('imagen_principal')[:6]
     
     return render(request, 'core/perfil_publico.html', context)
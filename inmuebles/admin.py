@@ -25,7 +25,7 @@ class InmuebleAdmin(admin.ModelAdmin):
             'fields': ('propietario', 'titulo', 'descripcion', 'categoria', 'estado')
         }),
         ('Ubicación', {
-            'fields': ('direccion', 'ciudad', 'barrio', 'codigo_postal')
+            'fields': ('direccion', 'ciudad', 'barrio', 'codigo_postal', 'latitud', 'longitud')
         }),
         ('Características', {
             'fields': ('area', 'habitaciones', 'banos', 'parqueaderos', 'piso')
@@ -5,3 +5,6 @@ class InmueblesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inmuebles'
     verbose_name = 'Gestión de Inmuebles'
+    
+    def ready(self):
+        import inmuebles.signals
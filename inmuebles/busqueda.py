@@ -0,0 +1,277 @@
+"""
+Motor de búsqueda de inmuebles: filtros sobre el índice compuesto, búsqueda
+de texto completo y facetas
+"""
+import re
+from decimal import Decimal
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Func, IntegerField, Q, TextField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from .geo import anotar_distancia, buscar_en_caja, buscar_en_radio
+from .models import Inmueble
+from .utils import normalizar_texto
+
+
+# Tabla FTS5 que acompaña a inmuebles_inmueble en SQLite (rowid = id del inmueble)
+TABLA_FTS = 'inmuebles_inmueble_fts'
+
+# Campos indexados con su peso de relevancia (PostgreSQL usa A-D, FTS5 usa bm25)
+CAMPOS_TEXTO = [
+    ('titulo', 'A', 10.0),
+    ('barrio', 'B', 5.0),
+    ('direccion', 'C', 2.0),
+    ('descripcion', 'D', 1.0),
+]
+
+# Normalización del texto indexado en PostgreSQL (minúsculas sin tildes), aplicada en
+# SQL tanto al indexar como al consultar; la migración 0003 fija una copia de estas
+# constantes para la carga inicial. En SQLite la hace el tokenizador de FTS5.
+CON_TILDE = 'áàâäãéèêëíìîïóòôöõúùûüñç'
+SIN_TILDE = 'aaaaaeeeeiiiiooooouuuunc'
+
+
+# Rangos de habitaciones (valor mínimo, etiqueta). Se cuentan de forma acumulada: "2+" incluye 3 y 4+
+RANGOS_HABITACIONES = [
+    (1, '1+'),
+    (2, '2+'),
+    (3, '3+'),
+    (4, '4+'),
+]
+
+# Bandas de precio de arriendo (mínimo, máximo, etiqueta); cada banda es (mínimo, máximo]
+BANDAS_PRECIO = [
+    (None, Decimal('1000000'), 'Hasta $1M'),
+    (Decimal('1000000'), Decimal('2000000'), '$1M - $2M'),
+    (Decimal('2000000'), Decimal('3000000'), '$2M - $3M'),
+    (Decimal('3000000'), Decimal('5000000'), '$3M - $5M'),
+    (Decimal('5000000'), None, 'Más de $5M'),
+]
+
+
+def inmuebles_publicados():
+    """Queryset base de la búsqueda pública (prefijo del índice compuesto)"""
+    return Inmueble.objects.filter(activo=True, estado='disponible')
+
+
+def filtrar_inmuebles(filtros, queryset=None):
+    """Aplica los filtros de BusquedaInmuebleForm.cleaned_data sobre el queryset"""
+    inmuebles = inmuebles_publicados() if queryset is None else queryset
+
+    categoria = filtros.get('categoria')
+    ciudad = normalizar_texto(filtros.get('ciudad'))
+    precio_min = filtros.get('precio_min')
+    precio_max = filtros.get('precio_max')
+    habitaciones = filtros.get('habitaciones')
+    banos = filtros.get('banos')
+    texto = filtros.get('q')
+
+    if texto:
+        inmuebles = buscar_texto(inmuebles, texto)
+    if categoria:
+        inmuebles = inmuebles.filter(categoria=categoria)
+    if ciudad:
+        inmuebles = inmuebles.filter(ciudad_normalizada=ciudad)
+    if precio_min:
+        inmuebles = inmuebles.filter(precio_arriendo__gte=precio_min)
+    if precio_max:
+        inmuebles = inmuebles.filter(precio_arriendo__lte=precio_max)
+    if filtros.get('banda_precio') is not None:
+        inmuebles = inmuebles.filter(filtro_banda_precio(filtros['banda_precio']))
+    if habitaciones:
+        inmuebles = inmuebles.filter(habitaciones__gte=habitaciones)
+    if banos:
+        inmuebles = inmuebles.filter(banos__gte=banos)
+    if filtros.get('amoblado'):
+        inmuebles = inmuebles.filter(amoblado=True)
+    if filtros.get('mascotas_permitidas'):
+        inmuebles = inmuebles.filter(mascotas_permitidas=True)
+
+    # Filtros geográficos: el radio ordena por distancia al punto
+    latitud = filtros.get('latitud')
+    longitud = filtros.get('longitud')
+    radio_km = filtros.get('radio_km')
+    if filtros.get('caja'):
+        inmuebles = buscar_en_caja(inmuebles, *filtros['caja'])
+    if latitud is not None and longitud is not None:
+        if radio_km:
+            inmuebles = buscar_en_radio(inmuebles, latitud, longitud, radio_km)
+        else:
+            inmuebles = anotar_distancia(inmuebles, latitud, longitud)
+
+    return inmuebles
+
+
+def _terminos(texto):
+    """Separa la consulta en términos alfanuméricos"""
+    return re.findall(r'\w+', texto or '')
+
+
+def _normalizar_sql(expresion):
+    """translate(lower(expresion)): la normalización del índice de PostgreSQL"""
+    return Func(Lower(expresion), Value(CON_TILDE), Value(SIN_TILDE), function='translate', output_field=TextField())
+
+
+def buscar_texto(queryset, texto):
+    """
+    Filtra por palabras clave en título, barrio, dirección y descripción y ordena
+    por relevancia. Todas las palabras deben aparecer (se aceptan prefijos).
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        consulta = SearchQuery(
+            _normalizar_sql(Value(' & '.join(f'{termino}:*' for termino in terminos))),
+            config='spanish',
+            search_type='raw',
+        )
+        return (
+            queryset.filter(vector_busqueda=consulta)
+            .annotate(relevancia=SearchRank(F('vector_busqueda'), consulta))
+            .order_by('-relevancia', '-fecha_registro')
+        )
+
+    if connection.vendor == 'sqlite':
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        pesos = ', '.join(str(peso) for _, _, peso in CAMPOS_TEXTO)
+        tabla = Inmueble._meta.db_table
+        return (
+            queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta]))
+            .annotate(relevancia=RawSQL(
+                # bm25 es menor para los más relevantes: se invierte el signo
+                f'SELECT -bm25({TABLA_FTS}, {pesos}) FROM {TABLA_FTS} '
+                f'WHERE {TABLA_FTS} MATCH %s AND rowid = "{tabla}"."id"',
+                [consulta],
+                output_field=FloatField(),
+            ))
+            .order_by('-relevancia', '-fecha_registro')
+        )
+
+    # Otros motores: búsqueda simple sin índice
+    for termino in _terminos(normalizar_texto(texto)):
+        condicion = Q()
+        for campo, _, _ in CAMPOS_TEXTO:
+            condicion |= Q(**{f'{campo}__icontains': termino})
+        queryset = queryset.filter(condicion)
+    return queryset
+
+
+def indexar_texto(inmueble):
+    """
+    Actualiza el índice de texto completo de un inmueble a partir de la fila guardada,
+    con las mismas expresiones SQL que la carga inicial de la migración 0003
+    """
+    if connection.vendor == 'postgresql':
+        vector = None
+        for campo, peso, _ in CAMPOS_TEXTO:
+            parte = SearchVector(_normalizar_sql(F(campo)), weight=peso, config='spanish')
+            vector = parte if vector is None else vector + parte
+        type(inmueble)._default_manager.filter(pk=inmueble.pk).update(vector_busqueda=vector)
+
+    elif connection.vendor == 'sqlite':
+        columnas = ', '.join(campo for campo, _, _ in CAMPOS_TEXTO)
+        valores = ', '.join(f"coalesce({campo}, '')" for campo, _, _ in CAMPOS_TEXTO)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [inmueble.pk])
+            cursor.execute(
+                f'INSERT INTO {TABLA_FTS} (rowid, {columnas}) '
+                f'SELECT id, {valores} FROM {Inmueble._meta.db_table} WHERE id = %s',
+                [inmueble.pk],
+            )
+
+
+def retirar_texto(inmueble_id):
+    """Quita un inmueble eliminado del índice de texto completo (en PostgreSQL el vector vive en la fila)"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [inmueble_id])
+
+
+def _caso_habitaciones():
+    """Expresión SQL que asigna cada inmueble a su rango de habitaciones"""
+    tope = RANGOS_HABITACIONES[-1][0]
+    return Case(
+        When(habitaciones__gte=tope, then=Value(tope)),
+        *[When(habitaciones=minimo, then=Value(minimo)) for minimo, _ in RANGOS_HABITACIONES[:-1]],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def filtro_banda_precio(indice):
+    """Condición de la banda de precio dada; la comparten el conteo de facetas y el filtro"""
+    minimo, maximo, _ = BANDAS_PRECIO[indice]
+    condicion = Q()
+    if minimo is not None:
+        condicion &= Q(precio_arriendo__gt=minimo)
+    if maximo is not None:
+        condicion &= Q(precio_arriendo__lte=maximo)
+    return condicion
+
+
+def _caso_precio():
+    """Expresión SQL que asigna cada inmueble a su banda de precio"""
+    condiciones = [
+        When(filtro_banda_precio(indice), then=Value(indice))
+        for indice in range(len(BANDAS_PRECIO))
+    ]
+    return Case(*condiciones, default=Value(len(BANDAS_PRECIO) - 1), output_field=IntegerField())
+
+
+def calcular_facetas(queryset, parametros=None):
+    """
+    Cuenta los resultados por categoría, rango de habitaciones y banda de precio
+    con una sola consulta agrupada. Si se pasan los parámetros GET de la búsqueda,
+    cada opción incluye la query string para aplicarla.
+    """
+    filas = (
+        queryset.order_by()
+        .annotate(rango_habitaciones=_caso_habitaciones(), banda_precio=_caso_precio())
+        .values('categoria', 'rango_habitaciones', 'banda_precio')
+        .annotate(total=Count('id'))
+    )
+
+    por_categoria = {}
+    por_habitaciones = {}
+    por_precio = {}
+    for fila in filas:
+        por_categoria[fila['categoria']] = por_categoria.get(fila['categoria'], 0) + fila['total']
+        por_habitaciones[fila['rango_habitaciones']] = por_habitaciones.get(fila['rango_habitaciones'], 0) + fila['total']
+        por_precio[fila['banda_precio']] = por_precio.get(fila['banda_precio'], 0) + fila['total']
+
+    categorias = [
+        _opcion(etiqueta, por_categoria.get(valor, 0), parametros, categoria=valor)
+        for valor, etiqueta in Inmueble.CATEGORIA_CHOICES
+    ]
+
+    habitaciones = []
+    for minimo, etiqueta in RANGOS_HABITACIONES:
+        total = sum(cantidad for rango, cantidad in por_habitaciones.items() if rango >= minimo)
+        habitaciones.append(_opcion(etiqueta, total, parametros, habitaciones=minimo))
+
+    precios = [
+        _opcion(etiqueta, por_precio.get(indice, 0), parametros, banda_precio=indice)
+        for indice, (_, _, etiqueta) in enumerate(BANDAS_PRECIO)
+    ]
+
+    return {
+        'total': sum(por_categoria.values()),
+        'categorias': categorias,
+        'habitaciones': habitaciones,
+        'precios': precios,
+    }
+
+
+def _opcion(etiqueta, total, parametros, **valores):
+    """Construye una opción de faceta con su enlace de filtrado"""
+    opcion = {'etiqueta': etiqueta, 'total': total}
+    if parametros is not None:
+        query = parametros.copy()
+        query.pop('page', None)
+        for campo, valor in valores.items():
+            query[campo] = valor
+        opcion['query'] = query.urlencode()
+    return opcion
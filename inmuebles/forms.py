@@ -1,4 +1,5 @@
 from django import forms
+from .busqueda import BANDAS_PRECIO
 from .models import Inmueble, ImagenInmueble, CaracteristicaAdicional
 
 
@@ -9,7 +10,7 @@ class InmuebleForm(forms.ModelForm):
         model = Inmueble
         fields = [
             'titulo', 'descripcion', 'categoria', 'estado',
-            'direccion', 'ciudad', 'barrio', 'codigo_postal',
+            'direccion', 'ciudad', 'barrio', 'codigo_postal', 'latitud', 'longitud',
             'area', 'habitaciones', 'banos', 'parqueaderos', 'piso',
             'precio_arriendo', 'precio_administracion', 'deposito_seguridad',
             'amoblado', 'mascotas_permitidas',
@@ -24,6 +25,8 @@ class InmuebleForm(forms.ModelForm):
             'ciudad': forms.TextInput(attrs={'class': 'form-control'}),
             'barrio': forms.TextInput(attrs={'class': 'form-control'}),
             'codigo_postal': forms.TextInput(attrs={'class': 'form-control'}),
+            'latitud': forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'}),
+            'longitud': forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'}),
             'area': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'habitaciones': forms.NumberInput(attrs={'class': 'form-control'}),
             'banos': forms.NumberInput(attrs={'class': 'form-control'}),
@@ -39,6 +42,31 @@ class InmuebleForm(forms.ModelForm):
             'gas_incluida': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'internet_incluido': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Referencia del precio de mercado para la ubicación y categoría del inmueble
+        self.mercado = self.indice_mercado()
+        if self.mercado:
+            self.fields['precio_arriendo'].help_text = (
+                f"Arriendo típico en {self.mercado.barrio}: ${self.mercado.get_mediana_precio():,.0f} "
+                f"(mediana de {self.mercado.cantidad} inmuebles, "
+                f"${self.mercado.get_precio_m2_promedio():,.0f}/m²)"
+            )
+    
+    def indice_mercado(self):
+        """Fila del índice de precios de mercado para la ciudad, barrio y categoría del formulario"""
+        from .mercado import consultar_indice
+        
+        valores = {}
+        for campo in ('ciudad', 'barrio', 'categoria'):
+            if self.is_bound:
+                valores[campo] = self.data.get(self.add_prefix(campo))
+            else:
+                valores[campo] = self.initial.get(campo, getattr(self.instance, campo, None))
+        if not all(valores.values()):
+            return None
+        return consultar_indice(**valores)
 
 
 class ImagenInmuebleForm(forms.ModelForm):
@@ -54,9 +82,78 @@ class ImagenInmuebleForm(forms.ModelForm):
         }
 
 
+class MultipleImageInput(forms.ClearableFileInput):
+    """Widget de archivo que permite seleccionar varias imágenes"""
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.FileField):
+    """Campo que entrega la lista de archivos; cada imagen se valida en el formulario"""
+    widget = MultipleImageInput
+    
+    def clean(self, data, initial=None):
+        archivos = [archivo for archivo in (data if isinstance(data, (list, tuple)) else [data]) if archivo]
+        if self.required and not archivos:
+            raise forms.ValidationError(self.error_messages['required'], code='required')
+        return archivos
+
+
+class ImagenesMultiplesForm(forms.Form):
+    """
+    Formulario para subir varias imágenes en una sola petición. Los archivos se
+    validan uno a uno: los inválidos quedan en errores_archivos y no impiden
+    subir los demás.
+    """
+    MAX_ARCHIVOS = 30
+    MAX_TAMANO = 5 * 1024 * 1024
+    
+    imagenes = MultipleImageField(
+        widget=MultipleImageInput(attrs={'class': 'form-control', 'accept': 'image/*'}),
+        help_text='Puedes seleccionar hasta 30 imágenes'
+    )
+    descripcion = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errores_archivos = []
+    
+    def clean_imagenes(self):
+        archivos = self.cleaned_data['imagenes']
+        if len(archivos) > self.MAX_ARCHIVOS:
+            raise forms.ValidationError(f'Puedes subir máximo {self.MAX_ARCHIVOS} imágenes a la vez.')
+        
+        campo = forms.ImageField()
+        validos = []
+        for archivo in archivos:
+            if archivo.size > self.MAX_TAMANO:
+                self.errores_archivos.append((archivo.name, 'Supera el tamaño máximo de 5MB.'))
+                continue
+            try:
+                validos.append(campo.clean(archivo))
+            except forms.ValidationError as e:
+                self.errores_archivos.append((archivo.name, ' '.join(e.messages)))
+        
+        if not validos:
+            raise forms.ValidationError('Ninguna de las imágenes seleccionadas es válida.')
+        return validos
+
+
 class BusquedaInmuebleForm(forms.Form):
     """Formulario para búsqueda y filtrado de inmuebles"""
     
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Buscar por título, barrio, dirección...'
+        })
+    )
+    
     categoria = forms.ChoiceField(
         choices=[('', 'Todas las categorías')] + Inmueble.CATEGORIA_CHOICES,
         required=False,
@@ -89,6 +186,15 @@ class BusquedaInmuebleForm(forms.Form):
         })
     )
     
+    # Banda elegida en las facetas de precio (índice de BANDAS_PRECIO)
+    banda_precio = forms.TypedChoiceField(
+        required=False,
+        coerce=int,
+        empty_value=None,
+        choices=[(indice, etiqueta) for indice, (_, _, etiqueta) in enumerate(BANDAS_PRECIO)],
+        widget=forms.HiddenInput()
+    )
+    
     habitaciones = forms.IntegerField(
         required=False,
         widget=forms.NumberInput(attrs={
@@ -114,3 +220,42 @@ class BusquedaInmuebleForm(forms.Form):
         required=False,
         widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
     )
+    
+    # Búsqueda geográfica (por radio desde un punto o por caja visible en el mapa)
+    latitud = forms.FloatField(required=False, min_value=-90, max_value=90, widget=forms.HiddenInput())
+    longitud = forms.FloatField(required=False, min_value=-180, max_value=180, widget=forms.HiddenInput())
+    radio_km = forms.FloatField(
+        required=False,
+        min_value=0.1,
+        max_value=100,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Radio (km)',
+            'step': '0.5'
+        })
+    )
+    caja = forms.CharField(required=False, widget=forms.HiddenInput())
+    
+    def clean_caja(self):
+        """Caja en formato 'sur,oeste,norte,este'"""
+        caja = self.cleaned_data.get('caja')
+        if not caja:
+            return None
+        try:
+            sur, oeste, norte, este = [float(valor) for valor in caja.split(',')]
+        except ValueError:
+            raise forms.ValidationError('Formato de caja inválido.')
+        if not (-90 <= sur <= norte <= 90 and -180 <= oeste <= este <= 180):
+            raise forms.ValidationError('Coordenadas de caja fuera de rango.')
+        return sur, oeste, norte, este
+    
+    def aplicar_facetas(self, facetas):
+        """Agrega el número de resultados a cada opción de categoría"""
+        totales = {
+            valor: opcion['total']
+            for (valor, _), opcion in zip(Inmueble.CATEGORIA_CHOICES, facetas['categorias'])
+        }
+        self.fields['categoria'].choices = [('', 'Todas las categorías')] + [
+            (valor, f'{etiqueta} ({totales.get(valor, 0)})')
+            for valor, etiqueta in Inmueble.CATEGORIA_CHOICES
+        ]
@@ -0,0 +1,133 @@
+"""
+Búsqueda geográfica de inmuebles sin PostGIS.
+
+Cada inmueble guarda su geohash (geocelda) en una columna con índice B-tree.
+Las consultas por radio o por caja se resuelven en dos pasos: primero se
+obtienen candidatos por prefijo de geohash y rango de coordenadas (usa el
+índice) y luego se filtra por la distancia haversine exacta, también en SQL,
+sin traer los candidatos a Python.
+"""
+import math
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cos, Power, Radians, Sin, Sqrt
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = 111.32
+PRECISION_GEOHASH = 9
+MAX_CELDAS = 32
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def codificar_geohash(latitud, longitud, precision=PRECISION_GEOHASH):
+    """Codifica una coordenada como geohash"""
+    rango_lat = [-90.0, 90.0]
+    rango_lon = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit = 0
+    par = True
+    while len(geohash) < precision:
+        rango, valor = (rango_lon, longitud) if par else (rango_lat, latitud)
+        medio = (rango[0] + rango[1]) / 2
+        if valor >= medio:
+            bits = (bits << 1) | 1
+            rango[0] = medio
+        else:
+            bits <<= 1
+            rango[1] = medio
+        par = not par
+        bit += 1
+        if bit == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit = 0
+    return ''.join(geohash)
+
+
+def _tamano_celda(precision):
+    """Alto y ancho en grados de una celda de geohash"""
+    bits = precision * 5
+    bits_lon = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lon)
+
+
+def celdas_para_caja(sur, oeste, norte, este):
+    """Prefijos de geohash que cubren la caja, con la mayor precisión que no exceda MAX_CELDAS"""
+    for precision in range(PRECISION_GEOHASH, 0, -1):
+        alto, ancho = _tamano_celda(precision)
+        filas = math.floor(norte / alto) - math.floor(sur / alto) + 1
+        columnas = math.floor(este / ancho) - math.floor(oeste / ancho) + 1
+        if filas * columnas <= MAX_CELDAS:
+            break
+
+    celdas = set()
+    lat = math.floor(sur / alto) * alto + alto / 2
+    while lat < norte + alto / 2:
+        lon = math.floor(oeste / ancho) * ancho + ancho / 2
+        while lon < este + ancho / 2:
+            celdas.add(codificar_geohash(min(lat, 90.0), min(lon, 180.0), precision))
+            lon += ancho
+        lat += alto
+    return sorted(celdas)
+
+
+def caja_para_radio(latitud, longitud, radio_km):
+    """Caja (sur, oeste, norte, este) que contiene el círculo del radio dado"""
+    delta_lat = radio_km / KM_POR_GRADO
+    coseno = max(math.cos(math.radians(latitud)), 1e-6)
+    delta_lon = min(radio_km / (KM_POR_GRADO * coseno), 180.0)
+    return (
+        max(latitud - delta_lat, -90.0),
+        max(longitud - delta_lon, -180.0),
+        min(latitud + delta_lat, 90.0),
+        min(longitud + delta_lon, 180.0),
+    )
+
+
+def _termino_haversine(latitud, longitud):
+    """
+    Expresión SQL del término a = sin²(Δlat/2) + cos(lat0)·cos(lat)·sin²(Δlon/2).
+    La distancia 2R·asin(√a) crece con a, así que basta comparar a con un umbral.
+    """
+    seno_lat = Sin(Radians(F('latitud') - latitud) / 2, output_field=FloatField())
+    seno_lon = Sin(Radians(F('longitud') - longitud) / 2, output_field=FloatField())
+    return (
+        Power(seno_lat, 2)
+        + math.cos(math.radians(latitud)) * Cos(Radians(F('latitud')), output_field=FloatField()) * Power(seno_lon, 2)
+    )
+
+
+def buscar_en_caja(queryset, sur, oeste, norte, este):
+    """Filtra los inmuebles dentro de la caja usando el índice de geocelda"""
+    prefijos = Q()
+    for celda in celdas_para_caja(sur, oeste, norte, este):
+        prefijos |= Q(geocelda__startswith=celda)
+    return queryset.filter(
+        prefijos,
+        latitud__range=(sur, norte),
+        longitud__range=(oeste, este),
+    )
+
+
+def anotar_distancia(queryset, latitud, longitud):
+    """
+    Anota distancia_km con una aproximación equirectangular calculada en la base
+    de datos (suficiente para ordenar a escala de ciudad) y ordena por ella
+    """
+    coseno = math.cos(math.radians(latitud))
+    delta_lat = F('latitud') - latitud
+    delta_lon = (F('longitud') - longitud) * coseno
+    return queryset.filter(latitud__isnull=False, longitud__isnull=False).annotate(
+        distancia_km=Sqrt(delta_lat * delta_lat + delta_lon * delta_lon, output_field=FloatField()) * KM_POR_GRADO
+    ).order_by('distancia_km')
+
+
+def buscar_en_radio(queryset, latitud, longitud, radio_km):
+    """Inmuebles a menos de radio_km del punto, ordenados por distancia"""
+    candidatos = buscar_en_caja(queryset, *caja_para_radio(latitud, longitud, radio_km))
+    umbral = math.sin(min(radio_km / (2 * RADIO_TIERRA_KM), math.pi / 2)) ** 2
+    dentro = candidatos.alias(termino_haversine=_termino_haversine(latitud, longitud)).filter(
+        termino_haversine__lte=umbral
+    )
+    return anotar_distancia(dentro, latitud, longitud)
@@ -0,0 +1,196 @@
+"""
+Derivados de las imágenes de inmuebles.
+
+Por cada ImagenInmueble se generan versiones de tamaño fijo (tarjeta, detalle y
+completa) en WebP y JPEG, sin metadatos EXIF y con la dimensión mayor acotada.
+Con IMAGENES_EN_PROCESO el procesamiento corre en un pool acotado de hilos del
+proceso web después de confirmar la transacción, fuera del ciclo de la
+petición. Las tareas de ese pool se pierden si el proceso se reinicia, así que
+el comando procesar_imagenes debe programarse igual: retoma las imágenes que
+quedaron con procesada=False (fallidas o perdidas). Sin IMAGENES_EN_PROCESO el
+comando es el único que genera los derivados.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F, Max
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Nombre del derivado -> dimensión mayor en píxeles (de menor a mayor)
+TAMANOS_DERIVADOS = {
+    'tarjeta': 480,
+    'detalle': 1200,
+    'completa': 2048,
+}
+
+# Extensión -> (formato de Pillow, opciones de guardado)
+FORMATOS_DERIVADOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Límite de píxeles para rechazar imágenes desproporcionadas (bombas de descompresión)
+MAX_PIXELES = 50_000_000
+
+_pool = None
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=settings.IMAGENES_WORKERS,
+            thread_name_prefix='imagenes',
+        )
+    return _pool
+
+
+def _abrir(archivo):
+    """Abre la imagen original aplicando la orientación EXIF y normalizando a RGB"""
+    with archivo.open('rb') as original:
+        imagen = Image.open(original)
+        if imagen.width * imagen.height > MAX_PIXELES:
+            raise ValueError(f'Imagen demasiado grande ({imagen.width}x{imagen.height})')
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.load()
+
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar_derivados(imagen_inmueble, storage=None):
+    """
+    Genera y guarda los derivados de una imagen. Retorna el diccionario que se
+    almacena en ImagenInmueble.derivados:
+        {'tarjeta': {'ancho': 480, 'alto': 320, 'webp': url, 'jpg': url}, ...}
+    Por defecto los derivados se guardan en el mismo storage que la original.
+    """
+    storage = storage or imagen_inmueble.imagen.storage
+    original = _abrir(imagen_inmueble.imagen)
+    base = os.path.splitext(os.path.basename(imagen_inmueble.imagen.name))[0]
+
+    derivados = {}
+    for nombre, dimension in TAMANOS_DERIVADOS.items():
+        copia = original.copy()
+        copia.thumbnail((dimension, dimension), Image.LANCZOS)
+        derivado = {'ancho': copia.width, 'alto': copia.height}
+        for extension, (formato, opciones) in FORMATOS_DERIVADOS.items():
+            # Al no pasar exif= se descartan los metadatos de la original
+            contenido = BytesIO()
+            copia.save(contenido, formato, **opciones)
+            ruta = f'inmuebles/derivados/{imagen_inmueble.pk}/{base}_{nombre}.{extension}'
+            if storage.exists(ruta):
+                storage.delete(ruta)
+            guardado = storage.save(ruta, ContentFile(contenido.getvalue()))
+            derivado[extension] = storage.url(guardado)
+        derivados[nombre] = derivado
+    return derivados
+
+
+def procesar_imagen(imagen_id, storage=None):
+    """Genera los derivados de una imagen y los registra en la base de datos"""
+    from .models import Inmueble, ImagenInmueble
+
+    imagen = ImagenInmueble.objects.filter(pk=imagen_id).first()
+    if imagen is None:
+        return None
+
+    derivados = generar_derivados(imagen, storage=storage)
+    ImagenInmueble.objects.filter(pk=imagen_id).update(derivados=derivados, procesada=True)
+    # Las tarjetas y el detalle cacheados deben tomar las nuevas URLs
+    Inmueble(pk=imagen.inmueble_id).invalidar_cache()
+    return derivados
+
+
+def _procesar_en_hilo(imagen_id):
+    close_old_connections()
+    try:
+        procesar_imagen(imagen_id)
+    except Exception:
+        # La imagen queda sin procesar (procesada=False) para reintentarla
+        logger.exception('Error al procesar la imagen %s', imagen_id)
+    finally:
+        close_old_connections()
+
+
+def encolar_procesamiento(imagen_id):
+    """Programa la generación de derivados al confirmar la transacción actual"""
+    if not settings.IMAGENES_EN_PROCESO:
+        return
+    transaction.on_commit(lambda: _obtener_pool().submit(_procesar_en_hilo, imagen_id))
+
+
+def siguiente_orden(inmueble):
+    """Orden que corresponde a la próxima imagen del inmueble"""
+    ultimo = inmueble.imagenes.aggregate(ultimo=Max('orden'))['ultimo']
+    return 0 if ultimo is None else ultimo + 1
+
+
+def subir_imagenes(inmueble, archivos, descripcion=''):
+    """
+    Sube varias imágenes de un inmueble: los archivos se escriben en el storage en
+    paralelo (pool acotado) y las filas se insertan con un solo bulk_create.
+    Retorna (imágenes creadas, errores) con errores como [(nombre, mensaje)].
+    """
+    from .models import Inmueble, ImagenInmueble
+
+    campo = ImagenInmueble._meta.get_field('imagen')
+
+    def guardar(archivo):
+        return campo.storage.save(campo.generate_filename(None, archivo.name), archivo)
+
+    nombres = {}
+    errores = []
+    workers = min(settings.IMAGENES_WORKERS_SUBIDA, len(archivos)) or 1
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='subida') as pool:
+        futuros = {pool.submit(guardar, archivo): indice for indice, archivo in enumerate(archivos)}
+        for futuro in as_completed(futuros):
+            indice = futuros[futuro]
+            try:
+                nombres[indice] = futuro.result()
+            except Exception as e:
+                errores.append((archivos[indice].name, f'No se pudo guardar: {e}'))
+
+    # Orden asignado en una sola pasada, respetando el orden de selección
+    orden = siguiente_orden(inmueble)
+    nuevas = []
+    for indice in sorted(nombres):
+        nuevas.append(ImagenInmueble(
+            inmueble=inmueble,
+            imagen=nombres[indice],
+            descripcion=descripcion,
+            orden=orden + len(nuevas),
+        ))
+    if not nuevas:
+        return [], errores
+
+    try:
+        with transaction.atomic():
+            creadas = ImagenInmueble.objects.bulk_create(nuevas)
+            # bulk_create no pasa por ImagenInmueble.save(): mantener aquí la imagen
+            # principal desnormalizada, la versión de caché y los derivados
+            cambios = {'version_cache': F('version_cache') + 1}
+            if inmueble.imagen_principal_id is None:
+                cambios['imagen_principal'] = creadas[0]
+            Inmueble.objects.filter(pk=inmueble.pk).update(**cambios)
+            for imagen in creadas:
+                encolar_procesamiento(imagen.pk)
+    except Exception:
+        # Sin filas no deben quedar archivos huérfanos en el storage
+        for imagen in nuevas:
+            campo.storage.delete(imagen.imagen.name)
+        raise
+
+    if 'imagen_principal' in cambios:
+        inmueble.imagen_principal = creadas[0]
+    return creadas, errores
@@ -0,0 +1,57 @@
+"""
+Pone al día el índice de inmuebles similares con los cambios encolados por las
+señales de Inmueble (inmuebles.similitud.procesar_pendientes).
+
+Debe correr un solo proceso a la vez:
+    python manage.py actualizar_similares --continuo
+"""
+import logging
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from inmuebles.similitud import TAMANO_BLOQUE, procesar_pendientes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el índice de inmuebles similares con los cambios pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Seguir procesando hasta recibir SIGINT/SIGTERM')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--limite', type=int, default=TAMANO_BLOQUE, help='Filas de la cola por pasada')
+
+    def handle(self, *args, **options):
+        self._detener = False
+        if options['continuo']:
+            signal.signal(signal.SIGINT, self._solicitar_detencion)
+            signal.signal(signal.SIGTERM, self._solicitar_detencion)
+
+        total = 0
+        while not self._detener:
+            close_old_connections()
+            try:
+                procesadas = procesar_pendientes(limite=options['limite'])
+            except Exception:
+                # Las filas siguen en la cola y se reintentan en la siguiente pasada
+                logger.exception('Error al actualizar inmuebles similares')
+                if not options['continuo']:
+                    raise
+                procesadas = 0
+            total += procesadas
+            if procesadas < options['limite']:
+                if not options['continuo']:
+                    break
+                self._esperar(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} cambios de similares procesados'))
+
+    def _solicitar_detencion(self, *args):
+        self._detener = True
+
+    def _esperar(self, segundos):
+        fin = time.monotonic() + segundos
+        while not self._detener and time.monotonic() < fin:
+            time.sleep(min(0.2, segundos))
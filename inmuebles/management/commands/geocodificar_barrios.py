@@ -0,0 +1,56 @@
+"""
+Asigna coordenadas a los inmuebles a partir de un CSV de barrios con columnas
+ciudad,barrio,latitud,longitud
+"""
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from inmuebles.geo import codificar_geohash
+from inmuebles.models import Inmueble
+from inmuebles.utils import normalizar_texto
+
+TAMANO_LOTE = 500
+
+
+class Command(BaseCommand):
+    help = 'Geocodifica los inmuebles sin coordenadas usando el centro de su barrio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', required=True, help='CSV con columnas ciudad,barrio,latitud,longitud')
+        parser.add_argument('--sobrescribir', action='store_true', help='Reemplazar coordenadas existentes')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8') as archivo:
+                centros = {
+                    (normalizar_texto(fila['ciudad']), normalizar_texto(fila['barrio'])): (
+                        float(fila['latitud']), float(fila['longitud'])
+                    )
+                    for fila in csv.DictReader(archivo)
+                }
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        inmuebles = Inmueble.objects.exclude(barrio='')
+        if not options['sobrescribir']:
+            inmuebles = inmuebles.filter(latitud__isnull=True)
+
+        pendientes = []
+        actualizados = 0
+        for inmueble in inmuebles.only('id', 'ciudad_normalizada', 'barrio').iterator(chunk_size=TAMANO_LOTE):
+            centro = centros.get((inmueble.ciudad_normalizada, normalizar_texto(inmueble.barrio)))
+            if centro is None:
+                continue
+            # bulk_update no pasa por save(): la geocelda se calcula aquí
+            inmueble.latitud, inmueble.longitud = centro
+            inmueble.geocelda = codificar_geohash(*centro)
+            pendientes.append(inmueble)
+            if len(pendientes) >= TAMANO_LOTE:
+                Inmueble.objects.bulk_update(pendientes, ['latitud', 'longitud', 'geocelda'])
+                actualizados += len(pendientes)
+                pendientes = []
+
+        if pendientes:
+            Inmueble.objects.bulk_update(pendientes, ['latitud', 'longitud', 'geocelda'])
+            actualizados += len(pendientes)
+
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} inmuebles geocodificados'))
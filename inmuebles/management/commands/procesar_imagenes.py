@@ -0,0 +1,47 @@
+"""
+Genera los derivados (tarjeta, detalle, completa) de las imágenes pendientes
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from inmuebles.imagenes import procesar_imagen
+from inmuebles.models import ImagenInmueble
+
+
+class Command(BaseCommand):
+    help = 'Genera los derivados WebP/JPEG de las imágenes de inmuebles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Reprocesar también las imágenes ya procesadas')
+        parser.add_argument('--workers', type=int, default=4, help='Hilos de procesamiento')
+        parser.add_argument('--directorio', help='Guardar los derivados en este directorio local en lugar del storage')
+
+    def handle(self, *args, **options):
+        imagenes = ImagenInmueble.objects.all()
+        if not options['todas']:
+            imagenes = imagenes.filter(procesada=False)
+        ids = list(imagenes.order_by('id').values_list('id', flat=True))
+
+        storage = None
+        if options['directorio']:
+            storage = FileSystemStorage(location=options['directorio'], base_url='/derivados/')
+
+        def procesar(imagen_id):
+            close_old_connections()
+            try:
+                return procesar_imagen(imagen_id, storage=storage)
+            finally:
+                close_old_connections()
+
+        procesadas = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futuros = {pool.submit(procesar, imagen_id): imagen_id for imagen_id in ids}
+            for futuro in as_completed(futuros):
+                try:
+                    futuro.result()
+                    procesadas += 1
+                except Exception as e:
+                    self.stderr.write(f'Imagen {futuros[futuro]}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'{procesadas} de {len(ids)} imágenes procesadas'))
@@ -0,0 +1,57 @@
+"""
+Reconstrucción nocturna del índice de precios de mercado.
+
+Recalcula todos los grupos con NumPy, los compara con el índice mantenido de
+forma incremental, reporta las diferencias y luego reemplaza el índice.
+"""
+import numpy as np
+from django.core.management.base import BaseCommand
+from inmuebles.mercado import cuantil, guardar_grupos, recalcular_grupos
+from inmuebles.models import IndicePrecioMercado
+
+
+class Command(BaseCommand):
+    help = 'Verifica y reconstruye el índice de precios de mercado por ciudad, barrio y categoría'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-verificar', action='store_true', help='Reportar diferencias sin reemplazar el índice')
+
+    def handle(self, *args, **options):
+        grupos = recalcular_grupos()
+        actuales = {
+            (indice.ciudad_normalizada, indice.barrio_normalizado, indice.categoria): indice
+            for indice in IndicePrecioMercado.objects.filter(cantidad__gt=0)
+        }
+
+        diferencias = 0
+        for clave in sorted(set(grupos) | set(actuales)):
+            grupo = grupos.get(clave)
+            indice = actuales.get(clave)
+            if grupo is None or indice is None:
+                diferencias += 1
+                self.stdout.write(self.style.WARNING(f'{clave}: grupo {"sobrante" if grupo is None else "faltante"} en el índice'))
+                continue
+            for campo in ('cantidad', 'suma_precio', 'suma_precio_m2', 'sketch_precio', 'sketch_precio_m2'):
+                if getattr(indice, campo) != grupo[campo]:
+                    diferencias += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'{clave}: {campo} incremental={getattr(indice, campo)} recalculado={grupo[campo]}'
+                    ))
+
+        # Error relativo de la mediana del sketch frente a la mediana exacta
+        errores = [
+            abs(cuantil(grupo['sketch_precio'], 0.5) - mediana) / mediana
+            for grupo in grupos.values()
+            for mediana in [np.quantile(grupo['precios'], 0.5, method='lower')]
+        ]
+        error_maximo = max(errores, default=0.0)
+
+        self.stdout.write(
+            f'{len(grupos)} grupos, {diferencias} diferencias, '
+            f'error relativo máximo de la mediana: {error_maximo:.4%}'
+        )
+
+        if options['solo_verificar']:
+            return
+        guardar_grupos(grupos)
+        self.stdout.write(self.style.SUCCESS('Índice de precios de mercado reconstruido'))
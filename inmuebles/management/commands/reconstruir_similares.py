@@ -0,0 +1,16 @@
+"""
+Reconstruye el índice de inmuebles similares desde cero
+"""
+import time
+from django.core.management.base import BaseCommand
+from inmuebles.similitud import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los vecinos más cercanos de todos los inmuebles'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = reconstruir_indice()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{total} inmuebles indexados en {duracion:.2f}s'))
@@ -0,0 +1,230 @@
+"""
+Índice de precios de mercado por (ciudad, barrio, categoría).
+
+Cada fila de IndicePrecioMercado guarda la cantidad de inmuebles, las sumas
+exactas de precio y precio por m² y dos sketches de cuantiles (estilo DDSketch)
+para estimar la mediana. Los sketches son histogramas de cubetas logarítmicas
+con error relativo ALFA, por lo que admiten tanto agregar como quitar valores:
+el índice se mantiene con el aporte anterior y el nuevo de cada inmueble en
+Inmueble.save, sin recalcular el grupo.
+"""
+import bisect
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+from .utils import normalizar_texto
+
+# Error relativo de las medianas estimadas
+ALFA = 0.01
+GAMMA = (1 + ALFA) / (1 - ALFA)
+
+# Límites superiores de las cubetas: la cubeta i contiene (GAMMA**(i-1), GAMMA**i].
+# Se comparan contra la misma tabla en Python y en NumPy para obtener cubetas idénticas.
+LIMITES_CUBETAS = GAMMA ** np.arange(0, 1500)
+_LIMITES = LIMITES_CUBETAS.tolist()
+
+# Estados que representan precios reales del mercado
+ESTADOS_MERCADO = ('disponible', 'arrendado')
+
+CAMPOS_MERCADO = ['ciudad', 'ciudad_normalizada', 'barrio', 'categoria', 'estado', 'activo', 'precio_arriendo', 'area']
+
+CENTAVOS = Decimal('0.01')
+
+
+def cubeta(valor):
+    """Índice de la cubeta logarítmica de un valor positivo"""
+    return min(bisect.bisect_left(_LIMITES, float(valor)), len(_LIMITES) - 1)
+
+
+def cubetas(valores):
+    """Índices de cubeta de un arreglo de valores (versión vectorizada de cubeta)"""
+    indices = np.searchsorted(LIMITES_CUBETAS, np.asarray(valores, dtype=float), side='left')
+    return np.minimum(indices, len(LIMITES_CUBETAS) - 1)
+
+
+def cuantil(sketch, q):
+    """Estima el cuantil q (0-1) de un sketch {cubeta: cantidad}"""
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rango = q * (total - 1)
+    acumulado = 0
+    for indice in sorted(sketch, key=int):
+        acumulado += sketch[indice]
+        if acumulado > rango:
+            return 2 * GAMMA ** int(indice) / (GAMMA + 1)
+    return None
+
+
+def precio_m2(precio, area):
+    return (Decimal(precio) / Decimal(area)).quantize(CENTAVOS)
+
+
+def aporte(valores):
+    """
+    Aporte de un inmueble al índice a partir de sus valores de CAMPOS_MERCADO:
+    (clave, ciudad, barrio, precio, precio_m2) o None si no participa
+    """
+    if not valores['activo'] or valores['estado'] not in ESTADOS_MERCADO:
+        return None
+    precio = valores['precio_arriendo']
+    area = valores['area']
+    if not precio or not area or precio <= 0 or area <= 0:
+        return None
+    clave = (valores['ciudad_normalizada'], normalizar_texto(valores['barrio']), valores['categoria'])
+    return clave, valores['ciudad'], valores['barrio'], Decimal(precio), precio_m2(precio, area)
+
+
+def valores_mercado(inmueble):
+    return {campo: getattr(inmueble, campo) for campo in CAMPOS_MERCADO}
+
+
+def _aplicar(datos, signo):
+    """Suma (signo=1) o resta (signo=-1) el aporte de un inmueble a su grupo"""
+    from .models import IndicePrecioMercado
+
+    (ciudad_normalizada, barrio_normalizado, categoria), ciudad, barrio, precio, por_m2 = datos
+    indice, _ = IndicePrecioMercado.objects.select_for_update().get_or_create(
+        ciudad_normalizada=ciudad_normalizada,
+        barrio_normalizado=barrio_normalizado,
+        categoria=categoria,
+        defaults={'ciudad': ciudad, 'barrio': barrio},
+    )
+    for campo, valor in (('sketch_precio', precio), ('sketch_precio_m2', por_m2)):
+        sketch = getattr(indice, campo)
+        clave = str(cubeta(valor))
+        sketch[clave] = sketch.get(clave, 0) + signo
+        if sketch[clave] <= 0:
+            del sketch[clave]
+
+    if signo > 0:
+        # Conservar la forma de escribir la ciudad y el barrio más reciente
+        indice.ciudad = ciudad
+        indice.barrio = barrio
+    indice.cantidad = F('cantidad') + signo
+    indice.suma_precio = F('suma_precio') + signo * precio
+    indice.suma_precio_m2 = F('suma_precio_m2') + signo * por_m2
+    indice.save()
+
+
+def actualizar_indice_mercado(inmueble, anterior):
+    """
+    Actualiza el índice con el cambio de un inmueble. anterior son los valores de
+    CAMPOS_MERCADO antes del cambio (None si el inmueble es nuevo).
+    """
+    aporte_anterior = aporte(anterior) if anterior else None
+    aporte_nuevo = aporte(valores_mercado(inmueble))
+    if aporte_anterior == aporte_nuevo:
+        return
+
+    with transaction.atomic():
+        if aporte_anterior:
+            _aplicar(aporte_anterior, -1)
+        if aporte_nuevo:
+            _aplicar(aporte_nuevo, 1)
+
+
+def retirar_del_indice(inmueble, anterior):
+    """Quita del índice el aporte de un inmueble eliminado"""
+    aporte_anterior = aporte(anterior) if anterior else None
+    if aporte_anterior:
+        with transaction.atomic():
+            _aplicar(aporte_anterior, -1)
+
+
+def consultar_indice(ciudad, barrio, categoria):
+    """Fila del índice para el grupo indicado o None"""
+    from .models import IndicePrecioMercado
+
+    return IndicePrecioMercado.objects.filter(
+        ciudad_normalizada=normalizar_texto(ciudad),
+        barrio_normalizado=normalizar_texto(barrio),
+        categoria=categoria,
+        cantidad__gt=0,
+    ).first()
+
+
+def recalcular_grupos(inmuebles=None):
+    """
+    Recalcula todos los grupos desde la tabla de inmuebles (o el queryset dado).
+    Las cubetas y los conteos se obtienen con NumPy; las sumas se mantienen en
+    Decimal para que sean comparables exactamente con el índice incremental. Retorna
+    {clave: {'ciudad', 'barrio', 'cantidad', 'suma_precio', 'suma_precio_m2',
+    'sketch_precio', 'sketch_precio_m2', 'precios', 'precios_m2'}}.
+    """
+    if inmuebles is None:
+        from .models import Inmueble
+        inmuebles = Inmueble.objects.all()
+
+    filas = inmuebles.filter(
+        activo=True,
+        estado__in=ESTADOS_MERCADO,
+        precio_arriendo__gt=0,
+        area__gt=0,
+    ).order_by('id').values_list(*CAMPOS_MERCADO)
+
+    claves = []
+    etiquetas = {}
+    precios = []
+    precios_m2 = []
+    for ciudad, ciudad_normalizada, barrio, categoria, _, _, precio, area in filas:
+        clave = (ciudad_normalizada, normalizar_texto(barrio), categoria)
+        claves.append(clave)
+        etiquetas[clave] = (ciudad, barrio)
+        precios.append(precio)
+        precios_m2.append(precio_m2(precio, area))
+
+    grupos = {}
+    if not claves:
+        return grupos
+
+    codigos_clave = {clave: codigo for codigo, clave in enumerate(dict.fromkeys(claves))}
+    codigos = np.array([codigos_clave[clave] for clave in claves])
+    cubetas_precio = cubetas(precios)
+    cubetas_m2 = cubetas(precios_m2)
+    valores_precio = np.array(precios, dtype=float)
+    valores_m2 = np.array(precios_m2, dtype=float)
+
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.flatnonzero(np.diff(codigos[orden])) + 1
+    for posiciones in np.split(orden, limites):
+        clave = claves[posiciones[0]]
+        grupo = {
+            'ciudad': etiquetas[clave][0],
+            'barrio': etiquetas[clave][1],
+            'cantidad': len(posiciones),
+            'suma_precio': sum((precios[i] for i in posiciones), Decimal('0')),
+            'suma_precio_m2': sum((precios_m2[i] for i in posiciones), Decimal('0')),
+            'precios': valores_precio[posiciones],
+            'precios_m2': valores_m2[posiciones],
+        }
+        for campo, valores in (('sketch_precio', cubetas_precio), ('sketch_precio_m2', cubetas_m2)):
+            indices, conteos = np.unique(valores[posiciones], return_counts=True)
+            grupo[campo] = {str(int(i)): int(n) for i, n in zip(indices, conteos)}
+        grupos[clave] = grupo
+    return grupos
+
+
+def guardar_grupos(grupos, modelo=None):
+    """Reemplaza el contenido del índice por los grupos recalculados"""
+    if modelo is None:
+        from .models import IndicePrecioMercado as modelo
+
+    with transaction.atomic():
+        modelo.objects.all().delete()
+        modelo.objects.bulk_create([
+            modelo(
+                ciudad_normalizada=clave[0],
+                barrio_normalizado=clave[1],
+                categoria=clave[2],
+                ciudad=grupo['ciudad'],
+                barrio=grupo['barrio'],
+                cantidad=grupo['cantidad'],
+                suma_precio=grupo['suma_precio'],
+                suma_precio_m2=grupo['suma_precio_m2'],
+                sketch_precio=grupo['sketch_precio'],
+                sketch_precio_m2=grupo['sketch_precio_m2'],
+            )
+            for clave, grupo in grupos.items()
+        ], batch_size=500)
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:51
+
+from django.db import migrations, models
+from inmuebles.utils import normalizar_texto
+
+
+def poblar_ciudad_normalizada(apps, schema_editor):
+    Inmueble = apps.get_model('inmuebles', 'Inmueble')
+    pendientes = []
+    for inmueble in Inmueble.objects.only('id', 'ciudad').iterator(chunk_size=2000):
+        inmueble.ciudad_normalizada = normalizar_texto(inmueble.ciudad)
+        pendientes.append(inmueble)
+        if len(pendientes) >= 2000:
+            Inmueble.objects.bulk_update(pendientes, ['ciudad_normalizada'])
+            pendientes = []
+    if pendientes:
+        Inmueble.objects.bulk_update(pendientes, ['ciudad_normalizada'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='ciudad_normalizada',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(poblar_ciudad_normalizada, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['activo', 'estado', 'categoria', 'ciudad_normalizada', 'precio_arriendo'], name='inmuebles_i_activo_396ae3_idx'),
+        ),
+    ]
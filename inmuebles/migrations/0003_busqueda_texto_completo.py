@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:53
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# El DDL y la carga inicial se fijan aquí en SQL, sin importar inmuebles.busqueda:
+# la migración no debe cambiar cuando cambie el código de la aplicación
+TABLA_FTS = 'inmuebles_inmueble_fts'
+CAMPOS_TEXTO = [('titulo', 'A'), ('barrio', 'B'), ('direccion', 'C'), ('descripcion', 'D')]
+
+# Minúsculas sin tildes, como busqueda._normalizar_sql al indexar y consultar
+CON_TILDE = 'áàâäãéèêëíìîïóòôöõúùûüñç'
+SIN_TILDE = 'aaaaaeeeeiiiiooooouuuunc'
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Un solo UPDATE para todas las filas y el índice GIN después de la carga
+        vector = ' || '.join(
+            f"setweight(to_tsvector('spanish', translate(lower(coalesce({campo}, '')), "
+            f"'{CON_TILDE}', '{SIN_TILDE}')), '{peso}')"
+            for campo, peso in CAMPOS_TEXTO
+        )
+        schema_editor.execute(f'UPDATE inmuebles_inmueble SET vector_busqueda = {vector}')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS inmuebles_inmueble_vector_gin '
+            'ON inmuebles_inmueble USING gin (vector_busqueda)'
+        )
+    elif schema_editor.connection.vendor == 'sqlite':
+        # El tokenizador de FTS5 ya ignora mayúsculas y tildes
+        columnas = ', '.join(campo for campo, _ in CAMPOS_TEXTO)
+        valores = ', '.join(f"coalesce({campo}, '')" for campo, _ in CAMPOS_TEXTO)
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} '
+            f'USING fts5({columnas}, tokenize = "unicode61 remove_diacritics 2")'
+        )
+        schema_editor.execute(
+            f'INSERT INTO {TABLA_FTS} (rowid, {columnas}) SELECT id, {valores} FROM inmuebles_inmueble'
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS inmuebles_inmueble_vector_gin')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0002_busqueda_indexada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='vector_busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_imagen_principal(apps, schema_editor):
+    Inmueble = apps.get_model('inmuebles', 'Inmueble')
+    ImagenInmueble = apps.get_model('inmuebles', 'ImagenInmueble')
+    # La marcada como principal primero; si no hay, la de menor orden
+    principales = {}
+    imagenes = ImagenInmueble.objects.order_by('inmueble_id', '-principal', 'orden', 'id').values_list('inmueble_id', 'id')
+    for inmueble_id, imagen_id in imagenes.iterator(chunk_size=2000):
+        principales.setdefault(inmueble_id, imagen_id)
+    pendientes = [Inmueble(id=inmueble_id, imagen_principal_id=imagen_id) for inmueble_id, imagen_id in principales.items()]
+    Inmueble.objects.bulk_update(pendientes, ['imagen_principal'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0003_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='imagen_principal',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inmuebles.imageninmueble'),
+        ),
+        migrations.RunPython(poblar_imagen_principal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0004_imagen_principal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='geocelda',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Geohash de la ubicación', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='inmueble',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inmueble',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0005_geolocalizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InmuebleSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('distancia', models.FloatField()),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indice_similares', to='inmuebles.inmueble')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inmuebles.inmueble')),
+            ],
+            options={
+                'verbose_name': 'Inmueble Similar',
+                'verbose_name_plural': 'Inmuebles Similares',
+                'ordering': ['inmueble', 'posicion'],
+                'unique_together': {('inmueble', 'posicion')},
+            },
+        ),
+    ]
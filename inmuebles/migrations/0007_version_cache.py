@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0006_inmuebles_similares'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='version_cache',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0007_version_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='procesada',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
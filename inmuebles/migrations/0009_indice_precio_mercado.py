@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+def poblar_indice(apps, schema_editor):
+    from inmuebles.mercado import guardar_grupos, recalcular_grupos
+    Inmueble = apps.get_model('inmuebles', 'Inmueble')
+    IndicePrecioMercado = apps.get_model('inmuebles', 'IndicePrecioMercado')
+    guardar_grupos(recalcular_grupos(Inmueble.objects.all()), IndicePrecioMercado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0008_derivados_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicePrecioMercado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ciudad_normalizada', models.CharField(max_length=100)),
+                ('barrio_normalizado', models.CharField(max_length=100)),
+                ('categoria', models.CharField(choices=[('casa', 'Casa'), ('apartamento', 'Apartamento'), ('local', 'Local Comercial'), ('oficina', 'Oficina'), ('bodega', 'Bodega'), ('otro', 'Otro')], max_length=20)),
+                ('ciudad', models.CharField(max_length=100)),
+                ('barrio', models.CharField(max_length=100)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('suma_precio', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('suma_precio_m2', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sketch_precio', models.JSONField(blank=True, default=dict)),
+                ('sketch_precio_m2', models.JSONField(blank=True, default=dict)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de Precio de Mercado',
+                'verbose_name_plural': 'Índices de Precios de Mercado',
+                'unique_together': {('ciudad_normalizada', 'barrio_normalizado', 'categoria')},
+            },
+        ),
+        migrations.RunPython(poblar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmuebles', '0009_indice_precio_mercado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActualizacionSimilares',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vecinos', models.BooleanField(default=True, help_text='Recalcular también los inmuebles que lo tendrían como vecino')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inmuebles.inmueble')),
+            ],
+            options={
+                'verbose_name': 'Actualización de Similares',
+                'verbose_name_plural': 'Actualizaciones de Similares',
+            },
+        ),
+    ]
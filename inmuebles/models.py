@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from core.models import Usuario
-from firebase_admin import firestore
 from django.utils import timezone
+from .utils import normalizar_texto
 
 
 class Inmueble(models.Model):
@@ -39,7 +40,11 @@ class Inmueble(models.Model):
     direccion = models.CharField(max_length=255)
     ciudad = models.CharField(max_length=100)
     barrio = models.CharField(max_length=100)
+    ciudad_normalizada = models.CharField(max_length=100, editable=False, default='')
     codigo_postal = models.CharField(max_length=10, blank=True)
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    geocelda = models.CharField(max_length=12, blank=True, editable=False, db_index=True, help_text="Geohash de la ubicación")
     
     # Características
     area = models.DecimalField(max_digits=10, decimal_places=2, help_text="Área en m²")
@@ -68,14 +73,67 @@ class Inmueble(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
     
+    # Imagen principal desnormalizada (mantenida por ImagenInmueble.save/delete)
+    imagen_principal = models.ForeignKey(
+        'ImagenInmueble',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
+    
+    # Índice de texto completo (tsvector en PostgreSQL; en SQLite se usa una tabla FTS5)
+    vector_busqueda = SearchVectorField(null=True, editable=False)
+    
+    # Versión para la caché de fragmentos (se incrementa con cada cambio del inmueble,
+    # sus imágenes o sus características)
+    version_cache = models.PositiveIntegerField(default=1, editable=False)
+    
     class Meta:
         verbose_name = 'Inmueble'
         verbose_name_plural = 'Inmuebles'
         ordering = ['-fecha_registro']
+        indexes = [
+            models.Index(fields=['activo', 'estado', 'categoria', 'ciudad_normalizada', 'precio_arriendo']),
+        ]
     
     def __str__(self):
         return f"{self.titulo} - {self.get_categoria_display()}"
     
+    def save(self, *args, **kwargs):
+        from .mercado import CAMPOS_MERCADO, actualizar_indice_mercado
+        
+        # Ciudad normalizada para búsquedas exactas sobre el índice
+        self.ciudad_normalizada = normalizar_texto(self.ciudad)
+        # Celda geográfica para búsquedas por radio y caja
+        if self.latitud is not None and self.longitud is not None:
+            from .geo import codificar_geohash
+            self.geocelda = codificar_geohash(self.latitud, self.longitud)
+        else:
+            self.geocelda = ''
+        # Invalidar los fragmentos cacheados de la versión anterior
+        actualizando = not self._state.adding
+        if actualizando:
+            self.version_cache = models.F('version_cache') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version_cache'}
+        
+        with transaction.atomic():
+            # Valores guardados de la fila, bloqueada hasta el final de la transacción:
+            # con ediciones concurrentes cada una aplica su diferencia sobre la anterior
+            anterior = None
+            if actualizando:
+                anterior = Inmueble.objects.select_for_update().filter(pk=self.pk).values(*CAMPOS_MERCADO).first()
+            super().save(*args, **kwargs)
+            # Índice de precios de mercado: se resta el aporte anterior y se suma el nuevo
+            actualizar_indice_mercado(self, anterior)
+        if actualizando:
+            self.refresh_from_db(fields=['version_cache'])
+        
+        from .busqueda import indexar_texto
+        indexar_texto(self)
+    
     def get_precio_total(self):
         """Retorna el precio total incluyendo administración"""
         return self.precio_arriendo + self.precio_administracion
@@ -89,35 +147,48 @@ class Inmueble(models.Model):
         return self.imagenes.all()
     
     def get_imagen_principal(self):
-        """Retorna la imagen principal del inmueble"""
-        return self.imagenes.filter(principal=True).first() or self.imagenes.first()
+        """Retorna la imagen principal del inmueble (usar select_related('imagen_principal') en listados)"""
+        return self.imagen_principal
+    
+    def actualizar_imagen_principal(self):
+        """Recalcula la imagen principal desnormalizada: la marcada como principal o la primera"""
+        imagen = self.imagenes.filter(principal=True).first() or self.imagenes.first()
+        Inmueble.objects.filter(pk=self.pk).update(
+            imagen_principal=imagen,
+            version_cache=models.F('version_cache') + 1
+        )
+        self.imagen_principal = imagen
+    
+    def invalidar_cache(self):
+        """Incrementa la versión de caché sin pasar por save()"""
+        Inmueble.objects.filter(pk=self.pk).update(version_cache=models.F('version_cache') + 1)
+    
+    FIREBASE_COLECCION = 'inmuebles'
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'titulo': self.titulo,
+            'descripcion': self.descripcion,
+            'categoria': self.categoria,
+            'estado': self.estado,
+            'direccion': self.direccion,
+            'ciudad': self.ciudad,
+            'barrio': self.barrio,
+            'area': float(self.area),
+            'habitaciones': self.habitaciones,
+            'banos': self.banos,
+            'precio_arriendo': float(self.precio_arriendo),
+            'precio_administracion': float(self.precio_administracion),
+            'propietario_id': self.propietario_id,
+            'fecha_registro': self.fecha_registro,
+            'activo': self.activo
+        }
     
     def save_to_firebase(self):
-        """Guarda el inmueble en Firebase"""
-        try:
-            db = firestore.client()
-            inmueble_ref = db.collection('inmuebles').document(str(self.id))
-            inmueble_ref.set({
-                'titulo': self.titulo,
-                'descripcion': self.descripcion,
-                'categoria': self.categoria,
-                'estado': self.estado,
-                'direccion': self.direccion,
-                'ciudad': self.ciudad,
-                'barrio': self.barrio,
-                'area': float(self.area),
-                'habitaciones': self.habitaciones,
-                'banos': self.banos,
-                'precio_arriendo': float(self.precio_arriendo),
-                'precio_administracion': float(self.precio_administracion),
-                'propietario_id': self.propietario.id,
-                'fecha_registro': self.fecha_registro,
-                'activo': self.activo
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica del inmueble en Firebase (ver core.firebase_sync)"""
+        from core.firebase_sync import encolar
+        return encolar(self)
 
 
 class ImagenInmueble(models.Model):
@@ -135,6 +206,10 @@ class ImagenInmueble(models.Model):
     orden = models.IntegerField(default=0)
     fecha_subida = models.DateTimeField(auto_now_add=True)
     
+    # Derivados generados por inmuebles.imagenes ({nombre: {ancho, alto, webp, jpg}})
+    derivados = models.JSONField(default=dict, blank=True, editable=False)
+    procesada = models.BooleanField(default=False, editable=False)
+    
     class Meta:
         verbose_name = 'Imagen de Inmueble'
         verbose_name_plural = 'Imágenes de Inmuebles'
@@ -150,7 +225,54 @@ class ImagenInmueble(models.Model):
                 inmueble=self.inmueble,
                 principal=True
             ).update(principal=False)
+        # Un archivo nuevo invalida los derivados anteriores
+        archivo_nuevo = self._state.adding or not self.imagen._committed
+        if archivo_nuevo:
+            self.derivados = {}
+            self.procesada = False
         super().save(*args, **kwargs)
+        
+        if archivo_nuevo:
+            from .imagenes import encolar_procesamiento
+            encolar_procesamiento(self.pk)
+        
+        # Mantener la imagen principal desnormalizada en el inmueble
+        inmueble = self.inmueble
+        if self.principal or inmueble.imagen_principal_id is None:
+            Inmueble.objects.filter(pk=inmueble.pk).update(
+                imagen_principal=self,
+                version_cache=models.F('version_cache') + 1
+            )
+            inmueble.imagen_principal = self
+        elif inmueble.imagen_principal_id == self.pk:
+            inmueble.actualizar_imagen_principal()
+        else:
+            inmueble.invalidar_cache()
+    
+    def get_url(self, nombre='completa', formato='jpg'):
+        """URL del derivado indicado, o de la imagen original si aún no se ha procesado"""
+        derivado = self.derivados.get(nombre)
+        if derivado and derivado.get(formato):
+            return derivado[formato]
+        return self.imagen.url
+    
+    def get_srcset(self, formato='jpg'):
+        """Valor del atributo srcset con todos los derivados del formato indicado"""
+        return ', '.join(
+            f"{derivado[formato]} {derivado['ancho']}w"
+            for derivado in self.derivados.values()
+            if derivado.get(formato)
+        )
+    
+    def delete(self, *args, **kwargs):
+        inmueble = self.inmueble
+        era_principal = inmueble.imagen_principal_id == self.pk
+        resultado = super().delete(*args, **kwargs)
+        if era_principal:
+            inmueble.actualizar_imagen_principal()
+        else:
+            inmueble.invalidar_cache()
+        return resultado
 
 
 class CaracteristicaAdicional(models.Model):
@@ -172,3 +294,104 @@ class CaracteristicaAdicional(models.Model):
     
     def __str__(self):
         return f"{self.nombre} - {self.inmueble.titulo}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Inmueble(pk=self.inmueble_id).invalidar_cache()
+    
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        Inmueble(pk=self.inmueble_id).invalidar_cache()
+        return resultado
+
+
+class InmuebleSimilar(models.Model):
+    """
+    Índice precalculado de inmuebles similares (vecinos más cercanos por características)
+    """
+    inmueble = models.ForeignKey(
+        Inmueble,
+        on_delete=models.CASCADE,
+        related_name='indice_similares'
+    )
+    similar = models.ForeignKey(
+        Inmueble,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    posicion = models.PositiveSmallIntegerField()
+    distancia = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Inmueble Similar'
+        verbose_name_plural = 'Inmuebles Similares'
+        ordering = ['inmueble', 'posicion']
+        unique_together = ['inmueble', 'posicion']
+    
+    def __str__(self):
+        return f"{self.inmueble_id} ~ {self.similar_id} ({self.distancia:.3f})"
+
+
+class ActualizacionSimilares(models.Model):
+    """
+    Cola de inmuebles cuyo índice de similares debe ponerse al día; la llenan las
+    señales de Inmueble y la vacía el comando actualizar_similares
+    """
+    inmueble = models.ForeignKey(
+        Inmueble,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    vecinos = models.BooleanField(
+        default=True,
+        help_text="Recalcular también los inmuebles que lo tendrían como vecino"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Actualización de Similares'
+        verbose_name_plural = 'Actualizaciones de Similares'
+
+
+class IndicePrecioMercado(models.Model):
+    """
+    Índice de precios de arriendo por ciudad, barrio y categoría, mantenido de
+    forma incremental (ver inmuebles/mercado.py)
+    """
+    ciudad_normalizada = models.CharField(max_length=100)
+    barrio_normalizado = models.CharField(max_length=100)
+    categoria = models.CharField(max_length=20, choices=Inmueble.CATEGORIA_CHOICES)
+    ciudad = models.CharField(max_length=100)
+    barrio = models.CharField(max_length=100)
+    cantidad = models.IntegerField(default=0)
+    suma_precio = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    suma_precio_m2 = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sketch_precio = models.JSONField(default=dict, blank=True)
+    sketch_precio_m2 = models.JSONField(default=dict, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Índice de Precio de Mercado'
+        verbose_name_plural = 'Índices de Precios de Mercado'
+        unique_together = ['ciudad_normalizada', 'barrio_normalizado', 'categoria']
+    
+    def __str__(self):
+        return f"{self.barrio}, {self.ciudad} - {self.get_categoria_display()} ({self.cantidad})"
+    
+    def get_precio_promedio(self):
+        """Precio de arriendo promedio del grupo"""
+        return self.suma_precio / self.cantidad if self.cantidad else None
+    
+    def get_precio_m2_promedio(self):
+        """Precio promedio por m² del grupo"""
+        return self.suma_precio_m2 / self.cantidad if self.cantidad else None
+    
+    def get_mediana_precio(self):
+        """Mediana estimada del precio de arriendo (error relativo de 1%)"""
+        from .mercado import cuantil
+        return cuantil(self.sketch_precio, 0.5)
+    
+    def get_mediana_precio_m2(self):
+        """Mediana estimada del precio por m² (error relativo de 1%)"""
+        from .mercado import cuantil
+        return cuantil(self.sketch_precio_m2, 0.5)
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .busqueda import retirar_texto
+from .models import Inmueble, InmuebleSimilar
+from .mercado import CAMPOS_MERCADO, retirar_del_indice
+from .similitud import CAMPOS_SIMILITUD, encolar_similares
+
+
+@receiver(post_save, sender=Inmueble)
+def actualizar_indice_similares(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Encolar la actualización de los vecinos cuando se crea o modifica un inmueble"""
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_SIMILITUD & set(update_fields):
+        return
+    # El cálculo lo hace el comando actualizar_similares, fuera de la petición
+    encolar_similares([instance.pk])
+
+
+@receiver(pre_delete, sender=Inmueble)
+def liberar_indice_similares(sender, instance, **kwargs):
+    """Encolar los inmuebles que tenían como vecino al inmueble eliminado"""
+    afectados = list(
+        InmuebleSimilar.objects.filter(similar=instance).exclude(inmueble=instance).values_list('inmueble_id', flat=True)
+    )
+    if afectados:
+        encolar_similares(afectados, vecinos=False)
+
+
+@receiver(pre_delete, sender=Inmueble)
+def leer_inmueble_eliminado(sender, instance, **kwargs):
+    """Valores guardados del inmueble (no los de la instancia) bloqueando la fila hasta que se elimine"""
+    instance._valores_eliminados = (
+        Inmueble.objects.select_for_update().filter(pk=instance.pk).values(*CAMPOS_MERCADO).first()
+    )
+
+
+@receiver(post_delete, sender=Inmueble)
+def retirar_indice_mercado(sender, instance, **kwargs):
+    """Quitar el aporte del inmueble eliminado del índice de precios de mercado"""
+    retirar_del_indice(instance, getattr(instance, '_valores_eliminados', None))
+
+
+@receiver(post_delete, sender=Inmueble)
+def retirar_indice_texto(sender, instance, **kwargs):
+    """Quitar el inmueble eliminado del índice de texto completo"""
+    retirar_texto(instance.pk)
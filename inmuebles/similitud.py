@@ -0,0 +1,224 @@
+"""
+Índice de inmuebles similares.
+
+Cada inmueble publicado se representa con un vector numérico (precio, área,
+habitaciones, baños, parqueaderos, amoblado, mascotas) más su barrio, y se
+guardan sus K vecinos más cercanos dentro de la misma ciudad y categoría en
+InmuebleSimilar. Las escalas de cada característica son fijas, de modo que al
+cambiar un inmueble basta con recalcular los inmuebles cuyo top-K puede verse
+afectado en lugar de reconstruir todo el índice.
+
+Las señales de Inmueble solo encolan los cambios en ActualizacionSimilares y el
+comando actualizar_similares los procesa por lotes, fuera de las peticiones.
+"""
+import math
+import numpy as np
+from django.db import transaction
+from .busqueda import inmuebles_publicados
+from .models import ActualizacionSimilares, Inmueble, InmuebleSimilar
+from .utils import normalizar_texto
+
+K_SIMILARES = 8
+TAMANO_BLOQUE = 512
+# Tope de celdas de cada matriz de distancias (consultas x partición): ~16 MB en float64
+MAX_CELDAS_BLOQUE = 2_000_000
+
+# Una unidad de distancia equivale aproximadamente a un 25% de diferencia en precio,
+# un 30% en área o una habitación/baño/parqueadero de diferencia
+ESCALA_PRECIO = 0.25
+ESCALA_AREA = 0.30
+PESO_AMOBLADO = 0.5
+PESO_MASCOTAS = 0.5
+PESO_BARRIO = 1.0
+
+CAMPOS_VECTOR = [
+    'id', 'precio_arriendo', 'area', 'habitaciones', 'banos',
+    'parqueaderos', 'amoblado', 'mascotas_permitidas', 'barrio',
+]
+
+# Campos de Inmueble que afectan al índice (características, partición o publicación)
+CAMPOS_SIMILITUD = set(CAMPOS_VECTOR[1:]) | {'ciudad', 'categoria', 'estado', 'activo'}
+
+
+def _vectorizar(filas):
+    """Convierte filas de values_list(*CAMPOS_VECTOR) en (ids, matriz, barrios)"""
+    ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+    matriz = np.array([
+        [
+            math.log(max(float(precio), 1.0)) / ESCALA_PRECIO,
+            math.log(max(float(area), 1.0)) / ESCALA_AREA,
+            habitaciones,
+            banos,
+            parqueaderos,
+            PESO_AMOBLADO if amoblado else 0.0,
+            PESO_MASCOTAS if mascotas else 0.0,
+        ]
+        for _, precio, area, habitaciones, banos, parqueaderos, amoblado, mascotas, _ in filas
+    ], dtype=float).reshape(len(filas), 7)
+    barrios = np.array([normalizar_texto(fila[-1]) for fila in filas], dtype=str)
+    return ids, matriz, barrios
+
+
+def _cargar_particion(ciudad_normalizada, categoria):
+    """Vectores de los inmuebles publicados de una ciudad y categoría, ordenados por id"""
+    filas = list(
+        inmuebles_publicados()
+        .filter(ciudad_normalizada=ciudad_normalizada, categoria=categoria)
+        .order_by('id')
+        .values_list(*CAMPOS_VECTOR)
+    )
+    return _vectorizar(filas)
+
+
+def _bloques(consulta, tamano_particion):
+    """
+    Parte los vectores de consulta en bloques cuya matriz de distancias contra la
+    partición no supere MAX_CELDAS_BLOQUE (menos filas por bloque en particiones grandes)
+    """
+    filas = max(1, min(TAMANO_BLOQUE, MAX_CELDAS_BLOQUE // max(tamano_particion, 1)))
+    for inicio in range(0, len(consulta[0]), filas):
+        yield tuple(parte[inicio:inicio + filas] for parte in consulta)
+
+
+def _distancias(particion, consulta):
+    """Matriz de distancias entre los vectores de consulta y los de la partición"""
+    ids, matriz, barrios = particion
+    ids_consulta, vectores, barrios_consulta = consulta
+    cuadrados = (matriz ** 2).sum(axis=1)
+    distancias = (vectores ** 2).sum(axis=1)[:, None] + cuadrados[None, :] - 2 * vectores @ matriz.T
+    distancias += PESO_BARRIO ** 2 * (barrios_consulta[:, None] != barrios[None, :])
+    np.maximum(distancias, 0.0, out=distancias)
+    # Un inmueble no es similar a sí mismo
+    distancias[ids_consulta[:, None] == ids[None, :]] = np.inf
+    return np.sqrt(distancias)
+
+
+def _vecinos(particion, consulta):
+    """Top-K vecinos de cada vector de consulta: {id: [(id_similar, distancia), ...]}"""
+    ids = particion[0]
+    resultado = {}
+    k = min(K_SIMILARES, len(ids))
+    for bloque in _bloques(consulta, len(ids)):
+        distancias = _distancias(particion, bloque)
+        if k:
+            candidatos = np.argpartition(distancias, k - 1, axis=1)[:, :k]
+        for fila, inmueble_id in enumerate(bloque[0]):
+            vecinos = []
+            if k:
+                orden = candidatos[fila][np.argsort(distancias[fila, candidatos[fila]], kind='stable')]
+                vecinos = [
+                    (int(ids[j]), float(distancias[fila, j]))
+                    for j in orden if np.isfinite(distancias[fila, j])
+                ]
+            resultado[int(inmueble_id)] = vecinos
+    return resultado
+
+
+def _guardar(vecinos):
+    """Reemplaza las filas del índice de los inmuebles dados"""
+    with transaction.atomic():
+        InmuebleSimilar.objects.filter(inmueble_id__in=list(vecinos)).delete()
+        InmuebleSimilar.objects.bulk_create([
+            InmuebleSimilar(inmueble_id=inmueble_id, similar_id=similar_id, posicion=posicion, distancia=distancia)
+            for inmueble_id, lista in vecinos.items()
+            for posicion, (similar_id, distancia) in enumerate(lista)
+        ], batch_size=1000)
+
+
+def recalcular_similares(ids):
+    """Recalcula el top-K de los inmuebles dados agrupándolos por ciudad y categoría"""
+    grupos = {}
+    for fila in Inmueble.objects.filter(id__in=list(ids)).values_list('ciudad_normalizada', 'categoria', *CAMPOS_VECTOR):
+        grupos.setdefault(fila[:2], []).append(fila[2:])
+
+    vecinos = {inmueble_id: [] for inmueble_id in ids}
+    for (ciudad_normalizada, categoria), filas in grupos.items():
+        vecinos.update(_vecinos(_cargar_particion(ciudad_normalizada, categoria), _vectorizar(filas)))
+    _guardar(vecinos)
+    return len(vecinos)
+
+
+def _afectados(ids):
+    """
+    Inmuebles cuyo top-K puede cambiar al crear o modificar los inmuebles dados: ellos
+    mismos, los que los tenían como vecino y los publicados que ahora los tendrían en
+    su top-K (los no publicados se ponen al día con reconstruir_similares).
+    """
+    ids = set(ids)
+    afectados = set(InmuebleSimilar.objects.filter(similar_id__in=ids).values_list('inmueble_id', flat=True))
+    afectados.update(ids)
+
+    grupos = {}
+    for fila in inmuebles_publicados().filter(pk__in=ids).values_list('ciudad_normalizada', 'categoria', *CAMPOS_VECTOR):
+        grupos.setdefault(fila[:2], []).append(fila[2:])
+
+    for (ciudad_normalizada, categoria), filas in grupos.items():
+        particion = _cargar_particion(ciudad_normalizada, categoria)
+        # Distancia del K-ésimo vecino actual de cada inmueble (infinito si tiene menos de K)
+        umbrales = dict(
+            InmuebleSimilar.objects.filter(
+                inmueble__ciudad_normalizada=ciudad_normalizada,
+                inmueble__categoria=categoria,
+                posicion=K_SIMILARES - 1,
+            ).values_list('inmueble_id', 'distancia')
+        )
+        umbral = np.array([umbrales.get(int(i), np.inf) for i in particion[0]])
+        consulta = _vectorizar(filas)
+        for bloque in _bloques(consulta, len(particion[0])):
+            cerca = (_distancias(particion, bloque) <= umbral + 1e-9).any(axis=0)
+            afectados.update(int(i) for i in particion[0][cerca])
+    return afectados
+
+
+def actualizar_similares(ids):
+    """Actualiza el índice tras crear o modificar los inmuebles dados"""
+    return recalcular_similares(_afectados(ids))
+
+
+def encolar_similares(ids, vecinos=True):
+    """
+    Encola los inmuebles cuyo índice debe ponerse al día. Con vecinos=False solo se
+    recalcula su propio top-K (p. ej. porque se eliminó uno de sus vecinos), sin
+    buscar a quién más afecta el cambio.
+    """
+    ActualizacionSimilares.objects.bulk_create([
+        ActualizacionSimilares(inmueble_id=inmueble_id, vecinos=vecinos) for inmueble_id in ids
+    ])
+
+
+def procesar_pendientes(limite=TAMANO_BLOQUE):
+    """
+    Pone al día el índice de las filas más antiguas de la cola y las elimina. Las
+    filas encoladas mientras tanto se conservan para la siguiente pasada aunque sean
+    del mismo inmueble. Retorna la cantidad de filas procesadas.
+    """
+    filas = list(ActualizacionSimilares.objects.order_by('id').values_list('id', 'inmueble_id', 'vecinos')[:limite])
+    if not filas:
+        return 0
+
+    afectados = _afectados({inmueble_id for _, inmueble_id, vecinos in filas if vecinos})
+    afectados.update(inmueble_id for _, inmueble_id, vecinos in filas if not vecinos)
+    recalcular_similares(afectados)
+    ActualizacionSimilares.objects.filter(id__in=[fila[0] for fila in filas]).delete()
+    return len(filas)
+
+
+def reconstruir_indice():
+    """Reconstruye el índice completo, partición por partición"""
+    total = 0
+    particiones = inmuebles_publicados().order_by().values_list('ciudad_normalizada', 'categoria').distinct()
+    for ciudad_normalizada, categoria in particiones:
+        particion = _cargar_particion(ciudad_normalizada, categoria)
+        for inicio in range(0, len(particion[0]), TAMANO_BLOQUE):
+            bloque = tuple(parte[inicio:inicio + TAMANO_BLOQUE] for parte in particion)
+            vecinos = _vecinos(particion, bloque)
+            _guardar(vecinos)
+            total += len(vecinos)
+
+    # Los inmuebles no publicados (p. ej. arrendados) también muestran similares disponibles
+    no_publicados = list(
+        Inmueble.objects.exclude(id__in=inmuebles_publicados().values('id')).order_by('id').values_list('id', flat=True)
+    )
+    for inicio in range(0, len(no_publicados), TAMANO_BLOQUE):
+        total += recalcular_similares(no_publicados[inicio:inicio + TAMANO_BLOQUE])
+    return total
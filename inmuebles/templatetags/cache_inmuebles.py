@@ -0,0 +1,68 @@
+"""
+Caché de fragmentos versionada por inmueble.
+
+Uso:
+    {% load cache_inmuebles %}
+    {% cache_inmueble 'tarjeta' inmueble %} ... {% endcache_inmueble %}
+
+La clave incluye el id y la version_cache del inmueble, por lo que cualquier
+cambio (Inmueble.save, imágenes, características) deja obsoleta la entrada
+anterior sin tener que borrarla. Se pueden pasar variantes adicionales que
+también forman parte de la clave (p. ej. si el usuario es el propietario).
+"""
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from core import metricas
+
+register = template.Library()
+
+ALIAS_CACHE = 'fragmentos'
+TIMEOUT_FRAGMENTOS = 60 * 60 * 24
+
+
+def _cache():
+    try:
+        return caches[ALIAS_CACHE]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+class CacheInmuebleNode(template.Node):
+    def __init__(self, nodelist, nombre, inmueble, variantes):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.inmueble = inmueble
+        self.variantes = variantes
+
+    def render(self, context):
+        nombre = self.nombre.resolve(context)
+        inmueble = self.inmueble.resolve(context)
+        variantes = ':'.join(str(variante.resolve(context)) for variante in self.variantes)
+        clave = f'fragmento:{nombre}:{inmueble.pk}:{inmueble.version_cache}:{variantes}'
+
+        cache = _cache()
+        contenido = cache.get(clave)
+        if contenido is not None:
+            metricas.incrementar(f'fragmentos.{nombre}.aciertos')
+            return contenido
+
+        metricas.incrementar(f'fragmentos.{nombre}.fallos')
+        contenido = self.nodelist.render(context)
+        cache.set(clave, contenido, TIMEOUT_FRAGMENTOS)
+        return contenido
+
+
+@register.tag('cache_inmueble')
+def cache_inmueble(parser, token):
+    """{% cache_inmueble nombre inmueble [variante ...] %} ... {% endcache_inmueble %}"""
+    partes = token.split_contents()
+    if len(partes) < 3:
+        raise template.TemplateSyntaxError(f"'{partes[0]}' requiere un nombre y un inmueble.")
+    nodelist = parser.parse(('endcache_inmueble',))
+    parser.delete_first_token()
+    return CacheInmuebleNode(
+        nodelist,
+        parser.compile_filter(partes[1]),
+        parser.compile_filter(partes[2]),
+        [parser.compile_filter(parte) for parte in partes[3:]],
+    )
@@ -0,0 +1,40 @@
+"""
+Helpers de plantilla para las imágenes responsivas de inmuebles.
+
+Uso:
+    {% load imagenes_inmuebles %}
+    {% imagen_responsiva imagen 'tarjeta' sizes='(min-width: 768px) 33vw, 100vw' class='card-img-top' %}
+    <img srcset="{{ imagen|srcset:'webp' }}">
+"""
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.filter
+def srcset(imagen, formato='jpg'):
+    """srcset con los derivados de la imagen en el formato indicado"""
+    if not imagen:
+        return ''
+    return imagen.get_srcset(formato)
+
+
+@register.simple_tag
+def imagen_responsiva(imagen, nombre='completa', sizes='100vw', **atributos):
+    """<picture> con fuente WebP y respaldo JPEG; usa la original si aún no hay derivados"""
+    atributos.setdefault('loading', 'lazy')
+    derivado = imagen.derivados.get(nombre)
+    if not derivado:
+        return format_html('<img src="{}"{}>', imagen.imagen.url, flatatt(atributos))
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}>'
+        '</picture>',
+        imagen.get_srcset('webp'), sizes,
+        derivado['jpg'], imagen.get_srcset('jpg'), sizes,
+        derivado['ancho'], derivado['alto'], flatatt(atributos),
+    )
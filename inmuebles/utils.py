@@ -0,0 +1,10 @@
+import unicodedata
+
+
+def normalizar_texto(valor):
+    """Normaliza texto para búsquedas: sin tildes, en minúsculas y sin espacios extra"""
+    if not valor:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(valor))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
@@ -1,76 +1,73 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 from django.core.paginator import Paginator
+from core.paginacion import paginar
 from .models import Inmueble, ImagenInmueble
-from .forms import InmuebleForm, ImagenInmuebleForm, BusquedaInmuebleForm
+from .forms import InmuebleForm, ImagenInmuebleForm, ImagenesMultiplesForm, BusquedaInmuebleForm
+from .busqueda import filtrar_inmuebles, inmuebles_publicados, calcular_facetas
+from .imagenes import siguiente_orden, subir_imagenes
+from .mercado import consultar_indice
 
 
 def listar_inmuebles(request):
     """Vista para listar inmuebles con búsqueda y filtros"""
-    inmuebles = Inmueble.objects.filter(activo=True, estado='disponible')
     form = BusquedaInmuebleForm(request.GET)
     
-    # Aplicar filtros
+    # Aplicar filtros sobre el índice de búsqueda
     if form.is_valid():
-        categoria = form.cleaned_data.get('categoria')
-        ciudad = form.cleaned_data.get('ciudad')
-        precio_min = form.cleaned_data.get('precio_min')
-        precio_max = form.cleaned_data.get('precio_max')
-        habitaciones = form.cleaned_data.get('habitaciones')
-        banos = form.cleaned_data.get('banos')
-        amoblado = form.cleaned_data.get('amoblado')
-        mascotas = form.cleaned_data.get('mascotas_permitidas')
-        
-        if categoria:
-            inmuebles = inmuebles.filter(categoria=categoria)
-        if ciudad:
-            inmuebles = inmuebles.filter(ciudad__icontains=ciudad)
-        if precio_min:
-            inmuebles = inmuebles.filter(precio_arriendo__gte=precio_min)
-        if precio_max:
-            inmuebles = inmuebles.filter(precio_arriendo__lte=precio_max)
-        if habitaciones:
-            inmuebles = inmuebles.filter(habitaciones__gte=habitaciones)
-        if banos:
-            inmuebles = inmuebles.filter(banos__gte=banos)
-        if amoblado:
-            inmuebles = inmuebles.filter(amoblado=True)
-        if mascotas:
-            inmuebles = inmuebles.filter(mascotas_permitidas=True)
-    
-    # Paginación
-    paginator = Paginator(inmuebles, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        inmuebles = filtrar_inmuebles(form.cleaned_data)
+    else:
+        inmuebles = inmuebles_publicados()
+    
+    # Conteos por faceta en una sola consulta agrupada
+    facetas = calcular_facetas(inmuebles, request.GET)
+    form.aplicar_facetas(facetas)
+    
+    # Paginación por cursor (imagen principal en el mismo JOIN)
+    page_obj = paginar(request, inmuebles.select_related('imagen_principal'), 12)
     
     context = {
         'inmuebles': page_obj,
         'form': form,
+        'facetas': facetas,
     }
     return render(request, 'inmuebles/listar.html', context)
 
 
 def detalle_inmueble(request, inmueble_id):
     """Vista para ver detalles de un inmueble"""
-    inmueble = get_object_or_404(Inmueble, id=inmueble_id, activo=True)
+    inmueble = get_object_or_404(Inmueble.objects.select_related('imagen_principal'), id=inmueble_id, activo=True)
     imagenes = inmueble.get_imagenes()
     caracteristicas = inmueble.caracteristicas.all()
     
-    # Inmuebles similares
-    similares = Inmueble.objects.filter(
-        categoria=inmueble.categoria,
-        ciudad=inmueble.ciudad,
-        estado='disponible',
-        activo=True
-    ).exclude(id=inmueble.id)[:4]
+    # Inmuebles similares (índice precalculado, ver inmuebles/similitud.py)
+    similares = [
+        fila.similar for fila in inmueble.indice_similares.filter(
+            similar__estado='disponible',
+            similar__activo=True
+        ).select_related('similar__imagen_principal')[:4]
+    ]
+    
+    # Referencia de precios del barrio (una consulta por la llave única del índice)
+    mercado = consultar_indice(inmueble.ciudad, inmueble.barrio, inmueble.categoria)
+    
+    # Variante de los fragmentos cacheados (sin consultar el propietario)
+    es_propietario = (
+        request.user.is_authenticated
+        and request.user.tipo_usuario == 'propietario'
+        and request.user.pk == inmueble.propietario_id
+    )
     
     context = {
         'inmueble': inmueble,
         'imagenes': imagenes,
         'caracteristicas': caracteristicas,
         'similares': similares,
+        'es_propietario': es_propietario,
+        'mercado': mercado,
     }
     return render(request, 'inmuebles/detalle.html', context)
 
@@ -82,7 +79,7 @@ def mis_inmuebles(request):
         messages.error(request, 'No tienes permisos para acceder a esta página.')
         return redirect('core:dashboard')
     
-    inmuebles = Inmueble.objects.filter(propietario=request.user)
+    inmuebles = Inmueble.objects.filter(propietario=request.user).select_related('imagen_principal')
     
     # Filtrar por estado si se proporciona
     estado = request.GET.get('estado')
@@ -117,13 +114,10 @@ def crear_inmueble(request):
             try:
                 inmueble = form.save(commit=False)
                 inmueble.propietario = request.user
-                inmueble.save()
-                print(f"Inmueble guardado con ID: {inmueble.id}")
-                try:
+                with transaction.atomic():
+                    inmueble.save()
                     inmueble.save_to_firebase()
-                    print("Firebase guardado exitosamente")
-                except Exception as e:
-                    print(f"Error al guardar en Firebase: {e}")
+                print(f"Inmueble guardado con ID: {inmueble.id}")
                 messages.success(request, 'Inmueble creado exitosamente.')
                 return redirect('inmuebles:agregar_imagenes', inmueble_id=inmueble.id)
             except Exception as e:
@@ -148,8 +142,9 @@ def editar_inmueble(request, inmueble_id):
     if request.method == 'POST':
         form = InmuebleForm(request.POST, instance=inmueble)
         if form.is_valid():
-            inmueble = form.save()
-            inmueble.save_to_firebase()
+            with transaction.atomic():
+                inmueble = form.save()
+                inmueble.save_to_firebase()
             messages.success(request, 'Inmueble actualizado exitosamente.')
             return redirect('inmuebles:detalle', inmueble_id=inmueble.id)
     else:
@@ -178,27 +173,43 @@ def eliminar_inmueble(request, inmueble_id):
 
 @login_required
 def agregar_imagenes(request, inmueble_id):
-    """Vista para agregar imágenes a un inmueble"""
+    """Vista para agregar imágenes a un inmueble (una con descripción o varias a la vez)"""
     inmueble = get_object_or_404(Inmueble, id=inmueble_id, propietario=request.user)
+    form = ImagenInmuebleForm()
+    form_multiple = ImagenesMultiplesForm()
+    
+    if request.method == 'POST' and request.POST.get('modo') == 'multiple':
+        form_multiple = ImagenesMultiplesForm(request.POST, request.FILES)
+        if form_multiple.is_valid():
+            creadas, errores = subir_imagenes(
+                inmueble,
+                form_multiple.cleaned_data['imagenes'],
+                descripcion=form_multiple.cleaned_data['descripcion']
+            )
+            errores = form_multiple.errores_archivos + errores
+            if creadas:
+                messages.success(request, f'{len(creadas)} imágenes agregadas exitosamente.')
+            for nombre, error in errores:
+                messages.warning(request, f'{nombre}: {error}')
+            return redirect('inmuebles:agregar_imagenes', inmueble_id=inmueble.id)
+        for nombre, error in form_multiple.errores_archivos:
+            messages.warning(request, f'{nombre}: {error}')
     
-    if request.method == 'POST':
+    elif request.method == 'POST':
         form = ImagenInmuebleForm(request.POST, request.FILES)
         if form.is_valid():
             imagen = form.save(commit=False)
             imagen.inmueble = inmueble
-            # Auto-incrementar orden
-            ultimo_orden = inmueble.imagenes.count()
-            imagen.orden = ultimo_orden
+            imagen.orden = siguiente_orden(inmueble)
             imagen.save()
             messages.success(request, 'Imagen agregada exitosamente.')
             return redirect('inmuebles:agregar_imagenes', inmueble_id=inmueble.id)
-    else:
-        form = ImagenInmuebleForm()
     
     imagenes = inmueble.get_imagenes()
     
     return render(request, 'inmuebles/agregar_imagenes.html', {
         'form': form,
+        'form_multiple': form_multiple,
         'inmueble': inmueble,
         'imagenes': imagenes
     })
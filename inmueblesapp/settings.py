@@ -137,6 +137,26 @@ else:
 
 # Firebase Configuration
 FIREBASE_CREDENTIALS_PATH = config('FIREBASE_CREDENTIALS_PATH', default='firebase-credentials.json')
+# Backend de la réplica: 'firestore', 'noop' (sin réplica), 'memoria' (pruebas)
+# o la ruta de una clase/función que retorne un cliente compatible
+FIREBASE_BACKEND = config('FIREBASE_BACKEND', default='firestore')
+# Plazo máximo (segundos) de cada llamada a Firestore y circuit breaker:
+# tras FIREBASE_CIRCUITO_FALLOS fallos seguidos no se llama durante FIREBASE_CIRCUITO_ESPERA segundos
+FIREBASE_TIMEOUT = config('FIREBASE_TIMEOUT', default=10, cast=float)
+FIREBASE_CIRCUITO_FALLOS = config('FIREBASE_CIRCUITO_FALLOS', default=5, cast=int)
+FIREBASE_CIRCUITO_ESPERA = config('FIREBASE_CIRCUITO_ESPERA', default=30, cast=float)
+
+# Procesos que renderizan los PDF del lote mensual de cuentas de cobro
+CUENTAS_COBRO_WORKERS = config('CUENTAS_COBRO_WORKERS', default=4, cast=int)
+# Caché en disco de los PDF de cuentas de cobro (fuera de MEDIA_ROOT) y su tamaño máximo en bytes
+CUENTAS_COBRO_CACHE_DIR = config('CUENTAS_COBRO_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'cuentas_cobro'))
+CUENTAS_COBRO_CACHE_BYTES = config('CUENTAS_COBRO_CACHE_BYTES', default=200 * 1024 * 1024, cast=int)
+
+# Derivados de imágenes: si se generan en hilos del proceso web (si no, solo con
+# el comando procesar_imagenes), hilos de ese pool e hilos para subir archivos al storage
+IMAGENES_EN_PROCESO = config('IMAGENES_EN_PROCESO', default=True, cast=bool)
+IMAGENES_WORKERS = config('IMAGENES_WORKERS', default=2, cast=int)
+IMAGENES_WORKERS_SUBIDA = config('IMAGENES_WORKERS_SUBIDA', default=4, cast=int)
 
 
 # Password validation
@@ -239,6 +259,13 @@ else:
         }
     }
 
+# Caché de fragmentos HTML de inmuebles (en memoria del proceso: un acierto no consulta la base de datos)
+CACHES['fragmentos'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fragmentos-inmuebles',
+    'OPTIONS': {'MAX_ENTRIES': 5000},
+}
+
 # Usar la caché por defecto para django-ratelimit
 RATELIMIT_USE_CACHE = 'default'
 
@@ -2,7 +2,7 @@ from django.db import models
 from core.models import Usuario
 from inmuebles.models import Inmueble
 from django.utils import timezone
-from firebase_admin import firestore
+from core.secuencias import asignar_numeros
 
 
 class Mantenimiento(models.Model):
@@ -106,12 +106,18 @@ class Mantenimiento(models.Model):
     def __str__(self):
         return f"{self.numero_ticket} - {self.titulo}"
     
+    PREFIJO_NUMERO = 'MNT'
+    DIGITOS_NUMERO = 5
+    
+    @classmethod
+    def numerar(cls, instancias):
+        """Asigna numero_ticket a las instancias que no lo tienen (una sola reserva)"""
+        asignar_numeros(instancias, 'numero_ticket', cls.PREFIJO_NUMERO, cls.DIGITOS_NUMERO)
+    
     def save(self, *args, **kwargs):
         # Generar número de ticket automáticamente
         if not self.numero_ticket:
-            ultimo = Mantenimiento.objects.order_by('-id').first()
-            numero = 1 if not ultimo else ultimo.id + 1
-            self.numero_ticket = f"MNT-{timezone.now().year}-{numero:05d}"
+            Mantenimiento.numerar([self])
         
         super().save(*args, **kwargs)
     
@@ -124,28 +130,28 @@ class Mantenimiento(models.Model):
         delta = timezone.now() - self.fecha_solicitud
         return delta.days
     
+    FIREBASE_COLECCION = 'mantenimientos'
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'numero_ticket': self.numero_ticket,
+            'inmueble_id': self.inmueble_id,
+            'solicitante_id': self.solicitante_id,
+            'titulo': self.titulo,
+            'descripcion': self.descripcion,
+            'tipo': self.tipo,
+            'prioridad': self.prioridad,
+            'estado': self.estado,
+            'fecha_solicitud': self.fecha_solicitud.isoformat(),
+            'costo_estimado': float(self.costo_estimado),
+            'responsable_costo': self.responsable_costo
+        }
+    
     def save_to_firebase(self):
-        """Guarda el mantenimiento en Firebase"""
-        try:
-            db = firestore.client()
-            mant_ref = db.collection('mantenimientos').document(str(self.id))
-            mant_ref.set({
-                'numero_ticket': self.numero_ticket,
-                'inmueble_id': self.inmueble.id,
-                'solicitante_id': self.solicitante.id,
-                'titulo': self.titulo,
-                'descripcion': self.descripcion,
-                'tipo': self.tipo,
-                'prioridad': self.prioridad,
-                'estado': self.estado,
-                'fecha_solicitud': self.fecha_solicitud.isoformat(),
-                'costo_estimado': float(self.costo_estimado),
-                'responsable_costo': self.responsable_costo
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica del mantenimiento en Firebase (ver core.firebase_sync)"""
+        from core.firebase_sync import encolar
+        return encolar(self)
 
 
 class SeguimientoMantenimiento(models.Model):
@@ -2,8 +2,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.utils import timezone
+from django.db import transaction
+from core.paginacion import paginar
 from .models import Mantenimiento, SeguimientoMantenimiento
 from .forms import MantenimientoForm, GestionarMantenimientoForm, SeguimientoForm, FiltrarMantenimientosForm
 from notificaciones.models import Notificacion
@@ -33,9 +34,7 @@ def listar_mantenimientos(request):
         if prioridad:
             mantenimientos = mantenimientos.filter(prioridad=prioridad)
     
-    paginator = Paginator(mantenimientos, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar(request, mantenimientos, 10)
     
     context = {
         'mantenimientos': page_obj,
@@ -78,11 +77,9 @@ def solicitar_mantenimiento(request):
                 mantenimiento = form.save(commit=False)
                 mantenimiento.solicitante = request.user
                 mantenimiento.estado = 'pendiente'
-                mantenimiento.save()
-                try:
+                with transaction.atomic():
+                    mantenimiento.save()
                     mantenimiento.save_to_firebase()
-                except Exception as e:
-                    messages.warning(request, f'Advertencia: No se pudo sincronizar con Firebase. {str(e)}')
                 # Notificar al propietario
                 Notificacion.objects.create(
                     usuario=mantenimiento.inmueble.propietario,
@@ -129,11 +126,9 @@ def gestionar_mantenimiento(request, mantenimiento_id):
                     mantenimiento_actualizado.fecha_inicio = timezone.now()
                 elif mantenimiento_actualizado.estado == 'completado' and not mantenimiento.fecha_completado:
                     mantenimiento_actualizado.fecha_completado = timezone.now()
-                mantenimiento_actualizado.save()
-                try:
+                with transaction.atomic():
+                    mantenimiento_actualizado.save()
                     mantenimiento_actualizado.save_to_firebase()
-                except Exception as e:
-                    messages.warning(request, f'Advertencia: No se pudo sincronizar con Firebase. {str(e)}')
                 # Notificar al solicitante
                 Notificacion.objects.create(
                     usuario=mantenimiento.solicitante,
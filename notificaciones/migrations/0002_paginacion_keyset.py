@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notificacion',
+            options={'ordering': ['-fecha_creacion', '-id'], 'verbose_name': 'Notificación', 'verbose_name_plural': 'Notificaciones'},
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='notificacio_usuario_200ff5_idx'),
+        ),
+    ]
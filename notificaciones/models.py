@@ -1,7 +1,47 @@
-from django.db import models
+from django.db import models, transaction
 from core.models import Usuario
 from django.utils import timezone
-from firebase_admin import firestore
+
+
+class NotificacionManager(models.Manager):
+    # Tipo de notificación -> preferencia de ConfiguracionNotificaciones que la habilita
+    PREFERENCIAS = {
+        'inmueble': 'notif_inmuebles',
+        'contrato': 'notif_contratos',
+        'pago': 'notif_pagos',
+        'mantenimiento': 'notif_mantenimientos',
+        'mensaje': 'notif_mensajes',
+    }
+
+    def notify_many(self, usuarios, titulo, mensaje, tipo='sistema', enlace='', prioridad='normal', batch_size=1000):
+        """
+        Crea la misma notificación para varios usuarios (instancias o ids) con
+        bulk_create, omitiendo a quienes desactivaron ese tipo en su
+        ConfiguracionNotificaciones (una sola consulta). La réplica en Firebase se
+        encola en la misma transacción con un insert por lote. Retorna las
+        notificaciones creadas.
+        """
+        from core.firebase_sync import encolar_nuevos
+
+        ids = list(dict.fromkeys(getattr(usuario, 'pk', usuario) for usuario in usuarios))
+        preferencia = self.PREFERENCIAS.get(tipo)
+        if preferencia and ids:
+            desactivados = set(
+                ConfiguracionNotificaciones.objects.filter(usuario_id__in=ids, **{preferencia: False})
+                .values_list('usuario_id', flat=True)
+            )
+            ids = [usuario_id for usuario_id in ids if usuario_id not in desactivados]
+        if not ids:
+            return []
+
+        nuevas = [
+            self.model(usuario_id=usuario_id, titulo=titulo, mensaje=mensaje, tipo=tipo, enlace=enlace, prioridad=prioridad)
+            for usuario_id in ids
+        ]
+        with transaction.atomic():
+            creadas = self.bulk_create(nuevas, batch_size=batch_size)
+            encolar_nuevos(creadas)
+        return creadas
 
 
 class Notificacion(models.Model):
@@ -47,13 +87,16 @@ class Notificacion(models.Model):
     ]
     prioridad = models.CharField(max_length=10, choices=PRIORIDAD_CHOICES, default='normal')
     
+    objects = NotificacionManager()
+    
     class Meta:
         verbose_name = 'Notificación'
         verbose_name_plural = 'Notificaciones'
-        ordering = ['-fecha_creacion']
+        ordering = ['-fecha_creacion', '-id']
         indexes = [
             models.Index(fields=['usuario', 'leida']),
             models.Index(fields=['-fecha_creacion']),
+            models.Index(fields=['usuario', '-fecha_creacion', '-id']),
         ]
     
     def __str__(self):
@@ -66,30 +109,31 @@ class Notificacion(models.Model):
             self.fecha_lectura = timezone.now()
             self.save()
     
+    FIREBASE_COLECCION = 'notificaciones'
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'usuario_id': self.usuario_id,
+            'titulo': self.titulo,
+            'mensaje': self.mensaje,
+            'tipo': self.tipo,
+            'enlace': self.enlace,
+            'leida': self.leida,
+            'fecha_creacion': self.fecha_creacion.isoformat(),
+            'prioridad': self.prioridad
+        }
+    
     def save_to_firebase(self):
-        """Guarda la notificación en Firebase"""
-        try:
-            db = firestore.client()
-            notif_ref = db.collection('notificaciones').document(str(self.id))
-            notif_ref.set({
-                'usuario_id': self.usuario.id,
-                'titulo': self.titulo,
-                'mensaje': self.mensaje,
-                'tipo': self.tipo,
-                'enlace': self.enlace,
-                'leida': self.leida,
-                'fecha_creacion': self.fecha_creacion.isoformat(),
-                'prioridad': self.prioridad
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica de la notificación en Firebase (ver core.firebase_sync)"""
+        from core.firebase_sync import encolar
+        return encolar(self)
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Guardar en Firebase después de guardar en DB
-        self.save_to_firebase()
+        # La réplica en Firebase se encola en la misma transacción que el registro
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.save_to_firebase()
 
 
 class ConfiguracionNotificaciones(models.Model):
@@ -0,0 +1,58 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import OutboxFirebase, Usuario
+from .models import ConfiguracionNotificaciones, Notificacion
+
+
+def consultas_a(consultas, prefijo, tabla):
+    """Consultas capturadas que empiezan por prefijo (SELECT, INSERT...) sobre la tabla"""
+    return [
+        consulta['sql'] for consulta in consultas.captured_queries
+        if consulta['sql'].startswith(prefijo) and f'"{tabla}"' in consulta['sql'].split(' WHERE ')[0]
+    ]
+
+
+class NotifyManyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = Usuario.objects.bulk_create([
+            Usuario(username=f'usuario{numero}', cedula=f'{numero}', tipo_usuario='inquilino')
+            for numero in range(30)
+        ])
+        # Los cinco primeros desactivaron las notificaciones de pagos
+        ConfiguracionNotificaciones.objects.bulk_create([
+            ConfiguracionNotificaciones(usuario=usuario, notif_pagos=numero >= 5)
+            for numero, usuario in enumerate(cls.usuarios[:10])
+        ])
+
+    def notificar(self, usuarios, tipo='pago'):
+        with CaptureQueriesContext(connection) as consultas:
+            creadas = Notificacion.objects.notify_many(usuarios, 'Aviso', 'Mensaje', tipo=tipo)
+        return creadas, consultas
+
+    def test_una_consulta_de_preferencias_y_un_insert(self):
+        creadas, consultas = self.notificar(self.usuarios)
+        self.assertEqual(len(creadas), 25)
+        self.assertEqual(len(consultas_a(consultas, 'SELECT', ConfiguracionNotificaciones._meta.db_table)), 1)
+        self.assertEqual(len(consultas_a(consultas, 'INSERT', Notificacion._meta.db_table)), 1)
+        self.assertFalse(Notificacion.objects.filter(usuario__in=self.usuarios[:5]).exists())
+
+    def test_consultas_no_dependen_de_los_destinatarios(self):
+        _, pocos = self.notificar(self.usuarios[5:8])
+        _, muchos = self.notificar([usuario.pk for usuario in self.usuarios])
+        self.assertEqual(len(pocos), len(muchos))
+
+    @override_settings(FIREBASE_BACKEND='memoria')
+    def test_replica_encolada_en_un_insert(self):
+        creadas, consultas = self.notificar(self.usuarios)
+        self.assertEqual(len(consultas_a(consultas, 'INSERT', OutboxFirebase._meta.db_table)), 1)
+        self.assertEqual(
+            OutboxFirebase.objects.filter(coleccion=Notificacion.FIREBASE_COLECCION).count(), len(creadas),
+        )
+
+    def test_tipo_sin_preferencia_no_consulta_configuracion(self):
+        creadas, consultas = self.notificar(self.usuarios, tipo='sistema')
+        self.assertEqual(len(creadas), 30)
+        self.assertEqual(consultas_a(consultas, 'SELECT', ConfiguracionNotificaciones._meta.db_table), [])
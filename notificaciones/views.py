@@ -1,8 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.http import JsonResponse
+from core.paginacion import paginar
 from .models import Notificacion, ConfiguracionNotificaciones
 from django.urls import reverse
 import re
@@ -25,9 +25,7 @@ def listar_notificaciones(request):
     if tipo:
         notificaciones = notificaciones.filter(tipo=tipo)
     
-    paginator = Paginator(notificaciones, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar(request, notificaciones, 20, con_total=True)
     
     # Contar no leídas
     no_leidas = Notificacion.objects.filter(usuario=request.user, leida=False).count()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Pago, RegistroPago
+from .models import LedgerContrato, Pago, RegistroPago
 
 
 class RegistroPagoInline(admin.TabularInline):
@@ -44,3 +44,10 @@ class RegistroPagoAdmin(admin.ModelAdmin):
     list_filter = ['metodo_pago', 'fecha_registro']
     search_fields = ['pago__numero_pago', 'referencia']
     readonly_fields = ['fecha_registro']
+
+
+@admin.register(LedgerContrato)
+class LedgerContratoAdmin(admin.ModelAdmin):
+    list_display = ['contrato', 'facturado', 'pagado', 'mora', 'saldo', 'proxima_fecha_vencimiento']
+    search_fields = ['contrato__numero_contrato']
+    readonly_fields = [campo.name for campo in LedgerContrato._meta.fields]
@@ -5,3 +5,6 @@ class PagosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pagos'
     verbose_name = 'Gestión de Pagos'
+    
+    def ready(self):
+        import pagos.signals
@@ -0,0 +1,358 @@
+"""
+Generación de cuentas de cobro en PDF.
+
+renderizar() solo usa ReportLab y recibe un diccionario de textos ya extraído
+de la base de datos (datos_cuenta_cobro), de modo que puede ejecutarse en otro
+proceso sin conexión a la base de datos ni Django configurado. El lote mensual
+de un propietario reparte el renderizado en un ProcessPoolExecutor y devuelve
+los PDF en un ZIP que se envía mientras se genera. El pool se crea una vez por
+proceso web y sus procesos se inician con spawn: no heredan por fork las
+conexiones, hilos ni locks del servidor.
+
+Los PDF generados se guardan en disco (CUENTAS_COBRO_CACHE_DIR) bajo una clave que
+es el hash de esos datos (clave_cuenta_cobro): una descarga repetida sin cambios
+en el pago, el contrato, las partes ni la cuenta bancaria lee el archivo sin
+renderizar. La caché se limita a CUENTAS_COBRO_CACHE_BYTES borrando los PDF
+usados hace más tiempo (fecha de modificación del archivo).
+
+Todo el estado de la caché está en su directorio: con varios servidores cada uno
+lleva la suya y cuenta solo sus archivos, sin un índice compartido en la base de
+datos que apunte a archivos de otro servidor.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from core.exportar import SalidaPorPartes
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+CUENTA_POR_DEFECTO = {'cuenta_bancaria': '1234567890', 'banco': 'Bancolombia', 'tipo_cuenta': 'Ahorros'}
+
+# Cuentas de cobro que recibe cada proceso por envío
+TAMANO_ENVIO = 4
+
+# Cambiar al modificar renderizar(): invalida los PDF guardados
+VERSION_PDF = 1
+
+# Un acierto solo actualiza la fecha del archivo si es más antigua que esto
+RESOLUCION_ACCESO = timedelta(minutes=1)
+
+# Cada proceso recorre el directorio para desalojar como mucho una vez por intervalo
+INTERVALO_DESALOJO = timedelta(minutes=1)
+_ultima_revision = None
+
+# Pool de renderizado compartido por las peticiones del proceso (se crea al primer lote)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def datos_cuenta_cobro(pago, cuenta=None):
+    """Textos de la cuenta de cobro de un pago (cuenta: cuenta_bancaria, banco, tipo_cuenta)"""
+    contrato = pago.contrato
+    inmueble = contrato.inmueble
+    propietario = inmueble.propietario
+    inquilino = contrato.inquilino
+    if cuenta is None:
+        cuenta = {campo: getattr(propietario, campo, valor) for campo, valor in CUENTA_POR_DEFECTO.items()}
+    return {
+        'numero_pago': pago.numero_pago,
+        'numero_contrato': contrato.numero_contrato,
+        'concepto': pago.concepto,
+        'periodo': f'{pago.periodo_inicio} - {pago.periodo_fin}',
+        'fecha_vencimiento': str(pago.fecha_vencimiento),
+        'valor_arriendo': f'${contrato.valor_arriendo:,.2f}',
+        'valor_administracion': f'${contrato.valor_administracion:,.2f}',
+        'mora': f'${pago.mora:,.2f}',
+        'total': f'${pago.get_monto_total():,.2f}',
+        'propietario': propietario.get_full_name(),
+        'propietario_cedula': propietario.cedula,
+        'propietario_telefono': propietario.telefono,
+        'propietario_ciudad': propietario.ciudad or '-',
+        'cuenta_bancaria': cuenta.get('cuenta_bancaria', CUENTA_POR_DEFECTO['cuenta_bancaria']),
+        'banco': cuenta.get('banco', CUENTA_POR_DEFECTO['banco']),
+        'tipo_cuenta': cuenta.get('tipo_cuenta', CUENTA_POR_DEFECTO['tipo_cuenta']),
+        'inquilino': inquilino.get_full_name(),
+        'inquilino_cedula': inquilino.cedula,
+        'inmueble': inmueble.titulo,
+        'direccion': inmueble.direccion,
+    }
+
+
+def renderizar(datos):
+    """PDF (bytes) de una cuenta de cobro a partir de datos_cuenta_cobro()"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Título
+    elements.append(Paragraph("<b>CUENTA DE COBRO</b>", styles['Title']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Información del pago
+    info_data = [
+        ['Número de Pago:', datos['numero_pago']],
+        ['Contrato:', datos['numero_contrato']],
+        ['Concepto:', datos['concepto']],
+        ['Período:', datos['periodo']],
+        ['Fecha Vencimiento:', datos['fecha_vencimiento']],
+        ['', ''],
+        ['Valor Arriendo:', datos['valor_arriendo']],
+        ['Valor Administración:', datos['valor_administracion']],
+        ['Mora:', datos['mora']],
+        ['', ''],
+        ['<b>TOTAL A PAGAR:</b>', f"<b>{datos['total']}</b>"],
+    ]
+
+    tabla = Table(info_data, colWidths=[3*inch, 3*inch])
+    tabla.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+
+    elements.append(tabla)
+    elements.append(Spacer(1, 0.5*inch))
+
+    # Información del propietario e inquilino
+    partes_info = Paragraph(f"""
+        <b>Beneficiario:</b> {datos['propietario']}<br/>
+        <b>Cédula:</b> {datos['propietario_cedula']}<br/>
+        <b>Teléfono:</b> {datos['propietario_telefono']}<br/>
+        <b>Ciudad:</b> {datos['propietario_ciudad']}<br/>
+        <b>Cuenta Bancaria:</b> {datos['cuenta_bancaria']}<br/>
+        <b>Banco:</b> {datos['banco']}<br/>
+        <b>Tipo de Cuenta:</b> {datos['tipo_cuenta']}<br/>
+        <b>Referencia de pago:</b> {datos['numero_pago']}<br/>
+        <br/>
+        <b>Pagador:</b> {datos['inquilino']}<br/>
+        <b>Cédula:</b> {datos['inquilino_cedula']}<br/>
+        <b>Inmueble:</b> {datos['inmueble']}<br/>
+        <b>Dirección:</b> {datos['direccion']}
+    """, styles['Normal'])
+    elements.append(partes_info)
+
+    instrucciones = Paragraph("""
+        <b>Instrucciones de pago:</b><br/>
+        Realice el pago a la cuenta bancaria indicada. Una vez realizado el pago, registre el comprobante en la plataforma para que el propietario pueda validar y confirmar el abono.<br/>
+        <b>Importante:</b> Use la referencia de pago indicada para facilitar la conciliación.
+    """, styles['Normal'])
+    elements.append(Spacer(1, 0.3*inch))
+    elements.append(instrucciones)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def nombre_archivo(numero_pago):
+    return f'cuenta_cobro_{numero_pago}.pdf'
+
+
+def clave_cuenta_cobro(datos):
+    """Hash de los datos de la cuenta de cobro (y de VERSION_PDF): identifica el PDF"""
+    contenido = json.dumps({'version': VERSION_PDF, 'datos': datos}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def almacenamiento():
+    """
+    Almacenamiento local de la caché. No se usa el de media (Cloudinary): es
+    para imágenes y cada consulta es una petición HTTP, más lenta que renderizar.
+    """
+    return FileSystemStorage(location=settings.CUENTAS_COBRO_CACHE_DIR)
+
+
+def ruta_cache(clave):
+    return f'{clave[:2]}/{clave}.pdf'
+
+
+def _leer(clave):
+    storage = almacenamiento()
+    ruta = ruta_cache(clave)
+    try:
+        with storage.open(ruta, 'rb') as archivo:
+            pdf = archivo.read()
+    except OSError:
+        # No generado en este servidor, desalojado o borrado a mano
+        return None
+    _tocar(storage.path(ruta))
+    return pdf
+
+
+def _escribir(clave, pdf):
+    storage = almacenamiento()
+    ruta = ruta_cache(clave)
+    if storage.exists(ruta):
+        storage.delete(ruta)
+    guardado = storage.save(ruta, ContentFile(pdf))
+    if guardado != ruta:
+        # Otra petición guardó el mismo PDF a la vez
+        storage.delete(guardado)
+
+
+def _tocar(ruta):
+    """Marca un PDF como usado ahora (fecha de modificación) para el desalojo"""
+    try:
+        if time.time() - os.path.getmtime(ruta) > RESOLUCION_ACCESO.total_seconds():
+            os.utime(ruta)
+    except OSError:
+        pass
+
+
+def _archivos_cache():
+    """(ruta, tamaño, último uso) de los PDF guardados en el directorio de la caché"""
+    directorio = settings.CUENTAS_COBRO_CACHE_DIR
+    if not os.path.isdir(directorio):
+        return
+    for carpeta in os.scandir(directorio):
+        if not carpeta.is_dir():
+            continue
+        for entrada in os.scandir(carpeta.path):
+            if entrada.name.endswith('.pdf') and entrada.is_file():
+                estado = entrada.stat()
+                yield entrada.path, estado.st_size, estado.st_mtime
+
+
+def desalojar(limite=None):
+    """
+    Si los PDF del directorio de la caché suman más que el límite (bytes) borra los
+    usados hace más tiempo hasta dejarla en el 90 % del límite. Retorna cuántos borró.
+    """
+    if limite is None:
+        limite = settings.CUENTAS_COBRO_CACHE_BYTES
+    archivos = list(_archivos_cache())
+    total = sum(tamano for _, tamano, _ in archivos)
+    if total <= limite:
+        return 0
+
+    objetivo = limite * 9 // 10
+    borrados = 0
+    for ruta, tamano, _ in sorted(archivos, key=lambda archivo: archivo[2]):
+        if total <= objetivo:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            # Otro proceso lo desalojó a la vez
+            pass
+        total -= tamano
+        borrados += 1
+    return borrados
+
+
+def _desalojar_si_corresponde():
+    """desalojar() sin recorrer el directorio en cada escritura (ver INTERVALO_DESALOJO)"""
+    global _ultima_revision
+    ahora = time.monotonic()
+    if _ultima_revision is not None and ahora - _ultima_revision < INTERVALO_DESALOJO.total_seconds():
+        return 0
+    _ultima_revision = ahora
+    return desalojar()
+
+
+def pdf_cuenta_cobro(datos, clave=None):
+    """PDF de una cuenta de cobro desde la caché; si no está lo renderiza y lo guarda"""
+    clave = clave or clave_cuenta_cobro(datos)
+    pdf = _leer(clave)
+    if pdf is not None:
+        return pdf
+
+    pdf = renderizar(datos)
+    _escribir(clave, pdf)
+    _desalojar_si_corresponde()
+    return pdf
+
+
+def _obtener_pool(workers):
+    """Pool de procesos del proceso web, creado en la primera llamada"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def renderizar_lote(lista_datos, workers=4):
+    """
+    Genera los PDF de una lista de datos_cuenta_cobro() en orden, repartidos en
+    hasta workers procesos (uno por CPU como máximo; en este proceso si queda
+    uno solo). Produce (datos, pdf).
+    """
+    global _pool
+    workers = min(workers, os.cpu_count() or 1)
+    if workers <= 1 or len(lista_datos) <= 1:
+        for datos in lista_datos:
+            yield datos, renderizar(datos)
+        return
+    pool = _obtener_pool(workers)
+    resultados = pool.map(renderizar, lista_datos, chunksize=TAMANO_ENVIO)
+    try:
+        yield from zip(lista_datos, resultados)
+    except BrokenProcessPool:
+        # Un proceso del pool murió: el siguiente lote crea otro
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+    finally:
+        # Descarga interrumpida: cancela los envíos que aún no empiezan
+        resultados.close()
+
+
+def marcar_generadas(pago_ids):
+    """Marca las cuentas de cobro como generadas con un solo UPDATE"""
+    from .models import Pago
+
+    return Pago.objects.filter(pk__in=pago_ids, cuenta_cobro_generada=False).update(
+        cuenta_cobro_generada=True, fecha_generacion_cuenta=timezone.now(),
+    )
+
+
+def zip_cuentas_cobro(pagos, cuenta=None, workers=4):
+    """
+    Genera el ZIP con las cuentas de cobro de los pagos por partes (para una
+    StreamingHttpResponse). Al terminar marca los pagos con un solo UPDATE; si
+    la descarga se interrumpe no se marcan.
+    """
+    lista_datos = [datos_cuenta_cobro(pago, cuenta) for pago in pagos]
+    claves = [clave_cuenta_cobro(datos) for datos in lista_datos]
+    ids = [pago.pk for pago in pagos]
+
+    # Solo se renderizan (en el pool) los que no están en la caché
+    storage = almacenamiento()
+    en_cache = {clave for clave in claves if storage.exists(ruta_cache(clave))}
+    renderizados = renderizar_lote([datos for datos, clave in zip(lista_datos, claves) if clave not in en_cache], workers)
+
+    salida = SalidaPorPartes()
+    # Los PDF de ReportLab ya van comprimidos
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo:
+        for datos, clave in zip(lista_datos, claves):
+            pdf = _leer(clave) if clave in en_cache else None
+            if pdf is None:
+                # Sin caché o archivo desalojado entre la revisión y la lectura.
+                # Si la descarga se interrumpe los PDF ya escritos quedan en la caché
+                pdf = next(renderizados)[1] if clave not in en_cache else renderizar(datos)
+                _escribir(clave, pdf)
+            archivo.writestr(nombre_archivo(datos['numero_pago']), pdf)
+            yield salida.vaciar()
+    yield salida.vaciar()
+    _desalojar_si_corresponde()
+    marcar_generadas(ids)
@@ -0,0 +1,56 @@
+"""
+Indicadores (KPI) de pagos para las vistas de pagos, reportes y dashboard.
+
+KpisPagos reúne en un objeto tipado los conteos y sumas de un alcance de pagos.
+Se obtiene siempre en una sola consulta, de una de dos formas:
+- desde_pagos(queryset): agregación condicional (Count/Sum con filter=Q) sobre
+  los pagos; admite cualquier filtro (fechas, inmueble);
+- desde_ledgers(queryset): suma de los LedgerContrato del alcance cuando este son
+  contratos completos; recorre una fila por contrato en lugar de una por pago.
+Las sumas son las mismas que mantiene el ledger (ver pagos.ledger.expresiones).
+"""
+from dataclasses import dataclass, fields
+from decimal import Decimal
+from django.db.models import Sum
+from .ledger import CAMPOS_SUMA, expresiones
+
+
+@dataclass(frozen=True)
+class KpisPagos:
+    facturado: Decimal
+    pagado: Decimal
+    mora: Decimal
+    saldo: Decimal
+    pagos_pendientes: int
+    pagos_vencidos: int
+    pagos_pagados: int
+    saldo_pendientes: Decimal
+    saldo_vencidos: Decimal
+    mora_vencidos: Decimal
+    recibido: Decimal
+
+    @classmethod
+    def _desde_totales(cls, totales):
+        return cls(**{
+            campo.name: totales[campo.name] or (0 if campo.type is int else Decimal('0'))
+            for campo in fields(cls)
+        })
+
+    @classmethod
+    def desde_pagos(cls, pagos):
+        """KPIs de un queryset de pagos con una agregación condicional"""
+        sumas = expresiones()
+        # Prefijo para no chocar con los campos del modelo (mora)
+        totales = pagos.order_by().aggregate(**{f'kpi_{campo}': sumas[campo] for campo in CAMPOS_SUMA})
+        return cls._desde_totales({campo: totales[f'kpi_{campo}'] for campo in CAMPOS_SUMA})
+
+    @classmethod
+    def desde_ledgers(cls, ledgers):
+        """KPIs de los contratos de un queryset de LedgerContrato"""
+        totales = ledgers.aggregate(**{f'kpi_{campo}': Sum(campo) for campo in CAMPOS_SUMA})
+        return cls._desde_totales({campo: totales[f'kpi_{campo}'] for campo in CAMPOS_SUMA})
+
+    @property
+    def saldo_por_cobrar(self):
+        """Monto de los pagos pendientes y vencidos"""
+        return self.saldo_pendientes + self.saldo_vencidos
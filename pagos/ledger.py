@@ -0,0 +1,246 @@
+"""
+Ledger por contrato (LedgerContrato).
+
+Cada pago aporta al ledger de su contrato un vector de sumas: monto facturado,
+pagado, mora, saldo y el desglose por estado. Al guardar o eliminar un pago se
+aplica con incrementos F() la diferencia entre el aporte anterior y el nuevo,
+sin recalcular el contrato. Las escrituras masivas (bulk_create, calcular_moras)
+aplican la diferencia agregada por contrato. agregados() calcula los mismos
+valores en SQL agrupando por contrato; el comando verificar_ledgers los compara
+con los ledgers para medir la deriva y corregirla.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+CAMPOS_LEDGER = ['contrato_id', 'estado', 'monto', 'monto_pagado', 'mora', 'fecha_vencimiento']
+
+CAMPOS_SUMA = [
+    'facturado', 'pagado', 'mora', 'saldo',
+    'pagos_pendientes', 'pagos_vencidos', 'pagos_pagados',
+    'saldo_pendientes', 'saldo_vencidos', 'mora_vencidos', 'recibido',
+]
+
+CERO = Decimal('0')
+
+
+def _decimal(valor):
+    # str() para que una mora asignada como float no arrastre decimales binarios
+    return Decimal(str(valor or 0))
+
+
+def valores_ledger(pago):
+    return {campo: getattr(pago, campo) for campo in CAMPOS_LEDGER}
+
+
+def aporte(valores):
+    """Aporte de un pago (valores de CAMPOS_LEDGER) a las sumas del ledger"""
+    estado = valores['estado']
+    monto = _decimal(valores['monto'])
+    pagado = _decimal(valores['monto_pagado'])
+    mora = _decimal(valores['mora'])
+    return {
+        'facturado': monto,
+        'pagado': pagado,
+        'mora': mora,
+        'saldo': CERO if estado == 'pagado' else monto + mora - pagado,
+        'pagos_pendientes': int(estado == 'pendiente'),
+        'pagos_vencidos': int(estado == 'vencido'),
+        'pagos_pagados': int(estado == 'pagado'),
+        'saldo_pendientes': monto - pagado if estado == 'pendiente' else CERO,
+        'saldo_vencidos': monto - pagado if estado == 'vencido' else CERO,
+        'mora_vencidos': mora if estado == 'vencido' else CERO,
+        'recibido': pagado if estado == 'pagado' else CERO,
+    }
+
+
+def _por_vencer(valores):
+    """Fecha con la que el pago participa en la próxima fecha de vencimiento (None si está pagado)"""
+    return valores['fecha_vencimiento'] if valores['estado'] != 'pagado' else None
+
+
+def _subconsulta_proxima():
+    from .models import Pago
+
+    return Subquery(
+        Pago.objects.filter(contrato_id=OuterRef('contrato_id')).exclude(estado='pagado')
+        .order_by('fecha_vencimiento').values('fecha_vencimiento')[:1]
+    )
+
+
+def _aplicar(contrato_id, cambios, proxima):
+    """Incrementa el ledger del contrato. Retorna False si el contrato todavía no tiene ledger."""
+    from .models import LedgerContrato
+
+    actualizacion = {campo: F(campo) + valor for campo, valor in cambios.items() if valor}
+    if proxima:
+        actualizacion['proxima_fecha_vencimiento'] = _subconsulta_proxima()
+    if not actualizacion:
+        return True
+    actualizacion['fecha_actualizacion'] = timezone.now()
+    return LedgerContrato.objects.filter(contrato_id=contrato_id).update(**actualizacion) > 0
+
+
+def _crear(contrato_id):
+    """
+    Crea el ledger de un contrato a partir de sus pagos actuales. Retorna False si
+    ya existía (creado por otra transacción), en cuyo caso hay que aplicar la diferencia.
+    """
+    from .models import LedgerContrato, Pago
+
+    valores = agregados(Pago.objects.filter(contrato_id=contrato_id)).get(contrato_id, vacio())
+    _, creado = LedgerContrato.objects.get_or_create(contrato_id=contrato_id, defaults=valores)
+    return creado
+
+
+def aplicar_diferencias(diferencias, proxima=(), crear=True):
+    """
+    Aplica {contrato_id: {campo: diferencia}} a los ledgers. proxima son los
+    contratos cuya próxima fecha de vencimiento puede haber cambiado. Con
+    crear=True los contratos sin ledger lo obtienen recalculado desde sus pagos.
+    """
+    for contrato_id in set(diferencias) | set(proxima):
+        cambios = diferencias.get(contrato_id, {})
+        if _aplicar(contrato_id, cambios, contrato_id in proxima):
+            continue
+        if crear and not _crear(contrato_id):
+            _aplicar(contrato_id, cambios, contrato_id in proxima)
+
+
+def _acumular(diferencias, valores, signo):
+    for campo, valor in aporte(valores).items():
+        diferencias[valores['contrato_id']][campo] += signo * valor
+
+
+def actualizar_ledger(pago, anterior):
+    """
+    Actualiza el ledger con el cambio de un pago. anterior son los valores de
+    CAMPOS_LEDGER antes del cambio (None si el pago es nuevo).
+    """
+    nuevo = valores_ledger(pago)
+    if anterior == nuevo:
+        return
+
+    diferencias = defaultdict(lambda: defaultdict(int))
+    proxima = set()
+    if anterior:
+        _acumular(diferencias, anterior, -1)
+        if _por_vencer(anterior) != _por_vencer(nuevo) or anterior['contrato_id'] != nuevo['contrato_id']:
+            proxima.add(anterior['contrato_id'])
+    _acumular(diferencias, nuevo, 1)
+    if anterior is None or _por_vencer(anterior) != _por_vencer(nuevo):
+        proxima.add(nuevo['contrato_id'])
+    aplicar_diferencias(diferencias, proxima)
+
+
+def registrar_pagos_nuevos(pagos):
+    """Suma al ledger los pagos creados sin save() (bulk_create), una actualización por contrato"""
+    diferencias = defaultdict(lambda: defaultdict(int))
+    for pago in pagos:
+        _acumular(diferencias, valores_ledger(pago), 1)
+    aplicar_diferencias(diferencias, proxima=set(diferencias))
+
+
+def retirar_del_ledger(valores):
+    """Quita del ledger el aporte de un pago eliminado"""
+    diferencias = defaultdict(lambda: defaultdict(int))
+    _acumular(diferencias, valores, -1)
+    # Al eliminar un contrato sus pagos se borran en cascada: no crear ledgers nuevos
+    aplicar_diferencias(diferencias, proxima={valores['contrato_id']}, crear=False)
+
+
+def vacio():
+    """Valores del ledger de un contrato sin pagos"""
+    valores = dict.fromkeys(CAMPOS_SUMA, CERO)
+    valores.update(pagos_pendientes=0, pagos_vencidos=0, pagos_pagados=0, proxima_fecha_vencimiento=None)
+    return valores
+
+
+def expresiones(estado='estado', mora='mora'):
+    """
+    Agregados de los campos del ledger sobre un queryset de pagos (Count/Sum con
+    filter). estado y mora son los nombres de los campos o alias a usar.
+    """
+    pendiente = Q(**{estado: 'pendiente'})
+    vencido = Q(**{estado: 'vencido'})
+    pagado = Q(**{estado: 'pagado'})
+    return {
+        'facturado': Sum('monto'),
+        'pagado': Sum('monto_pagado'),
+        'mora': Sum(mora),
+        'saldo': Sum(F('monto') + F(mora) - F('monto_pagado'), filter=~pagado),
+        'pagos_pendientes': Count('id', filter=pendiente),
+        'pagos_vencidos': Count('id', filter=vencido),
+        'pagos_pagados': Count('id', filter=pagado),
+        'saldo_pendientes': Sum(F('monto') - F('monto_pagado'), filter=pendiente),
+        'saldo_vencidos': Sum(F('monto') - F('monto_pagado'), filter=vencido),
+        'mora_vencidos': Sum(mora, filter=vencido),
+        'recibido': Sum('monto_pagado', filter=pagado),
+        'proxima_fecha_vencimiento': Min('fecha_vencimiento', filter=~pagado),
+    }
+
+
+def agregados(pagos, estado=None, mora=None):
+    """
+    Valores del ledger calculados en SQL para los pagos del queryset, agrupados
+    por contrato: {contrato_id: {campo: valor}}. estado y mora permiten calcular
+    con expresiones en lugar de los campos (p. ej. antes de un UPDATE masivo).
+    """
+    pagos = pagos.alias(estado_ledger=estado or F('estado'), mora_ledger=mora or F('mora'))
+    sumas = expresiones('estado_ledger', 'mora_ledger')
+    # Prefijo para no chocar con los campos del modelo (mora)
+    filas = pagos.order_by().values('contrato_id').annotate(
+        **{f'ledger_{campo}': expresion for campo, expresion in sumas.items()}
+    )
+    resultado = {}
+    for fila in filas:
+        valores = {campo: fila[f'ledger_{campo}'] for campo in sumas}
+        for campo in CAMPOS_SUMA:
+            if valores[campo] is None:
+                valores[campo] = CERO
+        resultado[fila['contrato_id']] = valores
+    return resultado
+
+
+def diferencia_agregados(antes, despues):
+    """Diferencia campo a campo de dos resultados de agregados() (sin la próxima fecha)"""
+    diferencias = defaultdict(lambda: defaultdict(int))
+    for contrato_id in set(antes) | set(despues):
+        for campo in CAMPOS_SUMA:
+            diferencia = (despues.get(contrato_id, {}).get(campo) or 0) - (antes.get(contrato_id, {}).get(campo) or 0)
+            if diferencia:
+                diferencias[contrato_id][campo] = diferencia
+    return diferencias
+
+
+def sumar_diferencias(lista):
+    """Une varias diferencias {contrato_id: {campo: diferencia}} en una"""
+    total = defaultdict(lambda: defaultdict(int))
+    for diferencias in lista:
+        for contrato_id, cambios in diferencias.items():
+            for campo, valor in cambios.items():
+                total[contrato_id][campo] += valor
+    return total
+
+
+def guardar_ledgers(calculados, contratos, modelo=None):
+    """
+    Escribe los ledgers recalculados de los contratos indicados (los que no
+    aparecen en calculados quedan en cero)
+    """
+    if modelo is None:
+        from .models import LedgerContrato as modelo
+
+    campos = CAMPOS_SUMA + ['proxima_fecha_vencimiento', 'fecha_actualizacion']
+    ahora = timezone.now()
+    modelo.objects.bulk_create(
+        [
+            modelo(contrato_id=contrato_id, fecha_actualizacion=ahora, **calculados.get(contrato_id, vacio()))
+            for contrato_id in contratos
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['contrato'],
+        update_fields=campos,
+    )
@@ -0,0 +1,37 @@
+"""
+Cálculo diario de moras (ver pagos.moras). Programar una vez al día, p. ej.:
+    python manage.py calcular_moras
+Para recalcular a otra fecha de corte:
+    python manage.py calcular_moras --fecha 2025-03-31
+"""
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from pagos.moras import calcular_moras
+
+
+class Command(BaseCommand):
+    help = 'Marca los pagos vencidos y recalcula sus moras a una fecha de corte'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de corte AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--contrato', type=int, help='Solo los pagos de este contrato')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError('--fecha debe tener el formato AAAA-MM-DD')
+
+        pagos = None
+        if options['contrato']:
+            from pagos.models import Pago
+            pagos = Pago.objects.filter(contrato_id=options['contrato'])
+
+        resultado = calcular_moras(fecha=fecha, pagos=pagos)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moras al {resultado['fecha']}: {resultado['vencidos']} pagos marcados como vencidos, "
+            f"{resultado['actualizados']} moras actualizadas, {resultado['encolados']} documentos encolados "
+            f"en {resultado['segundos']:.2f}s"
+        ))
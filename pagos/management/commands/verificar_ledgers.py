@@ -0,0 +1,47 @@
+"""
+Verificación de los ledgers de contratos (ver pagos/ledger.py).
+
+Recalcula todos los ledgers con una consulta agrupada por contrato, los compara
+con los mantenidos de forma incremental y reporta la deriva. Con --corregir
+reescribe los ledgers con diferencias y crea los que faltan. Con escrituras
+concurrentes puede reportar diferencias transitorias: conviene correrlo de noche.
+"""
+from django.core.management.base import BaseCommand
+from contratos.models import Contrato
+from pagos.ledger import CAMPOS_SUMA, agregados, guardar_ledgers, vacio
+from pagos.models import LedgerContrato, Pago
+
+CAMPOS = CAMPOS_SUMA + ['proxima_fecha_vencimiento']
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los ledgers de los contratos y reporta las diferencias con los incrementales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true', help='Reescribir los ledgers con diferencias')
+
+    def handle(self, *args, **options):
+        calculados = agregados(Pago.objects.all())
+        actuales = {ledger.contrato_id: ledger for ledger in LedgerContrato.objects.all()}
+
+        con_diferencias = []
+        for contrato_id in sorted(set(Contrato.objects.values_list('pk', flat=True))):
+            ledger = actuales.get(contrato_id)
+            esperado = calculados.get(contrato_id, vacio())
+            if ledger is None:
+                if contrato_id in calculados:
+                    con_diferencias.append(contrato_id)
+                    self.stdout.write(self.style.WARNING(f'Contrato {contrato_id}: sin ledger'))
+                continue
+            diferencias = [campo for campo in CAMPOS if getattr(ledger, campo) != esperado[campo]]
+            if diferencias:
+                con_diferencias.append(contrato_id)
+                for campo in diferencias:
+                    self.stdout.write(self.style.WARNING(
+                        f'Contrato {contrato_id}: {campo} incremental={getattr(ledger, campo)} recalculado={esperado[campo]}'
+                    ))
+
+        self.stdout.write(f'{len(actuales)} ledgers revisados, {len(con_diferencias)} con diferencias')
+        if options['corregir'] and con_diferencias:
+            guardar_ledgers(calculados, con_diferencias)
+            self.stdout.write(self.style.SUCCESS(f'{len(con_diferencias)} ledgers corregidos'))
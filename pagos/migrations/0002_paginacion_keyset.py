@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pago',
+            options={'ordering': ['-fecha_vencimiento', '-id'], 'verbose_name': 'Pago', 'verbose_name_plural': 'Pagos'},
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['contrato', '-fecha_vencimiento', '-id'], name='pagos_pago_contrat_f02c48_idx'),
+        ),
+    ]
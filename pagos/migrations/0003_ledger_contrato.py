@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_ledgers(apps, schema_editor):
+    """Ledger inicial de cada contrato con pagos, calculado desde sus pagos"""
+    from pagos.ledger import agregados, guardar_ledgers
+
+    Pago = apps.get_model('pagos', 'Pago')
+    LedgerContrato = apps.get_model('pagos', 'LedgerContrato')
+    calculados = agregados(Pago.objects.all())
+    guardar_ledgers(calculados, list(calculados), modelo=LedgerContrato)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0005_contrato_tasa_mora_diaria'),
+        ('pagos', '0002_paginacion_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerContrato',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facturado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pagado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mora', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, help_text='Monto más mora menos lo pagado de los pagos no pagados', max_digits=14)),
+                ('pagos_pendientes', models.IntegerField(default=0)),
+                ('pagos_vencidos', models.IntegerField(default=0)),
+                ('pagos_pagados', models.IntegerField(default=0)),
+                ('saldo_pendientes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo_vencidos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mora_vencidos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('recibido', models.DecimalField(decimal_places=2, default=0, help_text='Monto pagado de los pagos en estado pagado', max_digits=14)),
+                ('proxima_fecha_vencimiento', models.DateField(blank=True, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('contrato', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='contratos.contrato')),
+            ],
+            options={
+                'verbose_name': 'Ledger de Contrato',
+                'verbose_name_plural': 'Ledgers de Contratos',
+            },
+        ),
+        migrations.RunPython(poblar_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0003_ledger_contrato'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfCuentaCobro',
+            fields=[
+                ('clave', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('tamano', models.PositiveIntegerField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_acceso', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'PDF de Cuenta de Cobro',
+                'verbose_name_plural': 'PDFs de Cuentas de Cobro',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0004_cache_pdf_cuentas_cobro'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='PdfCuentaCobro',
+        ),
+    ]
@@ -1,7 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from contratos.models import Contrato
 from django.utils import timezone
-from firebase_admin import firestore
+from core.secuencias import asignar_numeros
 
 
 class Pago(models.Model):
@@ -63,17 +63,28 @@ class Pago(models.Model):
     class Meta:
         verbose_name = 'Pago'
         verbose_name_plural = 'Pagos'
-        ordering = ['-fecha_vencimiento']
+        ordering = ['-fecha_vencimiento', '-id']
+        indexes = [
+            models.Index(fields=['contrato', '-fecha_vencimiento', '-id']),
+        ]
     
     def __str__(self):
         return f"Pago #{self.numero_pago} - {self.concepto}"
     
+    PREFIJO_NUMERO = 'PAG'
+    DIGITOS_NUMERO = 6
+    
+    @classmethod
+    def numerar(cls, instancias):
+        """Asigna numero_pago a las instancias que no lo tienen (una sola reserva)"""
+        asignar_numeros(instancias, 'numero_pago', cls.PREFIJO_NUMERO, cls.DIGITOS_NUMERO)
+    
     def save(self, *args, **kwargs):
+        from .ledger import CAMPOS_LEDGER, actualizar_ledger
+        
         # Generar número de pago automáticamente
         if not self.numero_pago:
-            ultimo = Pago.objects.order_by('-id').first()
-            numero = 1 if not ultimo else ultimo.id + 1
-            self.numero_pago = f"PAG-{timezone.now().year}-{numero:06d}"
+            Pago.numerar([self])
         
         # Actualizar estado según monto pagado
         if self.monto_pagado >= self.monto + self.mora:
@@ -83,7 +94,15 @@ class Pago(models.Model):
         elif self.fecha_vencimiento < timezone.now().date() and self.estado == 'pendiente':
             self.estado = 'vencido'
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Valores guardados de la fila, bloqueada hasta el final de la transacción:
+            # con guardados concurrentes cada uno aplica su diferencia sobre el anterior
+            anterior = None
+            if not self._state.adding:
+                anterior = Pago.objects.select_for_update().filter(pk=self.pk).values(*CAMPOS_LEDGER).first()
+            super().save(*args, **kwargs)
+            # Ledger del contrato: se resta el aporte anterior y se suma el nuevo
+            actualizar_ledger(self, anterior)
     
     def get_monto_total(self):
         """Retorna el monto total incluyendo mora"""
@@ -104,34 +123,37 @@ class Pago(models.Model):
             return delta.days
         return 0
     
-    def calcular_mora(self, tasa_diaria=0.001):
-        """Calcula la mora por días de vencimiento"""
+    def calcular_mora(self):
+        """
+        Asigna la mora a hoy con la tasa del contrato, sin guardar. El cálculo
+        masivo diario lo hace pagos.moras.calcular_moras.
+        """
+        from .moras import mora_a_fecha
+
         if self.esta_vencido():
-            dias = self.dias_vencimiento()
-            self.mora = float(self.monto) * tasa_diaria * dias
-            self.save()
+            self.mora = mora_a_fecha(self.monto, self.contrato.tasa_mora_diaria, self.dias_vencimiento())
+    
+    FIREBASE_COLECCION = 'pagos'
+    
+    def get_datos_firebase(self):
+        """Documento que se replica en Firebase"""
+        return {
+            'numero_pago': self.numero_pago,
+            'contrato_id': self.contrato_id,
+            'concepto': self.concepto,
+            'monto': float(self.monto),
+            'monto_pagado': float(self.monto_pagado),
+            'mora': float(self.mora),
+            'estado': self.estado,
+            'fecha_vencimiento': self.fecha_vencimiento.isoformat(),
+            'fecha_pago': self.fecha_pago.isoformat() if self.fecha_pago else None,
+            'metodo_pago': self.metodo_pago
+        }
     
     def save_to_firebase(self):
-        """Guarda el pago en Firebase"""
-        try:
-            db = firestore.client()
-            pago_ref = db.collection('pagos').document(str(self.id))
-            pago_ref.set({
-                'numero_pago': self.numero_pago,
-                'contrato_id': self.contrato.id,
-                'concepto': self.concepto,
-                'monto': float(self.monto),
-                'monto_pagado': float(self.monto_pagado),
-                'mora': float(self.mora),
-                'estado': self.estado,
-                'fecha_vencimiento': self.fecha_vencimiento.isoformat(),
-                'fecha_pago': self.fecha_pago.isoformat() if self.fecha_pago else None,
-                'metodo_pago': self.metodo_pago
-            })
-            return True
-        except Exception as e:
-            print(f"Error al guardar en Firebase: {e}")
-            return False
+        """Encola la réplica del pago en Firebase (ver core.firebase_sync)"""
+        from core.firebase_sync import encolar
+        return encolar(self)
 
 
 class RegistroPago(models.Model):
@@ -162,3 +184,43 @@ class RegistroPago(models.Model):
     
     def __str__(self):
         return f"Registro de {self.monto} para {self.pago.numero_pago}"
+
+
+class LedgerContrato(models.Model):
+    """
+    Resumen de los pagos de un contrato, mantenido de forma incremental con
+    incrementos F() al guardar o eliminar pagos y al calcular moras (ver
+    pagos/ledger.py). Los totales de inquilinos y propietarios se leen de aquí.
+    """
+    contrato = models.OneToOneField(Contrato, on_delete=models.CASCADE, related_name='ledger')
+    
+    # Totales de todos los pagos
+    facturado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pagado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mora = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Monto más mora menos lo pagado de los pagos no pagados",
+    )
+    
+    # Desglose por estado
+    pagos_pendientes = models.IntegerField(default=0)
+    pagos_vencidos = models.IntegerField(default=0)
+    pagos_pagados = models.IntegerField(default=0)
+    saldo_pendientes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo_vencidos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mora_vencidos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    recibido = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Monto pagado de los pagos en estado pagado",
+    )
+    
+    proxima_fecha_vencimiento = models.DateField(null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Ledger de Contrato'
+        verbose_name_plural = 'Ledgers de Contratos'
+    
+    def __str__(self):
+        return f"Ledger {self.contrato.numero_contrato} - saldo {self.saldo}"
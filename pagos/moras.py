@@ -0,0 +1,99 @@
+"""
+Cálculo de moras por conjuntos.
+
+Una ejecución (comando calcular_moras, programado una vez al día) hace dos UPDATE
+sobre la tabla de pagos a una fecha de corte:
+- los pagos pendientes con vencimiento anterior a la fecha pasan a vencidos;
+- la mora de los pagos vencidos o parciales se fija en
+  monto * tasa_mora_diaria del contrato * días de atraso (solo en las filas en
+  que cambia, que luego se encolan para Firebase).
+Los ledgers de los contratos reciben la diferencia de cada UPDATE calculada
+en SQL antes de ejecutarlo. La mora depende solo de la fecha de corte, por lo
+que repetir la ejecución del mismo día no cambia nada. Las vistas solo leen la mora guardada.
+"""
+import time
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+from contratos.models import Contrato
+from core import firebase_sync
+from .ledger import agregados, aplicar_diferencias, diferencia_agregados, sumar_diferencias
+from .models import Pago
+
+ESTADOS_CON_MORA = ('vencido', 'parcial')
+CENTAVOS = Decimal('0.01')
+
+
+class DiasDesde(Func):
+    """Días enteros entre un campo de fecha y una fecha fija (fecha - campo)"""
+    output_field = IntegerField()
+
+    def __init__(self, campo, fecha):
+        super().__init__(Value(fecha), F(campo))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(', **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+
+def mora_a_fecha(monto, tasa_diaria, dias):
+    """Mora de un pago, igual a la que calcula calcular_moras"""
+    if dias <= 0:
+        return Decimal('0')
+    return (Decimal(monto) * Decimal(tasa_diaria) * dias).quantize(CENTAVOS)
+
+
+def calcular_moras(fecha=None, pagos=None):
+    """
+    Marca como vencidos los pagos pendientes y recalcula las moras a la fecha de
+    corte (hoy por defecto). pagos limita el cálculo a un queryset. Retorna
+    {'fecha', 'vencidos', 'actualizados', 'encolados', 'segundos'}.
+    """
+    fecha = fecha or timezone.now().date()
+    pagos = Pago.objects.all() if pagos is None else pagos
+    inicio = time.monotonic()
+
+    tasa = Subquery(
+        Contrato.objects.filter(pk=OuterRef('contrato_id')).values('tasa_mora_diaria')[:1]
+    )
+    mora = Round(
+        ExpressionWrapper(F('monto') * tasa * DiasDesde('fecha_vencimiento', fecha), output_field=DecimalField()),
+        2,
+    )
+    atrasados = pagos.filter(fecha_vencimiento__lt=fecha)
+
+    with transaction.atomic():
+        # Cada UPDATE va precedido del cálculo de su diferencia en los ledgers
+        marcar = atrasados.filter(estado='pendiente', monto_pagado__lte=0)
+        diferencias = [diferencia_agregados(agregados(marcar), agregados(marcar, estado=Value('vencido')))]
+        vencidos = marcar.update(estado='vencido')
+        # Solo se escriben (y se replican) las filas cuya mora cambia
+        cambian = atrasados.filter(estado__in=ESTADOS_CON_MORA).exclude(mora=mora)
+        diferencias.append(diferencia_agregados(agregados(cambian), agregados(cambian, mora=mora)))
+        ids = list(cambian.values_list('pk', flat=True)) if firebase_sync.replica_activa() else []
+        actualizados = cambian.update(mora=mora)
+        # Marcar como vencido o cambiar la mora no cambia la próxima fecha de vencimiento
+        aplicar_diferencias(sumar_diferencias(diferencias))
+        # UPDATE no pasa por save(): se encolan los documentos por lotes
+        encolados = 0
+        for desde in range(0, len(ids), firebase_sync.TAMANO_LOTE):
+            lote = list(firebase_sync.queryset_replica(Pago).filter(pk__in=ids[desde:desde + firebase_sync.TAMANO_LOTE]))
+            encolados += firebase_sync.encolar_cambios(lote)
+
+    return {
+        'fecha': fecha,
+        'vencidos': vencidos,
+        'actualizados': actualizados,
+        'encolados': encolados,
+        'segundos': time.monotonic() - inicio,
+    }
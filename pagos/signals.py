@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from .ledger import CAMPOS_LEDGER, retirar_del_ledger
+from .models import Pago
+
+
+@receiver(pre_delete, sender=Pago)
+def leer_pago_eliminado(sender, instance, **kwargs):
+    """Valores guardados del pago (no los de la instancia) bloqueando la fila hasta que se elimine"""
+    instance._valores_eliminados = Pago.objects.select_for_update().filter(pk=instance.pk).values(*CAMPOS_LEDGER).first()
+
+
+@receiver(post_delete, sender=Pago)
+def retirar_pago_del_ledger(sender, instance, **kwargs):
+    """Quitar el aporte del pago eliminado del ledger de su contrato"""
+    valores = getattr(instance, '_valores_eliminados', None)
+    if valores:
+        retirar_del_ledger(valores)
@@ -0,0 +1,417 @@
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from contratos.models import Contrato
+from contratos.views import generar_pagos_contrato
+from core.models import Usuario
+from inmuebles.models import Inmueble
+from . import cuentas_cobro
+from .kpis import KpisPagos
+from .moras import calcular_moras, mora_a_fecha
+from .models import LedgerContrato, Pago
+
+
+class ConsultasKpi:
+    """Registra las consultas de KPIs (alias kpi_*) que se ejecutan en el bloque"""
+
+    def __init__(self):
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if '"kpi_facturado"' in sql:
+            self.sql.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._contexto = connection.execute_wrapper(self)
+        self._contexto.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._contexto.__exit__(*exc)
+
+
+def crear_datos_kpis(prefijo=''):
+    """Propietario, inquilino y un contrato con un pago pendiente, uno vencido y uno pagado"""
+    hoy = timezone.now().date()
+    propietario = Usuario.objects.create_user(
+        username=f'{prefijo}propietario', password='clave-segura-1', tipo_usuario='propietario',
+        cedula=f'{prefijo}100', telefono='3000000001',
+    )
+    inquilino = Usuario.objects.create_user(
+        username=f'{prefijo}inquilino', password='clave-segura-1', tipo_usuario='inquilino',
+        cedula=f'{prefijo}200', telefono='3000000002',
+    )
+    inmueble = Inmueble.objects.create(
+        propietario=propietario, titulo='Casa', descripcion='d', categoria='casa', direccion='Calle 1',
+        ciudad='Bogotá', barrio='Centro', area=Decimal('80'), habitaciones=2, banos=1,
+        precio_arriendo=Decimal('1000000'),
+    )
+    contrato = Contrato.objects.create(
+        inmueble=inmueble, inquilino=inquilino, fecha_inicio=hoy - timedelta(days=60),
+        fecha_fin=hoy + timedelta(days=300), valor_arriendo=Decimal('1000000'),
+        valor_deposito=Decimal('1000000'), terminos_condiciones='t', estado='activo',
+    )
+    comunes = {'contrato': contrato, 'monto': Decimal('1000000'), 'concepto': 'Arriendo'}
+    Pago.objects.create(
+        periodo_inicio=hoy, periodo_fin=hoy + timedelta(days=29),
+        fecha_vencimiento=hoy + timedelta(days=5), **comunes,
+    )
+    Pago.objects.create(
+        periodo_inicio=hoy - timedelta(days=30), periodo_fin=hoy - timedelta(days=1),
+        fecha_vencimiento=hoy - timedelta(days=25), mora=Decimal('50000'), **comunes,
+    )
+    Pago.objects.create(
+        periodo_inicio=hoy - timedelta(days=60), periodo_fin=hoy - timedelta(days=31),
+        fecha_vencimiento=hoy - timedelta(days=55), monto_pagado=Decimal('1000000'),
+        fecha_pago=timezone.now() - timedelta(days=56), **comunes,
+    )
+    return propietario, inquilino, contrato
+
+
+class KpisPagosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def comprobar(self, kpis):
+        self.assertEqual(kpis.facturado, Decimal('3000000'))
+        self.assertEqual(kpis.pagos_pendientes, 1)
+        self.assertEqual(kpis.pagos_vencidos, 1)
+        self.assertEqual(kpis.pagos_pagados, 1)
+        self.assertEqual(kpis.saldo_pendientes, Decimal('1000000'))
+        self.assertEqual(kpis.saldo_vencidos, Decimal('1000000'))
+        self.assertEqual(kpis.mora_vencidos, Decimal('50000'))
+        self.assertEqual(kpis.recibido, Decimal('1000000'))
+        self.assertEqual(kpis.saldo_por_cobrar, Decimal('2000000'))
+
+    def test_desde_pagos_una_consulta(self):
+        with self.assertNumQueries(1):
+            kpis = KpisPagos.desde_pagos(Pago.objects.filter(contrato=self.contrato))
+        self.comprobar(kpis)
+
+    def test_desde_ledgers_una_consulta(self):
+        with self.assertNumQueries(1):
+            kpis = KpisPagos.desde_ledgers(LedgerContrato.objects.filter(contrato=self.contrato))
+        self.comprobar(kpis)
+
+    def test_alcance_vacio(self):
+        with self.assertNumQueries(1):
+            kpis = KpisPagos.desde_ledgers(
+                LedgerContrato.objects.filter(contrato__inmueble__propietario=self.inquilino)
+            )
+        self.assertEqual(kpis.recibido, Decimal('0'))
+        self.assertEqual(kpis.pagos_pendientes, 0)
+
+
+# Las plantillas se renderizan sin collectstatic
+SIN_MANIFIESTO = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+
+
+@SIN_MANIFIESTO
+class VistasKpisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def test_listar_pagos_inquilino_lee_kpis_del_ledger(self):
+        self.client.force_login(self.inquilino)
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(reverse('pagos:listar'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(consultas.sql), 1)
+        self.assertIn('"pagos_ledgercontrato"', consultas.sql[0])
+        self.assertEqual(respuesta.context['total_vencido'], Decimal('1000000'))
+        self.assertEqual(respuesta.context['total_pagado'], Decimal('1000000'))
+
+    def test_listar_pagos_propietario_sin_kpis(self):
+        self.client.force_login(self.propietario)
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(reverse('pagos:listar'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(consultas.sql, [])
+
+    def test_reportes_pagos_una_consulta_de_kpis(self):
+        self.client.force_login(self.propietario)
+        with ConsultasKpi() as consultas:
+            respuesta = self.client.get(reverse('pagos:reportes'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(consultas.sql), 1)
+        self.assertIn('"pagos_ledgercontrato"', consultas.sql[0])
+        self.assertEqual(respuesta.context['monto_pendiente'], Decimal('2000000'))
+        self.assertEqual(respuesta.context['monto_mora'], Decimal('50000'))
+
+
+def deriva_ledgers():
+    """Salida de verificar_ledgers (ledgers incrementales contra los recalculados)"""
+    salida = StringIO()
+    call_command('verificar_ledgers', stdout=salida)
+    return salida.getvalue()
+
+
+@SIN_MANIFIESTO
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+
+    def assertSinDeriva(self):
+        salida = deriva_ledgers()
+        self.assertIn(', 0 con diferencias', salida, salida)
+
+    def pago(self, estado):
+        return Pago.objects.filter(contrato=self.contrato, estado=estado).first()
+
+    def test_pagos_creados_uno_a_uno(self):
+        self.assertSinDeriva()
+        self.assertEqual(LedgerContrato.objects.get(contrato=self.contrato).pagos_vencidos, 1)
+
+    def test_programacion_masiva(self):
+        contrato = Contrato.objects.create(
+            inmueble=self.contrato.inmueble, inquilino=self.inquilino, fecha_inicio=date(2024, 1, 31),
+            fecha_fin=date(2024, 12, 31), valor_arriendo=Decimal('800000'), valor_deposito=Decimal('800000'),
+            terminos_condiciones='t', dia_pago=31,
+        )
+        creados = generar_pagos_contrato(contrato)
+        self.assertEqual(LedgerContrato.objects.get(contrato=contrato).pagos_vencidos, len(creados))
+        self.assertSinDeriva()
+
+    def test_pago_parcial(self):
+        pago = self.pago('pendiente')
+        pago.monto_pagado = Decimal('300000')
+        pago.save()
+        self.assertEqual(Pago.objects.get(pk=pago.pk).estado, 'parcial')
+        self.assertSinDeriva()
+
+    def test_marcar_pagado(self):
+        pago = self.pago('vencido')
+        pago.monto_pagado += pago.get_saldo_pendiente()
+        pago.fecha_pago = timezone.now().date()
+        with transaction.atomic():
+            pago.save()
+        self.assertEqual(LedgerContrato.objects.get(contrato=self.contrato).pagos_pagados, 2)
+        self.assertSinDeriva()
+
+    def test_cambio_manual_de_estado(self):
+        self.client.force_login(self.propietario)
+        pago = self.pago('pendiente')
+        for estado in ('vencido', 'pagado', 'pendiente'):
+            respuesta = self.client.post(reverse('pagos:cambiar_estado', args=[pago.pk]), {'nuevo_estado': estado})
+            self.assertEqual(respuesta.status_code, 302)
+            self.assertEqual(Pago.objects.get(pk=pago.pk).estado, estado)
+            self.assertSinDeriva()
+
+    def test_calcular_moras(self):
+        call_command('calcular_moras', fecha=(timezone.now().date() + timedelta(days=40)).isoformat(), stdout=StringIO())
+        self.assertEqual(LedgerContrato.objects.get(contrato=self.contrato).pagos_vencidos, 2)
+        self.assertSinDeriva()
+
+    def test_eliminar_pago(self):
+        self.pago('vencido').delete()
+        self.assertEqual(LedgerContrato.objects.get(contrato=self.contrato).pagos_vencidos, 0)
+        self.assertSinDeriva()
+
+    def test_creacion_perezosa_del_ledger(self):
+        LedgerContrato.objects.filter(contrato=self.contrato).delete()
+        pago = self.pago('pendiente')
+        pago.monto_pagado = Decimal('100000')
+        pago.save()
+        self.assertTrue(LedgerContrato.objects.filter(contrato=self.contrato).exists())
+        self.assertSinDeriva()
+
+    def test_eliminar_contrato_en_cascada(self):
+        otro = Contrato.objects.create(
+            inmueble=self.contrato.inmueble, inquilino=self.inquilino, fecha_inicio=date(2024, 1, 1),
+            fecha_fin=date(2024, 6, 30), valor_arriendo=Decimal('500000'), valor_deposito=Decimal('500000'),
+            terminos_condiciones='t',
+        )
+        generar_pagos_contrato(otro)
+        otro.delete()
+        self.assertFalse(LedgerContrato.objects.filter(contrato_id=otro.pk).exists())
+        self.assertFalse(Pago.objects.filter(contrato_id=otro.pk).exists())
+        self.assertSinDeriva()
+
+
+class CalcularMorasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+        Contrato.objects.filter(pk=cls.contrato.pk).update(tasa_mora_diaria=Decimal('0.0013'))
+        hoy = timezone.now().date()
+        for dias, monto, pagado in ((3, '1000000', '0'), (17, '733333.33', '0'), (45, '1250000', '400000')):
+            Pago.objects.create(
+                contrato=cls.contrato, concepto='Extra', monto=Decimal(monto), monto_pagado=Decimal(pagado),
+                periodo_inicio=hoy, periodo_fin=hoy, fecha_vencimiento=hoy + timedelta(days=10 - dias),
+            )
+        cls.corte = hoy + timedelta(days=10)
+
+    def test_mora_igual_a_mora_a_fecha(self):
+        resultado = calcular_moras(fecha=self.corte)
+        self.assertGreater(resultado['actualizados'], 0)
+        con_mora = Pago.objects.filter(contrato=self.contrato, estado__in=['vencido', 'parcial'])
+        self.assertEqual(con_mora.count(), 5)
+        for pago in con_mora:
+            dias = (self.corte - pago.fecha_vencimiento).days
+            self.assertEqual(pago.mora, mora_a_fecha(pago.monto, Decimal('0.0013'), dias), pago.numero_pago)
+
+    def test_segunda_ejecucion_del_dia_no_cambia_nada(self):
+        calcular_moras(fecha=self.corte)
+        resultado = calcular_moras(fecha=self.corte)
+        self.assertEqual((resultado['vencidos'], resultado['actualizados']), (0, 0))
+
+    def test_pendientes_pasan_a_vencidos_en_el_ledger(self):
+        antes = LedgerContrato.objects.get(contrato=self.contrato)
+        resultado = calcular_moras(fecha=self.corte)
+        despues = LedgerContrato.objects.get(contrato=self.contrato)
+        self.assertEqual(resultado['vencidos'], 2)
+        self.assertEqual(despues.pagos_pendientes, antes.pagos_pendientes - 2)
+        self.assertEqual(despues.pagos_vencidos, antes.pagos_vencidos + 2)
+        self.assertEqual(
+            despues.saldo_pendientes + despues.saldo_vencidos, antes.saldo_pendientes + antes.saldo_vencidos,
+        )
+        self.assertIn(', 0 con diferencias', deriva_ledgers())
+
+
+class CacheTemporalMixin:
+    """Caché de cuentas de cobro en un directorio temporal por prueba"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        configuracion = override_settings(CUENTAS_COBRO_CACHE_DIR=directorio)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+
+@SIN_MANIFIESTO
+class CuentasCobroLoteTests(CacheTemporalMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+        cls.mes = timezone.now().date().replace(day=1) + timedelta(days=400)
+        cls.pagos = [
+            Pago.objects.create(
+                contrato=cls.contrato, concepto='Arriendo', monto=Decimal('1000000'),
+                periodo_inicio=cls.mes, periodo_fin=cls.mes, fecha_vencimiento=cls.mes.replace(day=dia),
+            )
+            for dia in (5, 10, 15)
+        ]
+
+    def descargar(self):
+        self.client.force_login(self.propietario)
+        return self.client.post(reverse('pagos:cuentas_cobro_lote'), {
+            'mes': f'{self.mes:%Y-%m}', 'cuenta_bancaria': '987', 'banco': 'Banco', 'tipo_cuenta': 'Ahorros',
+        })
+
+    def generadas(self):
+        return Pago.objects.filter(pk__in=[pago.pk for pago in self.pagos], cuenta_cobro_generada=True).count()
+
+    def comprobar_zip(self, contenido):
+        with zipfile.ZipFile(BytesIO(contenido)) as archivo:
+            self.assertEqual(
+                archivo.namelist(), [cuentas_cobro.nombre_archivo(pago.numero_pago) for pago in self.pagos],
+            )
+            for nombre in archivo.namelist():
+                self.assertTrue(archivo.read(nombre).startswith(b'%PDF'), nombre)
+
+    def test_zip_con_un_pdf_por_pago_del_mes(self):
+        respuesta = self.descargar()
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        self.comprobar_zip(b''.join(respuesta.streaming_content))
+        self.assertEqual(self.generadas(), 3)
+
+    def test_zip_renderizado_en_el_pool(self):
+        cuentas_cobro._pool = None
+        self.addCleanup(setattr, cuentas_cobro, '_pool', None)
+        with mock.patch.object(cuentas_cobro.os, 'cpu_count', return_value=2):
+            respuesta = self.descargar()
+            self.comprobar_zip(b''.join(respuesta.streaming_content))
+        self.assertIsNotNone(cuentas_cobro._pool)
+        self.addCleanup(cuentas_cobro._pool.shutdown)
+        self.assertEqual(self.generadas(), 3)
+
+    def test_descarga_interrumpida_no_marca_nada(self):
+        respuesta = self.descargar()
+        next(iter(respuesta.streaming_content))
+        respuesta.close()
+        self.assertEqual(self.generadas(), 0)
+
+
+@SIN_MANIFIESTO
+class CacheCuentasCobroTests(CacheTemporalMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.propietario, cls.inquilino, cls.contrato = crear_datos_kpis()
+        cls.pago = Pago.objects.filter(contrato=cls.contrato, estado='pendiente').get()
+
+    def setUp(self):
+        super().setUp()
+        renderizar = mock.patch.object(cuentas_cobro, 'renderizar', wraps=cuentas_cobro.renderizar)
+        self.renderizar = renderizar.start()
+        self.addCleanup(renderizar.stop)
+
+    def archivos(self):
+        return sorted(cuentas_cobro._archivos_cache())
+
+    def test_cambio_de_banco_da_otra_clave(self):
+        self.client.force_login(self.propietario)
+        url = reverse('pagos:editar_cuenta_cobro', args=[self.pago.pk])
+        cuenta = {'cuenta_bancaria': '111', 'banco': 'Banco A', 'tipo_cuenta': 'Ahorros'}
+        primera = self.client.post(url, cuenta)
+        repetida = self.client.post(url, cuenta)
+        self.assertEqual(primera['ETag'], repetida['ETag'])
+        self.assertEqual(primera.content, repetida.content)
+        self.assertEqual(self.renderizar.call_count, 1)
+
+        otra = self.client.post(url, dict(cuenta, banco='Banco B'))
+        self.assertNotEqual(otra['ETag'], primera['ETag'])
+        self.assertEqual(self.renderizar.call_count, 2)
+        self.assertEqual(len(self.archivos()), 2)
+
+    def test_if_none_match_responde_304_sin_renderizar(self):
+        self.client.force_login(self.inquilino)
+        url = reverse('pagos:cuenta_cobro', args=[self.pago.pk])
+        primera = self.client.get(url)
+        self.assertEqual(primera.status_code, 200)
+        # Sin el archivo en la caché, cualquier respuesta con cuerpo tendría que renderizar
+        shutil.rmtree(settings.CUENTAS_COBRO_CACHE_DIR)
+        self.renderizar.reset_mock()
+
+        condicional = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional.content, b'')
+        self.renderizar.assert_not_called()
+
+        Pago.objects.filter(pk=self.pago.pk).update(mora=Decimal('1'))
+        cambiado = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(cambiado.status_code, 200)
+        self.assertEqual(self.renderizar.call_count, 1)
+
+    def test_desalojo_deja_la_cache_dentro_del_limite(self):
+        datos = cuentas_cobro.datos_cuenta_cobro(self.pago)
+        variantes = [dict(datos, concepto=f'Arriendo {numero}') for numero in range(6)]
+        limite = len(cuentas_cobro.renderizar(datos)) * 7 // 2
+        with override_settings(CUENTAS_COBRO_CACHE_BYTES=limite), \
+                mock.patch.object(cuentas_cobro, 'INTERVALO_DESALOJO', timedelta(0)):
+            for variante in variantes:
+                cuentas_cobro.pdf_cuenta_cobro(variante)
+                self.assertLessEqual(sum(tamano for _, tamano, _ in self.archivos()), limite)
+
+        storage = cuentas_cobro.almacenamiento()
+        guardados = [storage.exists(cuentas_cobro.ruta_cache(cuentas_cobro.clave_cuenta_cobro(v))) for v in variantes]
+        # Se desalojan los usados hace más tiempo
+        self.assertFalse(guardados[0])
+        self.assertTrue(guardados[-1])
@@ -10,5 +10,6 @@ urlpatterns = [
     path('cambiar-estado/<int:pago_id>/', views.cambiar_estado_pago, name='cambiar_estado'),
     path('cuenta-cobro/<int:pago_id>/', views.generar_cuenta_cobro, name='cuenta_cobro'),
     path('cuenta-cobro/<int:pago_id>/editar/', views.editar_cuenta_cobro, name='editar_cuenta_cobro'),
+    path('cuentas-cobro/lote/', views.cuentas_cobro_lote, name='cuentas_cobro_lote'),
     path('reportes/', views.reportes_pagos, name='reportes'),
 ]
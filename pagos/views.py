@@ -2,19 +2,20 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.utils import timezone
-from django.http import HttpResponse
-from django.db import models
-from .models import Pago, RegistroPago
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
+from core.paginacion import paginar
+from .cuentas_cobro import (
+    CUENTA_POR_DEFECTO, clave_cuenta_cobro, datos_cuenta_cobro, nombre_archivo, pdf_cuenta_cobro, zip_cuentas_cobro,
+)
+from .kpis import KpisPagos
+from .models import LedgerContrato, Pago, RegistroPago
 from .forms import RegistrarPagoForm, FiltrarPagosForm
 from notificaciones.models import Notificacion
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import inch
-import io
 from django import forms
 
 class CuentaCobroForm(forms.Form):
@@ -22,6 +23,13 @@ class CuentaCobroForm(forms.Form):
     banco = forms.CharField(label='Banco', max_length=50)
     tipo_cuenta = forms.CharField(label='Tipo de Cuenta', max_length=30)
 
+class CuentaCobroLoteForm(CuentaCobroForm):
+    mes = forms.DateField(
+        label='Mes de vencimiento',
+        input_formats=['%Y-%m'],
+        widget=forms.DateInput(attrs={'type': 'month'}, format='%Y-%m'),
+    )
+
 @login_required
 def editar_cuenta_cobro(request, pago_id):
     pago = get_object_or_404(Pago, id=pago_id)
@@ -57,8 +65,9 @@ def cambiar_estado_pago(request, pago_id):
                 pago.fecha_pago = timezone.now().date()
             elif nuevo_estado == 'pendiente':
                 pago.fecha_pago = None
-            pago.save()
-            pago.save_to_firebase()
+            with transaction.atomic():
+                pago.save()
+                pago.save_to_firebase()
             # Notificación al inquilino
             if nuevo_estado == 'pagado':
                 mensaje = f'El propietario ha marcado tu pago {pago.numero_pago} como PAGADO.'
@@ -102,21 +111,16 @@ def listar_pagos(request):
         if fecha_hasta:
             pagos = pagos.filter(fecha_vencimiento__lte=fecha_hasta)
     
-    # Actualizar moras para pagos vencidos
-    for pago in pagos.filter(estado='vencido'):
-        pago.calcular_mora()
-    
-    paginator = Paginator(pagos, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Las moras se actualizan con el comando calcular_moras; aquí solo se leen
+    page_obj = paginar(request, pagos, 15)
     
     # Totales para el resumen (solo para inquilino)
     total_pendiente = total_vencido = total_pagado = 0
     if user.tipo_usuario == 'inquilino':
-        pagos_all = Pago.objects.filter(contrato__inquilino=user)
-        total_pendiente = pagos_all.filter(estado='pendiente').aggregate(total=models.Sum('monto') - models.Sum('monto_pagado'))['total'] or 0
-        total_vencido = pagos_all.filter(estado='vencido').aggregate(total=models.Sum('monto') - models.Sum('monto_pagado'))['total'] or 0
-        total_pagado = pagos_all.filter(estado='pagado').aggregate(total=models.Sum('monto_pagado'))['total'] or 0
+        kpis = KpisPagos.desde_ledgers(LedgerContrato.objects.filter(contrato__inquilino=user))
+        total_pendiente = kpis.saldo_pendientes
+        total_vencido = kpis.saldo_vencidos
+        total_pagado = kpis.recibido
 
     context = {
         'pagos': page_obj,
@@ -178,8 +182,9 @@ def registrar_pago(request, pago_id):
             if not pago.fecha_pago:
                 pago.fecha_pago = timezone.now().date()
             
-            pago.save()
-            pago.save_to_firebase()
+            with transaction.atomic():
+                pago.save()
+                pago.save_to_firebase()
             
             # Notificar al propietario
             if request.user.tipo_usuario == 'inquilino':
@@ -241,8 +246,9 @@ def marcar_pagado(request, pago_id):
     if not pago.fecha_pago:
         pago.fecha_pago = timezone.now().date()
 
-    pago.save()
-    pago.save_to_firebase()
+    with transaction.atomic():
+        pago.save()
+        pago.save_to_firebase()
 
     # Notificar al inquilino
     Notificacion.objects.create(
@@ -276,8 +282,9 @@ def marcar_vencido(request, pago_id):
 
     pago.estado = 'vencido'
     pago.calcular_mora()
-    pago.save()
-    pago.save_to_firebase()
+    with transaction.atomic():
+        pago.save()
+        pago.save_to_firebase()
 
     Notificacion.objects.create(
         usuario=pago.contrato.inquilino,
@@ -309,87 +316,10 @@ def generar_cuenta_cobro(request, pago_id, datos=None):
     if request.user.tipo_usuario == 'propietario' and datos is None:
         return redirect('pagos:editar_cuenta_cobro', pago_id=pago.id)
 
-    # Usar datos editados o por defecto
-    if datos is None:
-        cuenta_bancaria = getattr(pago.contrato.inmueble.propietario, 'cuenta_bancaria', '1234567890')
-        banco = getattr(pago.contrato.inmueble.propietario, 'banco', 'Bancolombia')
-        tipo_cuenta = getattr(pago.contrato.inmueble.propietario, 'tipo_cuenta', 'Ahorros')
-    else:
-        cuenta_bancaria = datos.get('cuenta_bancaria', '1234567890')
-        banco = datos.get('banco', 'Bancolombia')
-        tipo_cuenta = datos.get('tipo_cuenta', 'Ahorros')
-
-    # Crear el PDF en memoria
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Título
-    titulo = Paragraph("<b>CUENTA DE COBRO</b>", styles['Title'])
-    elements.append(titulo)
-    elements.append(Spacer(1, 0.3*inch))
-
-    # Información del pago
-    info_data = [
-        ['Número de Pago:', pago.numero_pago],
-        ['Contrato:', pago.contrato.numero_contrato],
-        ['Concepto:', pago.concepto],
-        ['Período:', f'{pago.periodo_inicio} - {pago.periodo_fin}'],
-        ['Fecha Vencimiento:', str(pago.fecha_vencimiento)],
-        ['', ''],
-        ['Valor Arriendo:', f'${pago.contrato.valor_arriendo:,.2f}'],
-        ['Valor Administración:', f'${pago.contrato.valor_administracion:,.2f}'],
-        ['Mora:', f'${pago.mora:,.2f}'],
-        ['', ''],
-        ['<b>TOTAL A PAGAR:</b>', f'<b>${pago.get_monto_total():,.2f}</b>'],
-    ]
-
-    tabla = Table(info_data, colWidths=[3*inch, 3*inch])
-    tabla.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-
-    elements.append(tabla)
-    elements.append(Spacer(1, 0.5*inch))
-
-    # Información del propietario e inquilino
-    propietario = pago.contrato.inmueble.propietario
-    inquilino = pago.contrato.inquilino
-
-    partes_info = Paragraph(f"""
-        <b>Beneficiario:</b> {propietario.get_full_name()}<br/>
-        <b>Cédula:</b> {propietario.cedula}<br/>
-        <b>Teléfono:</b> {propietario.telefono}<br/>
-        <b>Ciudad:</b> {propietario.ciudad or '-'}<br/>
-        <b>Cuenta Bancaria:</b> {cuenta_bancaria}<br/>
-        <b>Banco:</b> {banco}<br/>
-        <b>Tipo de Cuenta:</b> {tipo_cuenta}<br/>
-        <b>Referencia de pago:</b> {pago.numero_pago}<br/>
-        <br/>
-        <b>Pagador:</b> {inquilino.get_full_name()}<br/>
-        <b>Cédula:</b> {inquilino.cedula}<br/>
-        <b>Inmueble:</b> {pago.contrato.inmueble.titulo}<br/>
-        <b>Dirección:</b> {pago.contrato.inmueble.direccion}
-    """, styles['Normal'])
-    elements.append(partes_info)
-
-    instrucciones = Paragraph("""
-        <b>Instrucciones de pago:</b><br/>
-        Realice el pago a la cuenta bancaria indicada. Una vez realizado el pago, registre el comprobante en la plataforma para que el propietario pueda validar y confirmar el abono.<br/>
-        <b>Importante:</b> Use la referencia de pago indicada para facilitar la conciliación.
-    """, styles['Normal'])
-    elements.append(Spacer(1, 0.3*inch))
-    elements.append(instrucciones)
-
-    # Generar PDF
-    doc.build(elements)
-    buffer.seek(0)
+    # Datos editados o, si no hay, los del propietario
+    datos_pdf = datos_cuenta_cobro(pago, datos)
+    clave = clave_cuenta_cobro(datos_pdf)
+    etag = quote_etag(clave)
 
     # Actualizar registro de generación
     if not pago.cuenta_cobro_generada:
@@ -397,13 +327,57 @@ def generar_cuenta_cobro(request, pago_id, datos=None):
         pago.fecha_generacion_cuenta = timezone.now()
         pago.save()
 
-    # Retornar PDF
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="cuenta_cobro_{pago.numero_pago}.pdf"'
+    # 304 si el navegador ya tiene este mismo PDF (If-None-Match)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(pdf_cuenta_cobro(datos_pdf, clave), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo(pago.numero_pago)}"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
 
     return response
 
 
+@login_required
+def cuentas_cobro_lote(request):
+    """Descarga en un ZIP las cuentas de cobro de un mes de todos los inmuebles del propietario"""
+    if request.user.tipo_usuario != 'propietario':
+        messages.error(request, 'Solo los propietarios pueden generar cuentas de cobro por lote.')
+        return redirect('pagos:listar')
+
+    if request.method == 'POST':
+        form = CuentaCobroLoteForm(request.POST)
+        if form.is_valid():
+            mes = form.cleaned_data['mes']
+            pagos = list(
+                Pago.objects.filter(
+                    contrato__inmueble__propietario=request.user,
+                    fecha_vencimiento__year=mes.year,
+                    fecha_vencimiento__month=mes.month,
+                )
+                .exclude(estado='pagado')
+                .select_related('contrato__inmueble__propietario', 'contrato__inquilino')
+                .order_by('fecha_vencimiento', 'id')
+            )
+            if pagos:
+                cuenta = {campo: form.cleaned_data[campo] for campo in CUENTA_POR_DEFECTO}
+                response = StreamingHttpResponse(
+                    zip_cuentas_cobro(pagos, cuenta, workers=settings.CUENTAS_COBRO_WORKERS),
+                    content_type='application/zip',
+                )
+                response['Content-Disposition'] = f'attachment; filename="cuentas_cobro_{mes:%Y_%m}.zip"'
+                return response
+            messages.info(request, 'No hay pagos por cobrar con vencimiento en ese mes.')
+    else:
+        form = CuentaCobroLoteForm(initial={
+            'cuenta_bancaria': getattr(request.user, 'cuenta_bancaria', CUENTA_POR_DEFECTO['cuenta_bancaria']),
+            'banco': getattr(request.user, 'banco', CUENTA_POR_DEFECTO['banco']),
+            'tipo_cuenta': getattr(request.user, 'tipo_cuenta', CUENTA_POR_DEFECTO['tipo_cuenta']),
+            'mes': timezone.now().date(),
+        })
+    return render(request, 'pagos/cuentas_cobro_lote.html', {'form': form})
+
+
 @login_required
 def reportes_pagos(request):
     """Vista para generar reportes de pagos"""
@@ -414,23 +388,17 @@ def reportes_pagos(request):
     # Estadísticas generales
     pagos = Pago.objects.filter(contrato__inmueble__propietario=request.user)
     
-    total_pagos = pagos.filter(estado='pagado').count()
-    total_pendientes = pagos.filter(estado='pendiente').count()
-    total_vencidos = pagos.filter(estado='vencido').count()
-    
-    # Montos
-    from django.db.models import Sum
-    monto_recibido = pagos.filter(estado='pagado').aggregate(Sum('monto_pagado'))['monto_pagado__sum'] or 0
-    monto_pendiente = pagos.filter(estado__in=['pendiente', 'vencido']).aggregate(Sum('monto'))['monto__sum'] or 0
-    monto_mora = pagos.filter(estado='vencido').aggregate(Sum('mora'))['mora__sum'] or 0
+    # KPIs desde los ledgers de los contratos (una sola consulta)
+    kpis = KpisPagos.desde_ledgers(LedgerContrato.objects.filter(contrato__inmueble__propietario=request.user))
     
     context = {
-        'total_pagos': total_pagos,
-        'total_pendientes': total_pendientes,
-        'total_vencidos': total_vencidos,
-        'monto_recibido': monto_recibido,
-        'monto_pendiente': monto_pendiente,
-        'monto_mora': monto_mora,
+        'kpis': kpis,
+        'total_pagos': kpis.pagos_pagados,
+        'total_pendientes': kpis.pagos_pendientes,
+        'total_vencidos': kpis.pagos_vencidos,
+        'monto_recibido': kpis.recibido,
+        'monto_pendiente': kpis.saldo_por_cobrar,
+        'monto_mora': kpis.mora_vencidos,
         'pagos_recientes': pagos.order_by('-fecha_creacion')[:10],
     }
     
@@ -32,5 +32,20 @@ done
 echo "Recolectando archivos estáticos..."
 python manage.py collectstatic --noinput --clear
 
+# Drenador del outbox de Firebase: los cambios solo llegan a Firestore si corre.
+# Debe haber uno solo: con varias réplicas, dejar DRENAR_FIREBASE=1 en una y 0 en las demás
+# (o correrlo como servicio aparte con el proceso worker del Procfile).
+if [ "${DRENAR_FIREBASE:-1}" = "1" ]; then
+  echo "Iniciando drenador de Firebase..."
+  python manage.py drenar_firebase --continuo &
+fi
+
+# Índice de inmuebles similares: las señales solo encolan los cambios y este proceso
+# los calcula. Igual que el drenador, uno solo (ACTUALIZAR_SIMILARES=0 en las demás réplicas).
+if [ "${ACTUALIZAR_SIMILARES:-1}" = "1" ]; then
+  echo "Iniciando actualización de inmuebles similares..."
+  python manage.py actualizar_similares --continuo &
+fi
+
 echo "Iniciando servidor Gunicorn..."
 gunicorn inmueblesapp.wsgi:application --bind 0.0.0.0:${PORT:-8000}